@@ -1,50 +1,95 @@
+import argparse
 import os
-import struct
-import hashlib
 import ecdsa
 from ecdsa.util import sigdecode_string
-from utils.fileUtils import read_file, write_file, file_exists
-from mining import mine_block, serialize_tx
-from utils.transactionUtils import validate_transaction
-from utils.p2phk import verify_transactions
-
-
-def main():
-    src_dir = os.path.dirname(__file__)
-
-    # Navigate two directories up to reach the parent directory of myenv
-    parent_dir = os.path.dirname(os.path.dirname(src_dir))
-
-    # Construct the path to the mempool directory
-    mempool_path = os.path.join(parent_dir, "mempool")
-    valid_transactions = []
-
-    # Read and validate transactions from mempool
-    files = os.listdir(mempool_path)
-
-    filename_to_check = (
-        "7de645056d100ee9d175ec61a90acc3d67812f93a3dae605a94f4db0f7c2a153.json"
-    )
-    exists = filename_to_check in files
-
-    print(f"File {filename_to_check} exists in mempool: {exists}")
-    num_files = len(files)
-
-    num_valid_transactions = 0  # Initialize the counter here
-    for file in files:
-        file_path = os.path.join(mempool_path, file)
-        transaction_data = read_file(file_path)
-        results, num_valid = verify_transactions(transaction_data)
-        if any(results):
-            valid_transactions.append(transaction_data)
-            num_valid_transactions += num_valid  # Increment the counter
+from utils.fileUtils import write_file, file_exists
+from mining import mine_block, BLOCK_VERSION, DEFAULT_PREVIOUS_BLOCK_HASH
+from utils.mempoolUtils import load_mempool, stream_mempool
+from utils.blockTemplate import build_block_template
+from utils.signatureBackend import set_backend, available_backends
+from utils.signatureCache import configure_signature_cache, DEFAULT_MAX_SIZE
+
+# Navigate two directories up from src to reach the parent directory of myenv
+PARENT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIFFICULTY_TARGET = "0000ffff00000000000000000000000000000000000000000000000000000000"
+
+
+def main(
+    ingest_workers=None,
+    use_cache=True,
+    mine_workers=1,
+    sig_backend="auto",
+    sig_cache_size=DEFAULT_MAX_SIZE,
+    jsonl_source=None,
+    mempool_path=None,
+    output_path=None,
+    cache_dir=None,
+    difficulty_target=DIFFICULTY_TARGET,
+    previous_block_hash=DEFAULT_PREVIOUS_BLOCK_HASH,
+    version=BLOCK_VERSION,
+):
+    # Select the signature verification backend before any worker is started
+    print("signature backend:", set_backend(sig_backend).name)
+
+    # Paths not given default to the layout of the repository
+    if mempool_path is None:
+        mempool_path = os.path.join(PARENT_DIR, "mempool")
+    if output_path is None:
+        output_path = os.path.join(PARENT_DIR, "output.txt")
+    if cache_dir is None:
+        cache_dir = PARENT_DIR
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Signatures verified by previous runs are remembered, so reruns only verify new inputs
+    sig_cache_path = os.path.join(cache_dir, ".signature_cache") if use_cache else None
+    signature_cache = configure_signature_cache(sig_cache_size, sig_cache_path)
+
+    if jsonl_source is not None:
+        # Stream a JSON-lines snapshot (a path, or "-" for stdin) in bounded memory
+        valid_transactions, num_valid_transactions, excluded_txids = stream_mempool(
+            jsonl_source, workers=ingest_workers
+        )
+    else:
+        # Read and validate transactions from mempool
+        files = os.listdir(mempool_path)
+
+        filename_to_check = (
+            "7de645056d100ee9d175ec61a90acc3d67812f93a3dae605a94f4db0f7c2a153.json"
+        )
+        exists = filename_to_check in files
+
+        print(f"File {filename_to_check} exists in mempool: {exists}")
+
+        # Pre-parsed transactions are kept in a binary cache, so warm runs skip the JSON parsing
+        cache_path = os.path.join(cache_dir, ".mempool_cache") if use_cache else None
+
+        # Read and verify the transaction files in parallel, merged back in listing order
+        valid_transactions, num_valid_transactions, excluded_txids = load_mempool(
+            mempool_path, workers=ingest_workers, cache_path=cache_path
+        )
     print(f"Number of valid transactions: {len(valid_transactions)}")
     print(f"Number of valid transactions: {num_valid_transactions}")
-    # Mine the block with valid transactions
-    difficulty_target = (
-        "0000ffff00000000000000000000000000000000000000000000000000000000"
+    if sig_cache_path is not None:
+        signature_cache.save(sig_cache_path)
+    # Pick the valid transactions paying the most per weight unit, within the block weight limit.
+    # Transactions spending outputs of excluded mempool transactions are never selected
+    template = build_block_template(valid_transactions, excluded_txids=excluded_txids)
+    block_transactions = template["transactions"]
+    print(
+        f"Selected {len(block_transactions)} transactions: "
+        f"{template['fees']} sat in fees, {template['weight']} WU"
+    )
+
+    # Mine the block with the selected transactions
+    mined_block = mine_block(
+        block_transactions,
+        difficulty_target,
+        workers=mine_workers,
+        previous_block_hash=previous_block_hash,
+        version=version,
     )
-    mined_block = mine_block(valid_transactions, difficulty_target)
 
     # Get the block header from the mined block
     block_header = mined_block["block_header"]
@@ -53,28 +98,155 @@ def main():
     print("nounce in main", nounce)
 
     # Serialize the coinbase transaction
-    # coinbase_tx = mined_block["coinbase_tx"]
-    # serialized_coinbase_tx = serialize_tx(coinbase_tx)
+    coinbase_tx = mined_block["coinbase_tx"]
+    serialized_coinbase_tx = coinbase_tx.serialize_witness()
 
     # Extract txids from mined block
     txids = mined_block["txids"]
-    reversed_txid = [txid[::-1] for txid in txids]
     # Write the block header to the output file
     # Write the block header, coinbase transaction, and transaction IDs to the output file
-    output_path = os.path.join(parent_dir, "output.txt")
     with open(output_path, "w") as output_file:
         # Write the block header
         output_file.write(block_header.hex() + "\n")
 
         # Write the serialized coinbase transaction
-        output_file.write("coinbase transaction" + "\n")
+        output_file.write(serialized_coinbase_tx.hex() + "\n")
 
         # Write the transaction IDs (txids) of the transactions mined in the block
-        for txid in reversed_txid:
+        for txid in txids:
             output_file.write(txid + "\n")
 
-    print("Output file 'output.txt' generated successfully.")
+    print(f"Output file '{output_path}' generated successfully.")
+
+
+def _hex_hash(value):
+    # A 32 byte hash in the hex form shown by block explorers
+    if len(value) != 64:
+        raise argparse.ArgumentTypeError(f"expected 64 hex digits, got {len(value)}")
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid hex: {value}") from None
+    return value
+
+
+def _target(value):
+    # No hash is below a zero target, the nonce search would never end
+    value = _hex_hash(value)
+    if not int(value, 16):
+        raise argparse.ArgumentTypeError("the target must not be zero")
+    return value
+
+
+def _cache_dir(value):
+    # Created on first use, but a file in its place would fail the cache writes
+    if os.path.exists(value) and not os.path.isdir(value):
+        raise argparse.ArgumentTypeError(f"not a directory: {value}")
+    return value
+
+
+def _bounded_int(minimum, maximum=None):
+    # Integer argument type bounded to [minimum, maximum]
+    def parse(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid integer: {value}") from None
+        if number < minimum or (maximum is not None and number > maximum):
+            if maximum is None:
+                bounds = f">= {minimum}"
+            else:
+                bounds = f"between {minimum} and {maximum}"
+            raise argparse.ArgumentTypeError(f"expected an integer {bounds}, got {number}")
+        return number
+
+    return parse
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line of the miner.
+
+    :param argv: The arguments, defaults to sys.argv[1:].
+    :type argv: list[str] or None
+    :return: The keyword arguments of main.
+    :rtype: dict
+    """
+    parser = argparse.ArgumentParser(
+        description="Validate the mempool and mine a block with the best paying transactions."
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--mempool",
+        dest="mempool_path",
+        help="mempool directory, one JSON file per transaction (default: mempool/ in the repository root)",
+    )
+    source.add_argument(
+        "--jsonl",
+        dest="jsonl_source",
+        help='JSON-lines mempool snapshot, one transaction per line, or "-" for stdin',
+    )
+    parser.add_argument(
+        "--output", dest="output_path", help="block output file (default: output.txt in the repository root)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=_cache_dir,
+        help="directory of the mempool and signature caches, created if missing "
+        "(default: the repository root)",
+    )
+    parser.add_argument(
+        "--no-cache", dest="use_cache", action="store_false", help="do not read or write caches"
+    )
+    parser.add_argument(
+        "--target",
+        dest="difficulty_target",
+        type=_target,
+        default=DIFFICULTY_TARGET,
+        help="difficulty target, as 64 hex digits",
+    )
+    parser.add_argument(
+        "--prev-hash",
+        dest="previous_block_hash",
+        type=_hex_hash,
+        default=DEFAULT_PREVIOUS_BLOCK_HASH,
+        help="previous block hash, as shown by block explorers",
+    )
+    parser.add_argument(
+        "--block-version",
+        dest="version",
+        # Serialized as 4 unsigned bytes
+        type=_bounded_int(0, 0xFFFFFFFF),
+        default=BLOCK_VERSION,
+        help="header version",
+    )
+    parser.add_argument(
+        "--ingest-workers",
+        type=_bounded_int(1),
+        help="processes reading and verifying the mempool (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--mine-workers",
+        type=_bounded_int(1),
+        default=1,
+        help="processes searching nonces (default: 1)",
+    )
+    parser.add_argument(
+        "--backend",
+        dest="sig_backend",
+        # Only the backends usable here, e.g. secp256k1 needs its compiled module
+        choices=["auto", *available_backends()],
+        default="auto",
+        help="signature verification backend (default: auto)",
+    )
+    parser.add_argument(
+        "--sig-cache-size",
+        type=_bounded_int(0),
+        default=DEFAULT_MAX_SIZE,
+        help="number of verified signatures remembered",
+    )
+    return vars(parser.parse_args(argv))
 
 
 if __name__ == "__main__":
-    main()
+    main(**parse_args())
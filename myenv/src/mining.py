@@ -1,7 +1,37 @@
 import hashlib
 import struct
-import json
 import time
+import itertools
+import multiprocessing
+import queue
+from utils.transactionModel import Transaction, TxIn, TxOut
+from utils.merkleTree import MerkleTree, hash_pair
+
+NONCE = struct.Struct("<I")
+TIMESTAMP = struct.Struct("<I")
+NONCE_SPACE = 1 << 32
+PROGRESS_INTERVAL = 1000000
+# Seconds the header timestamp may be rolled forward before the extranonce is rolled
+MAX_TIME_ROLL = 600
+
+EXTRANONCE_SIZE = 8
+BLOCK_SUBSIDY = 312500000  # 3.125 BTC
+# Payout script of the coinbase output; replace with the miner's own scriptpubkey
+COINBASE_SCRIPTPUBKEY = bytes.fromhex("76a914" + "00" * 20 + "88ac")
+# BIP141: the coinbase witness holds a single 32 byte reserved value, and the wtxid of the
+# coinbase counts as all zeros in the witness merkle tree
+WITNESS_RESERVED_VALUE = b"\x00" * 32
+COINBASE_WTXID = b"\x00" * 32
+# OP_RETURN, push of 36 bytes, commitment header
+WITNESS_COMMITMENT_HEADER = bytes.fromhex("6a24aa21a9ed")
+
+# Seconds between two checks that the mining workers are still alive
+WORKER_POLL_INTERVAL = 1.0
+
+# Header version and previous block hash used when none is given
+BLOCK_VERSION = 4
+DEFAULT_PREVIOUS_BLOCK_HASH = "00000000000000000397532e06a7601fb7a0d82e93a644c65d4b1ba011931dca"  # random hash example
+
 
 def get_compact(target):
     nSize = (target.bit_length() + 7) // 8
@@ -25,31 +55,8 @@ def get_compact(target):
     return nCompact
 
 def serialize_tx(transaction):
-    serialized = b""
-    serialized += struct.pack("<L", transaction["version"])  # Version
-
-    serialized += encode_varint(len(transaction["vin"]))  # Input count
-    for inp in transaction["vin"]:
-        txid_bytes = bytes.fromhex(inp["txid"])[::-1]  # TXID in little-endian format
-        serialized += txid_bytes
-        serialized += struct.pack("<L", inp["vout"])  # Output index
-        scriptsig_bytes = bytes.fromhex(inp.get("scriptsig", ""))  # ScriptSig
-        serialized += encode_varint(len(scriptsig_bytes))  # Script length
-        serialized += scriptsig_bytes
-        serialized += struct.pack("<L", inp["sequence"])  # Sequence
-
-    serialized += encode_varint(len(transaction["vout"]))  # Output count
-    for out in transaction["vout"]:
-        serialized += struct.pack("<Q", out["value"])  # Output value
-        scriptpubkey_bytes = bytes.fromhex(out["scriptpubkey"])  # ScriptPubKey
-        serialized += encode_varint(len(scriptpubkey_bytes))  # ScriptPubKey size
-        serialized += scriptpubkey_bytes
-
-    serialized += struct.pack("<L", transaction["locktime"])  # Locktime
-
-    txid = hashlib.sha256(hashlib.sha256(serialized).digest()).hexdigest()
-
-    return txid
+    # The serialization and its hash are memoized on the transaction
+    return transaction.txid.hex()
 
 
 def serialize_block(block_data):
@@ -59,101 +66,300 @@ def serialize_block(block_data):
 def calculate_merkle_root(transactions):
     if len(transactions) == 0:
         return ""
-    txids = [serialize_tx(tx)[::-1] for tx in transactions]
-
-
-    # Convert txids to little-endian byte buffers
-    tx_buffers = [bytes.fromhex(tx)[::-1] for tx in txids]
-
-    # 2-D array to save merkle tree and compute proof
-    merkle_tree = [tx_buffers]
-
-    while len(tx_buffers) > 1:
-        merkle_leaves = []
-        # Iterate over transactions, form pairs, and hash nodes
-        for i in range(0, len(tx_buffers), 2):
-            concatenated = tx_buffers[i] + (tx_buffers[i + 1] if i + 1 < len(tx_buffers) else tx_buffers[i])
-            hashed = hashlib.sha256(hashlib.sha256(concatenated).digest()).digest()
-            merkle_leaves.append(hashed)
-        merkle_tree.append(merkle_leaves)
-        tx_buffers = merkle_leaves
-
-    return merkle_tree[-1][0].hex()
-
-
-def mine_block(transactions, difficulty_target):
-    coinbase_tx = "My Coinbase Transaction"
-
-    merkle_root = calculate_merkle_root(transactions)
-    print("merkle_root", merkle_root)
-
-    txids = [serialize_tx(tx) for tx in transactions]
-
-    version = 4
+    # Txids are memoized on the transactions, already in internal byte order
+    return MerkleTree([tx.txid for tx in transactions]).root.hex()
+
+
+def search_nonce(header_prefix, target, start=0, end=NONCE_SPACE):
+    """
+    Scans a range of nonces for a header whose hash is below the target.
+
+    The SHA-256 state after the first 64 header bytes (the first compression block) does not
+    depend on the nonce, so it is computed once and copied for every attempt; each nonce then
+    only hashes the trailing 16 bytes. The hash is compared as an integer against the target.
+
+    :param header_prefix: The first 76 bytes of the header (everything but the nonce).
+    :type header_prefix: bytes
+    :param target: The target the block hash must be below.
+    :type target: int
+    :param start: First nonce to try.
+    :type start: int
+    :param end: Nonce after the last one to try.
+    :type end: int
+    :return: The first nonce of the range meeting the target, or None.
+    :rtype: int or None
+    """
+    midstate = hashlib.sha256(header_prefix[:64])
+    tail = header_prefix[64:]
+    pack_nonce = NONCE.pack
+    sha256 = hashlib.sha256
+    from_bytes = int.from_bytes
+    for nonce in range(start, end):
+        first = midstate.copy()
+        first.update(tail + pack_nonce(nonce))
+        # The header hash is read as a little-endian number
+        if from_bytes(sha256(first.digest()).digest(), "little") < target:
+            return nonce
+    return None
+
+
+def build_coinbase(fees, extranonce, witness_commitment=None):
+    """
+    Builds the coinbase transaction paying the block subsidy and the fees.
+
+    :param fees: Total fees of the transactions included in the block.
+    :type fees: int
+    :param extranonce: The extranonce pushed in the coinbase scriptsig; changing it changes the
+                       coinbase txid, hence the merkle root, and gives a fresh nonce space.
+    :type extranonce: int
+    :param witness_commitment: The BIP141 witness commitment, for blocks with segwit
+                               transactions. Adds the commitment output and the reserved value
+                               as coinbase witness.
+    :type witness_commitment: bytes or None
+    :return: The coinbase transaction.
+    :rtype: Transaction
+    """
+    scriptsig = bytes([EXTRANONCE_SIZE]) + extranonce.to_bytes(EXTRANONCE_SIZE, "little")
+    witness = (WITNESS_RESERVED_VALUE,) if witness_commitment is not None else ()
+    coinbase_input = TxIn(
+        b"\x00" * 32, 0xFFFFFFFF, scriptsig, 0xFFFFFFFF, witness, is_coinbase=True
+    )
+    outputs = [TxOut(BLOCK_SUBSIDY + fees, COINBASE_SCRIPTPUBKEY)]
+    if witness_commitment is not None:
+        outputs.append(TxOut(0, WITNESS_COMMITMENT_HEADER + witness_commitment))
+    return Transaction(1, 0, (coinbase_input,), tuple(outputs))
+
+
+def witness_commitment(witness_root):
+    """
+    Computes the BIP141 witness commitment placed in the coinbase.
+
+    :param witness_root: Merkle root of the wtxids, the coinbase counting as all zeros.
+    :type witness_root: bytes
+    :return: The 32 byte commitment.
+    :rtype: bytes
+    """
+    return hash_pair(witness_root, WITNESS_RESERVED_VALUE)
+
+
+def sequential_search(header_head, timestamp, bits_bytes, target, max_time_roll=MAX_TIME_ROLL):
+    """
+    Searches for a valid header in the current process, rolling the timestamp when the nonce
+    space is exhausted.
+
+    :param header_head: The first 68 header bytes (version, previous block hash and merkle root).
+    :type header_head: bytes
+    :param timestamp: The first timestamp to try.
+    :type timestamp: int
+    :param bits_bytes: The compact target, as serialized in the header.
+    :type bits_bytes: bytes
+    :param target: The target the block hash must be below.
+    :type target: int
+    :param max_time_roll: How many seconds past the first timestamp may be tried.
+    :type max_time_roll: int
+    :return: The timestamp and nonce found, or None if the whole range failed.
+    :rtype: tuple[int, int] or None
+    """
+    for rolled_timestamp in range(timestamp, timestamp + max_time_roll + 1):
+        # Everything but the nonce is fixed for the whole scan of this timestamp
+        header_prefix = header_head + TIMESTAMP.pack(rolled_timestamp) + bits_bytes
+        for start in range(0, NONCE_SPACE, PROGRESS_INTERVAL):
+            nonce = search_nonce(header_prefix, target, start, start + PROGRESS_INTERVAL)
+            if nonce is not None:
+                return rolled_timestamp, nonce
+            print(f"Trying nonce: {start + PROGRESS_INTERVAL}")
+        print(f"Nonce space exhausted, rolling timestamp to {rolled_timestamp + 1}")
+    return None
+
+
+def _mining_worker(
+    worker_id,
+    num_workers,
+    header_head,
+    timestamp,
+    bits_bytes,
+    target,
+    max_time_roll,
+    chunk_size,
+    stop,
+    results,
+):
+    # Each round covers one timestamp; within a round the nonce space is cut into chunks dealt
+    # out round-robin, so the workers never try the same (timestamp, nonce) pair twice
+    for rolled_timestamp in range(timestamp, timestamp + max_time_roll + 1):
+        header_prefix = header_head + TIMESTAMP.pack(rolled_timestamp) + bits_bytes
+        for start in range(worker_id * chunk_size, NONCE_SPACE, num_workers * chunk_size):
+            if stop.is_set():
+                return
+            end = min(start + chunk_size, NONCE_SPACE)
+            nonce = search_nonce(header_prefix, target, start, end)
+            if nonce is not None:
+                results.put((worker_id, rolled_timestamp, nonce))
+                stop.set()
+                return
+    results.put((worker_id, None, None))
+
+
+def parallel_search(
+    header_head,
+    timestamp,
+    bits_bytes,
+    target,
+    workers,
+    max_time_roll=MAX_TIME_ROLL,
+    chunk_size=1 << 16,
+):
+    """
+    Searches for a valid header over several processes.
+
+    The nonce space of each timestamp is split between the workers; a worker that runs out of
+    nonces moves on to the next timestamp. As soon as one worker meets the target, the others
+    are told to stop and are reaped.
+
+    :param header_head: The first 68 header bytes (version, previous block hash and merkle root).
+    :type header_head: bytes
+    :param timestamp: The first timestamp to try.
+    :type timestamp: int
+    :param bits_bytes: The compact target, as serialized in the header.
+    :type bits_bytes: bytes
+    :param target: The target the block hash must be below.
+    :type target: int
+    :param workers: Number of worker processes.
+    :type workers: int
+    :param max_time_roll: How many seconds past the first timestamp may be tried.
+    :type max_time_roll: int
+    :param chunk_size: Number of nonces a worker tries between two checks of the stop flag.
+    :type chunk_size: int
+    :return: The id of the winning worker and the timestamp and nonce it found, or None if every
+             worker exhausted its share of the range.
+    :rtype: tuple[int, int, int] or None
+    :raises RuntimeError: If a worker died before reporting, e.g. killed or out of memory.
+    """
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_mining_worker,
+            args=(
+                worker_id,
+                workers,
+                header_head,
+                timestamp,
+                bits_bytes,
+                target,
+                max_time_roll,
+                chunk_size,
+                stop,
+                results,
+            ),
+            daemon=True,
+        )
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    winner = None
+    try:
+        for _ in range(workers):
+            worker_id, found_timestamp, nonce = _next_result(results, processes)
+            if nonce is not None:
+                winner = worker_id, found_timestamp, nonce
+                break
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    return winner
+
+
+def _next_result(results, processes):
+    # Waits for the next worker report, checking between polls that no worker died silently:
+    # a dead worker never reports, and waiting on it would block forever
+    while True:
+        try:
+            return results.get(timeout=WORKER_POLL_INTERVAL)
+        except queue.Empty:
+            pass
+        failed = [process for process in processes if process.exitcode not in (None, 0)]
+        if failed:
+            raise RuntimeError(
+                f"mining worker {failed[0].name} died with exit code {failed[0].exitcode}"
+            )
+        # Workers put their report before exiting cleanly, so once all have exited and the
+        # queue stays empty no report is coming
+        if all(process.exitcode is not None for process in processes):
+            try:
+                return results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                raise RuntimeError("mining workers exited without reporting") from None
+
+
+def mine_block(
+    transactions,
+    difficulty_target,
+    workers=1,
+    previous_block_hash=DEFAULT_PREVIOUS_BLOCK_HASH,
+    version=BLOCK_VERSION,
+):
+    fees = sum(tx.fee for tx in transactions)
+
+    # The coinbase is the first leaf: the tree keeps every level, so only the path from the
+    # coinbase leaf to the root is rehashed when the extranonce rolls
+    tree = MerkleTree([b"\x00" * 32] + [tx.txid for tx in transactions])
+    # Blocks with segwit transactions commit to their wtxids; the coinbase wtxid is fixed
+    commitment = None
+    if any(tx.has_witness for tx in transactions):
+        witness_tree = MerkleTree([COINBASE_WTXID] + [tx.wtxid for tx in transactions])
+        commitment = witness_commitment(witness_tree.root)
 
-    previous_block_hash = "00000000000000000397532e06a7601fb7a0d82e93a644c65d4b1ba011931dca"  # random hash example
     timestamp = int(time.time())
     bits = int(difficulty_target, 16)  # Convert difficulty target to integer
 
-    nonce = 0  # Initialize nonce here
-
     # Format version as 4-byte little-endian
     version_bytes = version.to_bytes(4, byteorder="little")
 
-    # Format previous_block_hash and merkle_root as natural byte order
+    # Format previous_block_hash as natural byte order
     previous_block_hash_bytes = bytes.fromhex(previous_block_hash)[::-1]
-    merkle_root_bytes = bytes.fromhex(merkle_root)
-    # print("merkle_root_bytes", merkle_root_bytes.hex())
-    print("without hex ", merkle_root_bytes.hex())
-
-    # Format timestamp, bits, and nonce as 4-byte little-endian
-    timestamp_bytes = timestamp.to_bytes(4, byteorder="little")
 
     compact_target = get_compact(bits)
     print("compact_target:", hex(compact_target))
     difficulty_target_bytes = compact_target.to_bytes(4, byteorder="little")
-
-    # Initialize block header
-    block_header = (
-        version_bytes
-        + previous_block_hash_bytes
-        + merkle_root_bytes
-        + timestamp_bytes
-        + difficulty_target_bytes
-        + nonce.to_bytes(4, byteorder="little")
-    )
     print("bits", bits.to_bytes(32, byteorder="big").hex())
-    while True:
-        block_data = [coinbase_tx] + txids + [str(nonce)]
-        block_header = (
-            version_bytes
-            + previous_block_hash_bytes
-            + merkle_root_bytes
-            + timestamp_bytes
-            + difficulty_target_bytes
-            + nonce.to_bytes(4, byteorder="little")
-        )
-        block_hash = (
-            hashlib.sha256(hashlib.sha256(block_header).digest()).digest()[::-1].hex()
-        )
-
-        if (block_hash) < bits.to_bytes(32, byteorder="big").hex():
-            break
 
-        nonce += 1
-        if nonce % 1000000 == 0:
-            print(f"Trying nonce: {nonce}")
+    for extranonce in itertools.count():
+        coinbase_tx = build_coinbase(fees, extranonce, commitment)
+        tree.update(0, coinbase_tx.txid)
+        merkle_root_bytes = tree.root
+        print("merkle_root", merkle_root_bytes.hex())
+        header_head = version_bytes + previous_block_hash_bytes + merkle_root_bytes
+
+        if workers > 1:
+            found = parallel_search(
+                header_head, timestamp, difficulty_target_bytes, bits, workers
+            )
+            if found is not None:
+                worker_id, found_timestamp, nonce = found
+                print(f"worker {worker_id} found nonce {nonce} at timestamp {found_timestamp}")
+                break
+        else:
+            found = sequential_search(header_head, timestamp, difficulty_target_bytes, bits)
+            if found is not None:
+                found_timestamp, nonce = found
+                break
+        print(f"Timestamp range exhausted, rolling extranonce to {extranonce + 1}")
+
+    # Txids in the byte order displayed by block explorers, for the output file
+    txids = [coinbase_tx.txid_hex] + [tx.txid_hex for tx in transactions]
 
-    # Update the nonce_bytes in the block_header after proof of work
-    nonce_bytes = nonce.to_bytes(4, byteorder="little")
     print("nonce in mine_block", nonce)
     block_header = (
-        version_bytes
-        + previous_block_hash_bytes
-        + merkle_root_bytes
-        + timestamp_bytes
+        header_head
+        + TIMESTAMP.pack(found_timestamp)
         + difficulty_target_bytes
-        + nonce_bytes
+        + NONCE.pack(nonce)
     )
     print("block_header", block_header.hex())
     return {
@@ -161,9 +367,14 @@ def mine_block(transactions, difficulty_target):
         "coinbase_tx": coinbase_tx,
         "txids": txids,
         "nonce": nonce,
-        "merkle_root": merkle_root,
+        "merkle_root": merkle_root_bytes.hex(),
+        # Every level of the txid tree, for inclusion proofs of the block transactions
+        "merkle_tree": tree,
+        "timestamp": found_timestamp,
+        "extranonce": extranonce,
     }
 
+
 def compact_size(value):
     if value < 0xFD:
         return value.to_bytes(1, "little")
@@ -0,0 +1,76 @@
+import os
+import struct
+import sys
+
+import pytest
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEMPOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(SRC_DIR)), "mempool")
+
+# The modules under test import each other as top level packages (utils.*), as main.py does
+sys.path.insert(0, SRC_DIR)
+
+from utils.fileUtils import read_file  # noqa: E402
+from utils.transactionModel import Transaction, TxIn, TxOut  # noqa: E402
+
+
+def _read_varint(data, offset):
+    prefix = data[offset]
+    if prefix < 0xFD:
+        return prefix, offset + 1
+    size = {0xFD: 2, 0xFE: 4, 0xFF: 8}[prefix]
+    return int.from_bytes(data[offset + 1 : offset + 1 + size], "little"), offset + 1 + size
+
+
+def _parse_raw_transaction(raw_hex):
+    """
+    Decodes a legacy serialized transaction (no witness), e.g. from the BIP143 examples.
+
+    :param raw_hex: The serialized transaction, in hex.
+    :type raw_hex: str
+    :return: The transaction, without prevouts.
+    :rtype: Transaction
+    """
+    data = bytes.fromhex(raw_hex)
+    (version,) = struct.unpack_from("<L", data, 0)
+    count, offset = _read_varint(data, 4)
+    vin = []
+    for _ in range(count):
+        txid = data[offset : offset + 32]
+        (vout,) = struct.unpack_from("<L", data, offset + 32)
+        size, offset = _read_varint(data, offset + 36)
+        scriptsig = data[offset : offset + size]
+        (sequence,) = struct.unpack_from("<L", data, offset + size)
+        offset += size + 4
+        vin.append(TxIn(txid, vout, scriptsig, sequence))
+    count, offset = _read_varint(data, offset)
+    vout = []
+    for _ in range(count):
+        (value,) = struct.unpack_from("<Q", data, offset)
+        size, offset = _read_varint(data, offset + 8)
+        vout.append(TxOut(value, data[offset : offset + size]))
+        offset += size
+    (locktime,) = struct.unpack_from("<L", data, offset)
+    return Transaction(version, locktime, tuple(vin), tuple(vout))
+
+
+@pytest.fixture
+def raw_transaction():
+    """Decodes a legacy serialized transaction given in hex."""
+    return _parse_raw_transaction
+
+
+@pytest.fixture
+def mempool_path():
+    """The sample mempool directory, one JSON file per transaction."""
+    return MEMPOOL_DIR
+
+
+@pytest.fixture
+def mempool_transaction():
+    """Loads a transaction of the sample mempool by file name, without the .json suffix."""
+
+    def load(name):
+        return Transaction.from_dict(read_file(os.path.join(MEMPOOL_DIR, name + ".json")))
+
+    return load
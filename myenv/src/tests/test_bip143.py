@@ -0,0 +1,59 @@
+from utils.p2phk import p2wpkh_check
+from utils.sighash import SIGHASH_ALL, Bip143Sighash, p2wpkh_script_code
+from utils.signatureBackend import get_backend
+from utils.transactionModel import TxOut
+
+# Sample mempool transaction whose P2WPKH inputs all carry valid signatures
+P2WPKH_TX = "00c4387b3de5d0376b3df4db81a6016b584aad10c5aff619d15627e43ca4d697"
+
+
+def test_bip143_native_p2wpkh_vector(raw_transaction):
+    # BIP143 "Native P2WPKH" example, second input
+    tx = raw_transaction(
+        "0100000002fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f0000000000"
+        "eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ff"
+        "ffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d"
+        "000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac11000000"
+    )
+    engine = Bip143Sighash(tx)
+    assert engine.hash_prevouts().hex() == (
+        "96b827c8483d4e9b96712b6713a7b68d6e8003a781feba36c31143470b4efd37"
+    )
+    assert engine.hash_sequence().hex() == (
+        "52b0a642eea2fb7ae638c36f6252b6750293dbe574a806984b8e4d8548339a3b"
+    )
+    assert engine.hash_outputs().hex() == (
+        "863ef3e1a92afbfdb97f31ad0fc7683ee943e9abcf2501590ff8f6551f47e5e5"
+    )
+    script_code = p2wpkh_script_code(bytes.fromhex("1d0f172a0ecb48aee1be1f2687d2963ae33f71a1"))
+    assert engine.sighash(1, script_code, 600000000, SIGHASH_ALL).hex() == (
+        "c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670"
+    )
+
+
+def test_bip143_p2sh_p2wpkh_vector(raw_transaction):
+    # BIP143 "P2SH-P2WPKH" example
+    tx = raw_transaction(
+        "0100000001db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a54770100000000"
+        "feffffff02b8b4eb0b000000001976a914a457b684d7f0d539a46a45bbc043f35b59d0d96388ac0008af"
+        "2f000000001976a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c88ac92040000"
+    )
+    script_code = p2wpkh_script_code(bytes.fromhex("79091972186c449eb1ded22b78e40d009bdf0089"))
+    assert Bip143Sighash(tx).sighash(0, script_code, 1000000000, SIGHASH_ALL).hex() == (
+        "64f3b0f4dd2bb3aa1ce8566d220cc74dda9df97d8490cc81d89d735c92e59fb6"
+    )
+
+
+def test_p2wpkh_inputs_verify(mempool_transaction):
+    tx = mempool_transaction(P2WPKH_TX)
+    backend = get_backend()
+    engines = {}
+    for idx in range(len(tx.vin)):
+        assert backend.verify(*p2wpkh_check(tx, idx, engines))
+
+
+def test_p2wpkh_signature_commits_to_the_amount(mempool_transaction):
+    tx = mempool_transaction(P2WPKH_TX)
+    prevout = tx.vin[0].prevout
+    tx.vin[0].prevout = TxOut(prevout.value + 1, prevout.scriptpubkey)
+    assert not get_backend().verify(*p2wpkh_check(tx, 0, {}))
@@ -0,0 +1,99 @@
+import hashlib
+import struct
+
+import pytest
+
+from utils.p2phk import p2pkh_check
+from utils.sighash import (
+    SIGHASH_ALL,
+    SIGHASH_ANYONECANPAY,
+    SIGHASH_NONE,
+    SIGHASH_SINGLE,
+    SIGHASH_SINGLE_BUG,
+    LegacySighash,
+)
+from utils.signatureBackend import get_backend
+from utils.transactionModel import Transaction, TxOut, encode_varint
+
+# Sample mempool transaction whose P2PKH inputs all carry valid signatures
+P2PKH_TX = "01f16e8312f9c882e869d31a3ab386b94a38f6091f7e947c6f2ed2b3389f4406"
+
+LEGACY_HASH_TYPES = [
+    SIGHASH_ALL,
+    SIGHASH_NONE,
+    SIGHASH_SINGLE,
+    SIGHASH_ALL | SIGHASH_ANYONECANPAY,
+    SIGHASH_NONE | SIGHASH_ANYONECANPAY,
+    SIGHASH_SINGLE | SIGHASH_ANYONECANPAY,
+]
+
+
+def _double_sha256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _naive_legacy_sighash(tx, input_idx, script_code, hash_type):
+    # Straight transcription of the original SignatureHash, rebuilding the whole copy per input
+    base_type = hash_type & 0x1F
+    if base_type == SIGHASH_SINGLE and input_idx >= len(tx.vout):
+        return SIGHASH_SINGLE_BUG
+    inputs = []
+    for idx, inp in enumerate(tx.vin):
+        if hash_type & SIGHASH_ANYONECANPAY and idx != input_idx:
+            continue
+        script = script_code if idx == input_idx else b""
+        sequence = inp.sequence
+        if idx != input_idx and base_type in (SIGHASH_NONE, SIGHASH_SINGLE):
+            sequence = 0
+        inputs.append(
+            inp.txid
+            + struct.pack("<L", inp.vout)
+            + encode_varint(len(script))
+            + script
+            + struct.pack("<L", sequence)
+        )
+    outputs = list(tx.vout)
+    if base_type == SIGHASH_NONE:
+        outputs = []
+    elif base_type == SIGHASH_SINGLE:
+        outputs = [TxOut(0xFFFFFFFFFFFFFFFF, b"")] * input_idx + [tx.vout[input_idx]]
+    serialized = (
+        struct.pack("<L", tx.version)
+        + encode_varint(len(inputs))
+        + b"".join(inputs)
+        + encode_varint(len(outputs))
+        + b"".join(
+            struct.pack("<Q", out.value) + encode_varint(len(out.scriptpubkey)) + out.scriptpubkey
+            for out in outputs
+        )
+        + struct.pack("<L", tx.locktime)
+        + struct.pack("<L", hash_type)
+    )
+    return _double_sha256(serialized)
+
+
+@pytest.mark.parametrize("hash_type", LEGACY_HASH_TYPES)
+def test_legacy_sighash_matches_naive_algorithm(mempool_transaction, hash_type):
+    tx = mempool_transaction(P2PKH_TX)
+    engine = LegacySighash(tx)
+    for idx, inp in enumerate(tx.vin):
+        script_code = inp.prevout.scriptpubkey
+        expected = _naive_legacy_sighash(tx, idx, script_code, hash_type)
+        assert engine.sighash(idx, script_code, hash_type) == expected
+
+
+def test_legacy_sighash_single_bug(mempool_transaction):
+    tx = mempool_transaction(P2PKH_TX)
+    # One output only, so every input past the first signs the constant 1
+    tx = Transaction(tx.version, tx.locktime, tx.vin, tx.vout[:1])
+    assert LegacySighash(tx).sighash(1, tx.vin[1].prevout.scriptpubkey, SIGHASH_SINGLE) == (
+        SIGHASH_SINGLE_BUG
+    )
+
+
+def test_p2pkh_inputs_verify(mempool_transaction):
+    tx = mempool_transaction(P2PKH_TX)
+    backend = get_backend()
+    engines = {}
+    for idx in range(len(tx.vin)):
+        assert backend.verify(*p2pkh_check(tx, idx, engines))
@@ -0,0 +1,147 @@
+from utils.blockTemplate import MempoolGraph, build_block_template
+from utils.mempoolUtils import OutpointIndex, _merge
+from utils.transactionModel import Transaction, TxIn, TxOut
+
+INPUT_VALUE = 100000
+P2WPKH_SCRIPT = bytes.fromhex("0014") + bytes(20)
+
+
+def make_tx(name, spends, fee):
+    """
+    Builds a transaction spending the given outpoints and paying the given fee. The name goes
+    into the scriptsigs, so transactions spending the same outpoints still get distinct txids.
+    """
+    vin = tuple(
+        TxIn(txid, vout, name.encode(), 0xFFFFFFFF, prevout=TxOut(INPUT_VALUE, P2WPKH_SCRIPT))
+        for txid, vout in spends
+    )
+    vout = (TxOut(INPUT_VALUE * len(spends) - fee, P2WPKH_SCRIPT),)
+    return Transaction(2, 0, vin, vout)
+
+
+def outpoint(byte, vout=0):
+    return bytes((byte,)) * 32, vout
+
+
+def txids(transactions):
+    return [tx.txid for tx in transactions]
+
+
+def test_higher_fee_rate_replaces_the_conflict():
+    low = make_tx("a", [outpoint(1)], 100)
+    high = make_tx("b", [outpoint(1)], 200)
+    index = OutpointIndex()
+    assert index.add(low)
+    assert index.add(high)
+    assert txids(index.transactions()) == [high.txid]
+    assert txids(index.evicted) == [low.txid]
+    assert index.spenders[outpoint(1)] == high.txid
+
+
+def test_ties_keep_the_first_transaction():
+    first = make_tx("a", [outpoint(1)], 100)
+    second = make_tx("b", [outpoint(1)], 100)
+    index = OutpointIndex()
+    assert index.add(first)
+    assert not index.add(second)
+    assert txids(index.transactions()) == [first.txid]
+    assert txids(index.evicted) == [second.txid]
+
+
+def test_newcomer_must_beat_every_conflict():
+    a = make_tx("a", [outpoint(1)], 5000)
+    b = make_tx("b", [outpoint(2)], 100)
+    both = make_tx("c", [outpoint(1), outpoint(2)], 3000)
+    index = OutpointIndex()
+    index.add(a)
+    index.add(b)
+    # Beats b, but not a, so nothing is replaced
+    assert not index.add(both)
+    assert txids(index.transactions()) == [a.txid, b.txid]
+
+    richer = make_tx("d", [outpoint(1), outpoint(2)], 20000)
+    assert index.add(richer)
+    assert txids(index.transactions()) == [richer.txid]
+    assert set(txids(index.evicted)) == {both.txid, a.txid, b.txid}
+
+
+def test_duplicate_transaction_is_kept_once():
+    tx = make_tx("a", [outpoint(1)], 100)
+    index = OutpointIndex()
+    assert index.add(tx)
+    assert not index.add(make_tx("a", [outpoint(1)], 100))
+    assert txids(index.transactions()) == [tx.txid]
+    assert index.evicted == []
+    assert index.excluded_txids() == set()
+
+
+def test_descendants_of_evicted_transactions_are_dropped():
+    parent = make_tx("a", [outpoint(1)], 100)
+    child = make_tx("child", [(parent.txid, 0)], 100)
+    grandchild = make_tx("grandchild", [(child.txid, 0)], 100)
+    unrelated = make_tx("other", [outpoint(2)], 100)
+    replacement = make_tx("b", [outpoint(1)], 1000)
+    index = OutpointIndex()
+    for tx in (parent, child, grandchild, unrelated, replacement):
+        index.add(tx)
+    assert txids(index.transactions()) == [unrelated.txid, replacement.txid]
+    assert index.excluded_txids() == {parent.txid, child.txid, grandchild.txid}
+
+
+def test_descendants_of_rejected_transactions_are_dropped():
+    rejected = make_tx("rejected", [outpoint(1)], 100)
+    child = make_tx("child", [(rejected.txid, 0)], 100)
+    grandchild = make_tx("grandchild", [(child.txid, 0)], 100)
+    index = OutpointIndex()
+    index.add(child)
+    index.add(grandchild)
+    index.reject(rejected.txid)
+    assert index.transactions() == []
+    assert index.excluded_txids() == {rejected.txid, child.txid, grandchild.txid}
+
+
+def test_rejected_copy_of_a_kept_transaction():
+    # The same txid listed twice, one copy rejected: the valid copy keeps its children
+    parent = make_tx("a", [outpoint(1)], 100)
+    child = make_tx("child", [(parent.txid, 0)], 100)
+    index = OutpointIndex()
+    index.add(parent)
+    index.add(child)
+    index.reject(parent.txid)
+    assert txids(index.transactions()) == [parent.txid, child.txid]
+    assert index.excluded_txids() == set()
+
+
+def test_merge_drops_children_of_transactions_rejected_in_another_shard():
+    rejected = make_tx("rejected", [outpoint(1)], 100)
+    child = make_tx("child", [(rejected.txid, 0)], 100)
+    kept = make_tx("kept", [outpoint(2)], 100)
+    shards = [([child], [], []), ([kept], [], [rejected.txid])]
+    valid, num_valid, excluded = _merge(shards)
+    assert txids(valid) == [kept.txid]
+    assert num_valid == 1
+    assert excluded == {rejected.txid, child.txid}
+
+
+def test_graph_drops_candidates_spending_excluded_transactions():
+    parent = make_tx("a", [outpoint(1)], 100)
+    child = make_tx("child", [(parent.txid, 0)], 100)
+    orphan = make_tx("orphan", [outpoint(9)], 100)
+    orphan_child = make_tx("orphan child", [(orphan.txid, 0)], 5000)
+    candidates = [parent, child, orphan_child]
+    graph = MempoolGraph(candidates, excluded_txids={orphan.txid})
+    assert txids(graph.transactions) == [parent.txid, child.txid]
+    assert txids(graph.dropped) == [orphan_child.txid]
+    assert graph.parents == [frozenset(), frozenset({0})]
+
+    template = build_block_template(candidates, excluded_txids={orphan.txid})
+    assert txids(template["transactions"]) == [parent.txid, child.txid]
+    assert template["fees"] == 200
+
+
+def test_template_orders_parents_before_children():
+    parent = make_tx("a", [outpoint(1)], 10)
+    child = make_tx("child", [(parent.txid, 0)], 10000)
+    template = build_block_template([child, parent])
+    assert txids(template["transactions"]) == [parent.txid, child.txid]
+    assert template["weight"] == parent.weight + child.weight
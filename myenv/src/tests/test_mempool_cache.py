@@ -0,0 +1,132 @@
+import os
+import shutil
+
+import pytest
+
+from utils import mempoolCache
+from utils.fileUtils import read_file
+from utils.mempoolCache import (
+    decode_transaction,
+    encode_transaction,
+    load_records,
+    read_index,
+    refresh_cache,
+)
+from utils.transactionModel import Transaction
+
+SAMPLE_FILES = [
+    "0183b7cc0d270638fc8d51be094a76ada65b7f5f2044512ed42437f97fa999ac.json",
+    "00c4387b3de5d0376b3df4db81a6016b584aad10c5aff619d15627e43ca4d697.json",
+    "064823c581289453aefdc0c2db50a3a1f9e9f26e36390bb560c1347cf052c9c7.json",
+]
+OTHER_FILE = "0022a52ad27796a1a2d9eddd6f4b055c097b51ad7cb8f000fe0d78b26cb71639.json"
+
+
+def output_fields(output):
+    return output.value, output.scriptpubkey, output.script_type, output.address
+
+
+def same_transaction(left, right):
+    # The serialization covers everything but the prevouts and the mempool metadata
+    def fields(tx):
+        inputs = [
+            (inp.is_coinbase, inp.prevout and output_fields(inp.prevout)) for inp in tx.vin
+        ]
+        return inputs, [output_fields(out) for out in tx.vout]
+
+    return left.serialize_witness() == right.serialize_witness() and fields(left) == fields(right)
+
+
+@pytest.fixture
+def mempool_dir(tmp_path, mempool_path):
+    # A copy of a few sample files, free to be modified
+    directory = tmp_path / "mempool"
+    directory.mkdir()
+    for name in SAMPLE_FILES:
+        shutil.copy(os.path.join(mempool_path, name), directory / name)
+    return str(directory)
+
+
+@pytest.fixture
+def parsed_files(monkeypatch):
+    # Names of the files refresh_cache parses, instead of taking from the cache
+    parsed = []
+    encode_file = mempoolCache.encode_file
+
+    def counting_encode_file(file_path):
+        parsed.append(os.path.basename(file_path))
+        return encode_file(file_path)
+
+    monkeypatch.setattr(mempoolCache, "encode_file", counting_encode_file)
+    return parsed
+
+
+def test_records_round_trip_every_sample_transaction(mempool_path):
+    names = sorted(name for name in os.listdir(mempool_path) if name.endswith(".json"))
+    for name in names:
+        tx = Transaction.from_dict(read_file(os.path.join(mempool_path, name)))
+        record = encode_transaction(tx)
+        # Records are read in place from the middle of the data file
+        decoded = decode_transaction(b"\xaa" * 5 + record, 5)
+        assert same_transaction(tx, decoded), name
+        assert decoded.txid == tx.txid and decoded.wtxid == tx.wtxid
+
+
+def test_warm_cache_parses_nothing(mempool_dir, tmp_path, parsed_files):
+    cache_path = str(tmp_path / "cache")
+    records = refresh_cache(mempool_dir, cache_path)
+    assert sorted(parsed_files) == sorted(SAMPLE_FILES)
+    token = read_index(cache_path)[0]
+
+    parsed_files.clear()
+    assert refresh_cache(mempool_dir, cache_path) == records
+    assert parsed_files == []
+    # Nothing changed, so the cache is not rewritten
+    assert read_index(cache_path)[0] == token
+    loaded = load_records(cache_path, records)
+    for (name, _, _), tx in zip(records, loaded):
+        original = Transaction.from_dict(read_file(os.path.join(mempool_dir, name)))
+        assert same_transaction(tx, original)
+
+
+def test_touched_file_is_parsed_again(mempool_dir, tmp_path, parsed_files):
+    cache_path = str(tmp_path / "cache")
+    refresh_cache(mempool_dir, cache_path)
+    parsed_files.clear()
+
+    touched = os.path.join(mempool_dir, SAMPLE_FILES[1])
+    stat = os.stat(touched)
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    refresh_cache(mempool_dir, cache_path)
+    assert parsed_files == [SAMPLE_FILES[1]]
+
+
+def test_replaced_file_is_parsed_again(mempool_path, mempool_dir, tmp_path, parsed_files):
+    cache_path = str(tmp_path / "cache")
+    refresh_cache(mempool_dir, cache_path)
+    parsed_files.clear()
+
+    # Other content and size under the same name, with the mtime put back
+    replaced = os.path.join(mempool_dir, SAMPLE_FILES[0])
+    stat = os.stat(replaced)
+    shutil.copy(os.path.join(mempool_path, OTHER_FILE), replaced)
+    os.utime(replaced, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    records = refresh_cache(mempool_dir, cache_path)
+    assert parsed_files == [SAMPLE_FILES[0]]
+
+    tx = load_records(cache_path, [entry for entry in records if entry[0] == SAMPLE_FILES[0]])[0]
+    assert same_transaction(tx, Transaction.from_dict(read_file(replaced)))
+
+
+def test_added_and_removed_files(mempool_path, mempool_dir, tmp_path, parsed_files):
+    cache_path = str(tmp_path / "cache")
+    refresh_cache(mempool_dir, cache_path)
+    parsed_files.clear()
+
+    os.remove(os.path.join(mempool_dir, SAMPLE_FILES[2]))
+    shutil.copy(os.path.join(mempool_path, OTHER_FILE), mempool_dir)
+    records = refresh_cache(mempool_dir, cache_path)
+    assert parsed_files == [OTHER_FILE]
+    assert [name for name, _, _ in records] == sorted(
+        [SAMPLE_FILES[0], SAMPLE_FILES[1], OTHER_FILE]
+    )
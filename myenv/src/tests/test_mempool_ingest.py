@@ -0,0 +1,39 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from utils.fileUtils import read_file
+from utils.mempoolUtils import list_mempool, load_mempool, stream_mempool
+
+# Enough sample files for several batches, with both valid and rejected transactions
+SAMPLE_SIZE = 30
+
+
+@pytest.fixture
+def small_mempool(tmp_path, mempool_path):
+    # The same transactions as a mempool directory and as a JSON-lines snapshot
+    directory = tmp_path / "mempool"
+    directory.mkdir()
+    names = list_mempool(mempool_path)[:SAMPLE_SIZE]
+    with open(tmp_path / "mempool.jsonl", "w") as snapshot:
+        for name in names:
+            shutil.copy(os.path.join(mempool_path, name), directory / name)
+            snapshot.write(json.dumps(read_file(directory / name)) + "\n")
+    return str(directory), str(tmp_path / "mempool.jsonl")
+
+
+@pytest.mark.parametrize("workers, batch_size", [(1, 7), (1, 1000), (2, 7)])
+def test_streaming_selects_the_same_transactions(small_mempool, workers, batch_size):
+    directory, snapshot = small_mempool
+    valid, num_valid, excluded = load_mempool(directory, workers=1)
+    # A sample with nothing rejected would not exercise the exclusions
+    assert 0 < num_valid < SAMPLE_SIZE
+
+    streamed, num_streamed, streamed_excluded = stream_mempool(
+        snapshot, workers=workers, batch_size=batch_size
+    )
+    assert [tx.txid for tx in streamed] == [tx.txid for tx in valid]
+    assert num_streamed == num_valid
+    assert streamed_excluded == excluded
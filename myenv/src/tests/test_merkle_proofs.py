@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from utils.merkleTree import (
+    MerkleTree,
+    MultiProof,
+    root_from_branch,
+    verify_multi_proof,
+    verify_proofs,
+)
+
+
+def random_tree(seed, count):
+    rng = random.Random(seed)
+    return rng, MerkleTree([rng.getrandbits(256).to_bytes(32, "little") for _ in range(count)])
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 8, 13])
+def test_branches_fold_to_the_root(count):
+    _, tree = random_tree(count, count)
+    for index, leaf in enumerate(tree.leaves):
+        branch = tree.branch(index)
+        assert root_from_branch(leaf, index, branch) == tree.root
+        # The branch only proves the leaf at its own position
+        if index ^ 1 < count:
+            assert root_from_branch(leaf, index ^ 1, branch) != tree.root
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_multi_proofs(seed):
+    rng, tree = random_tree(seed, 1 + seed * 6)
+    for _ in range(10):
+        chosen = rng.sample(tree.leaves, rng.randrange(1, min(len(tree), 8) + 1))
+        proof = tree.multi_proof(chosen)
+        leaves = [tree.leaves[index] for index in proof.indexes]
+        assert proof.indexes == sorted(tree.index(leaf) for leaf in chosen)
+        assert verify_multi_proof(tree.root, proof, leaves)
+        # Shared nodes are sent once, so the proof is never larger than separate branches
+        assert len(proof.hashes) <= sum(len(tree.branch(index)) for index in proof.indexes)
+
+
+def test_multi_proof_of_every_leaf_needs_no_hashes():
+    _, tree = random_tree(1, 11)
+    proof = tree.multi_proof(tree.leaves)
+    assert proof.hashes == []
+    assert verify_multi_proof(tree.root, proof, tree.leaves)
+
+
+def test_tampered_multi_proofs_fail():
+    _, tree = random_tree(3, 21)
+    proof = tree.multi_proof([tree.leaves[2], tree.leaves[9], tree.leaves[20]])
+    leaves = [tree.leaves[index] for index in proof.indexes]
+    assert verify_multi_proof(tree.root, proof, leaves)
+
+    # A wrong leaf, hash, position or leaf count
+    assert not verify_multi_proof(tree.root, proof, [leaves[0], leaves[0], leaves[2]])
+    bad_hashes = [proof.hashes[0][::-1]] + proof.hashes[1:]
+    assert not verify_multi_proof(tree.root, MultiProof(21, proof.indexes, bad_hashes), leaves)
+    assert not verify_multi_proof(tree.root, MultiProof(21, [3, 9, 20], proof.hashes), leaves)
+    assert not verify_multi_proof(tree.root, MultiProof(20, proof.indexes, proof.hashes), leaves)
+    # Missing, extra or no hashes at all
+    missing = proof.hashes[:-1]
+    assert not verify_multi_proof(tree.root, MultiProof(21, proof.indexes, missing), leaves)
+    extra = proof.hashes + [proof.hashes[0]]
+    assert not verify_multi_proof(tree.root, MultiProof(21, proof.indexes, extra), leaves)
+    assert not verify_multi_proof(tree.root, MultiProof(21, [], []), [])
+    assert not verify_multi_proof(tree.root, proof, leaves[:2])
+
+
+def test_forged_multi_proofs_fail():
+    _, tree = random_tree(6, 3)
+    leaves = tree.leaves
+    forged = b"\xee" * 32
+    # Positions out of range, unsorted or repeated leave the forged leaf out of the root
+    proof = MultiProof(3, [5, 0], [leaves[1], tree.levels[1][1]])
+    assert not verify_multi_proof(tree.root, proof, [forged, leaves[0]])
+    proof = MultiProof(3, [0, 0], [leaves[1], tree.levels[1][1]])
+    assert not verify_multi_proof(tree.root, proof, [forged, leaves[0]])
+    assert not verify_multi_proof(tree.root, proof, [leaves[0], forged])
+    proof = MultiProof(3, [1, 0], [tree.levels[1][1]])
+    assert not verify_multi_proof(tree.root, proof, [leaves[1], leaves[0]])
+    proof = MultiProof(3, [-1, 0], [leaves[1], tree.levels[1][1]])
+    assert not verify_multi_proof(tree.root, proof, [forged, leaves[0]])
+
+
+def test_multi_proof_of_an_unknown_leaf():
+    _, tree = random_tree(4, 6)
+    with pytest.raises(ValueError):
+        tree.multi_proof([b"\x00" * 32])
+
+
+def test_verify_proofs_batch():
+    _, tree = random_tree(5, 17)
+    proofs = [(leaf, index, tree.branch(index)) for index, leaf in enumerate(tree.leaves)]
+    assert verify_proofs(tree.root, proofs) == [True] * 17
+
+    leaf, index, branch = proofs[4]
+    bad = [
+        (leaf[::-1], index, branch),
+        (leaf, index + 1, branch),
+        # An index with bits beyond the branch length
+        (leaf, index + (1 << len(branch)), branch),
+        (leaf, index, branch[:-1]),
+    ]
+    assert verify_proofs(tree.root, proofs[:2] + bad) == [True, True, False, False, False, False]
+    assert verify_proofs(tree.root, []) == []
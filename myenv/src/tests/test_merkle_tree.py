@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from utils.merkleTree import MerkleTree, hash_pair
+
+# Block 100000, txids and merkle root as shown by block explorers
+BLOCK_100000_TXIDS = [
+    "8c14f0db3df150123e6f3dbbf30f8b955a8249b62ac1d1ff16284aefa3d06d87",
+    "fff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4",
+    "6359f0868171b1d194cbee1af2f16ea598ae8fad666d9b012c8ed2b79a236ec4",
+    "e9a66845e05d5abc0ad04ec80f774a7e585c6e8db975962d069a522137b80c1d",
+]
+BLOCK_100000_ROOT = "f3e94742aca4b5ef85488dc37c06c3282295ffec960994b2c0d5ac2a25a95766"
+
+
+def naive_root(leaves):
+    # Rebuilds every level from scratch, duplicating the last node of odd levels
+    if not leaves:
+        return None
+    level = list(leaves)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def random_leaf(rng):
+    return rng.getrandbits(256).to_bytes(32, "little")
+
+
+def assert_consistent(tree, leaves):
+    assert tree.leaves == leaves
+    assert tree.root == naive_root(leaves)
+    # The kept levels must match a tree built from scratch, not only the root
+    assert tree.levels == MerkleTree(leaves).levels
+
+
+def test_block_merkle_root():
+    tree = MerkleTree([bytes.fromhex(txid)[::-1] for txid in BLOCK_100000_TXIDS])
+    assert tree.root[::-1].hex() == BLOCK_100000_ROOT
+
+
+@pytest.mark.parametrize("count", range(0, 18))
+def test_build_matches_naive(count):
+    rng = random.Random(count)
+    leaves = [random_leaf(rng) for _ in range(count)]
+    tree = MerkleTree(leaves)
+    assert len(tree) == count
+    assert tree.root == naive_root(leaves)
+
+
+def test_single_leaf_is_the_root():
+    leaf = bytes(range(32))
+    assert MerkleTree([leaf]).root == leaf
+    assert MerkleTree().root is None
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_updates_match_naive(seed):
+    rng = random.Random(seed)
+    leaves = [random_leaf(rng) for _ in range(rng.randrange(0, 40))]
+    tree = MerkleTree(leaves)
+    for _ in range(200):
+        action = rng.random()
+        if action < 0.4 or not leaves:
+            leaf = random_leaf(rng)
+            leaves.append(leaf)
+            tree.append(leaf)
+        elif action < 0.7:
+            index = rng.randrange(len(leaves))
+            leaf = random_leaf(rng)
+            leaves[index] = leaf
+            tree.update(index, leaf)
+        else:
+            index = rng.randrange(len(leaves))
+            del leaves[index]
+            tree.remove(index)
+        assert_consistent(tree, leaves)
+
+
+def test_remove_down_to_empty_and_regrow():
+    rng = random.Random(7)
+    leaves = [random_leaf(rng) for _ in range(9)]
+    tree = MerkleTree(leaves)
+    while leaves:
+        del leaves[0]
+        tree.remove(0)
+        assert_consistent(tree, leaves)
+    assert tree.root is None
+    for _ in range(5):
+        leaf = random_leaf(rng)
+        leaves.append(leaf)
+        tree.append(leaf)
+        assert_consistent(tree, leaves)
+
+
+def test_index_follows_changes():
+    leaves = [bytes((i,)) * 32 for i in range(5)]
+    tree = MerkleTree(leaves)
+    assert tree.index(leaves[3]) == 3
+    tree.remove(1)
+    assert tree.index(leaves[3]) == 2
+    tree.update(0, b"\xff" * 32)
+    assert tree.index(b"\xff" * 32) == 0
+    with pytest.raises(ValueError):
+        tree.index(leaves[0])
@@ -0,0 +1,110 @@
+import hashlib
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from mining import (
+    TIMESTAMP,
+    build_coinbase,
+    mine_block,
+    parallel_search,
+    witness_commitment,
+)
+
+HEADER_HEAD = bytes(range(68))
+BITS = bytes.fromhex("ffff001f")
+# Every header meets this target, so mine_block returns on the first nonce
+EASY_TARGET = "ff" * 32
+
+P2PKH_TX = "01f16e8312f9c882e869d31a3ab386b94a38f6091f7e947c6f2ed2b3389f4406"
+P2WPKH_TX = "00c4387b3de5d0376b3df4db81a6016b584aad10c5aff619d15627e43ca4d697"
+TAPROOT_TX = "0022a52ad27796a1a2d9eddd6f4b055c097b51ad7cb8f000fe0d78b26cb71639"
+
+
+def block_hash(header):
+    return hashlib.sha256(hashlib.sha256(header).digest()).digest()
+
+
+def naive_root(leaves):
+    level = list(leaves)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [block_hash(level[i] + level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def test_parallel_search_finds_a_header_below_the_target():
+    target = 1 << 248
+    found = parallel_search(HEADER_HEAD, 1700000000, BITS, target, workers=2, chunk_size=256)
+    assert found is not None
+    _, timestamp, nonce = found
+    header = HEADER_HEAD + TIMESTAMP.pack(timestamp) + BITS + nonce.to_bytes(4, "little")
+    assert int.from_bytes(block_hash(header), "little") < target
+
+
+def test_parallel_search_fails_when_a_worker_dies():
+    def kill_a_worker():
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            children = multiprocessing.active_children()
+            if children:
+                os.kill(children[0].pid, signal.SIGKILL)
+                return
+            time.sleep(0.01)
+
+    killer = threading.Thread(target=kill_a_worker)
+    killer.start()
+    # A target no header meets, so the workers would search for a very long time
+    with pytest.raises(RuntimeError):
+        parallel_search(HEADER_HEAD, 1700000000, BITS, 1, workers=2, chunk_size=256)
+    killer.join()
+    assert not multiprocessing.active_children()
+
+
+def test_witness_commitment_matches_a_naive_wtxid_root(mempool_transaction):
+    transactions = [mempool_transaction(name) for name in (P2PKH_TX, P2WPKH_TX, TAPROOT_TX)]
+    block = mine_block(transactions, EASY_TARGET)
+    coinbase = block["coinbase_tx"]
+
+    # BIP141: the coinbase wtxid counts as zero, and the commitment hashes the witness root
+    # with the reserved value held by the coinbase witness
+    witness_root = naive_root([bytes(32)] + [tx.wtxid for tx in transactions])
+    reserved_value = coinbase.vin[0].witness
+    assert reserved_value == (bytes(32),)
+    commitment = block_hash(witness_root + reserved_value[0])
+    assert witness_commitment(witness_root) == commitment
+
+    # OP_RETURN, a 36 byte push: the aa21a9ed header then the commitment
+    scriptpubkey = coinbase.vout[-1].scriptpubkey
+    assert len(scriptpubkey) == 38
+    assert scriptpubkey[:6] == bytes.fromhex("6a24aa21a9ed")
+    assert scriptpubkey[6:] == commitment
+    assert coinbase.vout[-1].value == 0
+
+    # The coinbase is serialized with its witness, and the merkle root covers its txid
+    assert coinbase.serialize_witness()[4:6] == b"\x00\x01"
+    txid_root = naive_root([coinbase.txid] + [tx.txid for tx in transactions])
+    assert block["block_header"][36:68] == txid_root
+
+
+def test_blocks_without_witness_data_have_no_commitment(mempool_transaction):
+    block = mine_block([mempool_transaction(P2PKH_TX)], EASY_TARGET)
+    coinbase = block["coinbase_tx"]
+    assert len(coinbase.vout) == 1
+    assert coinbase.vin[0].witness == ()
+    assert coinbase.serialize_witness() == coinbase.serialize_legacy()
+
+
+def test_coinbase_pays_the_subsidy_and_fees():
+    coinbase = build_coinbase(1000, 7, witness_commitment(bytes(32)))
+    assert coinbase.vin[0].is_coinbase
+    assert coinbase.vout[0].value == 312500000 + 1000
+    # The extranonce changes the txid, not the commitment output
+    other = build_coinbase(1000, 8, witness_commitment(bytes(32)))
+    assert other.txid != coinbase.txid
+    assert other.vout[-1].scriptpubkey == coinbase.vout[-1].scriptpubkey
@@ -0,0 +1,318 @@
+import hashlib
+
+import pytest
+
+from utils.p2phk import (
+    hash160,
+    is_valid_signature_encoding,
+    p2sh_check,
+    parse_der_signature,
+    parse_pushes,
+    verify_transactions,
+)
+from utils.scriptInterpreter import (
+    MAX_ELEMENT_SIZE,
+    MAX_OPS_PER_SCRIPT,
+    OP_0,
+    OP_1,
+    OP_16,
+    OP_1NEGATE,
+    OP_CHECKLOCKTIMEVERIFY,
+    OP_CHECKMULTISIG,
+    OP_CHECKSEQUENCEVERIFY,
+    OP_CHECKSIG,
+    OP_CODESEPARATOR,
+    OP_DROP,
+    OP_DUP,
+    OP_ELSE,
+    OP_ENDIF,
+    OP_EQUAL,
+    OP_HASH160,
+    OP_IF,
+    OP_NOP,
+    OP_NOTIF,
+    OP_PICK,
+    OP_PUSHDATA1,
+    OP_PUSHDATA2,
+    OP_RETURN,
+    OP_ROLL,
+    OP_SHA256,
+    OP_SWAP,
+    ScriptError,
+    cast_to_bool,
+    compile_script,
+    decode_num,
+    encode_num,
+    execute,
+    verify_script,
+)
+from utils.transactionModel import Transaction, TxIn, TxOut
+
+OP_2, OP_3, OP_5 = OP_1 + 1, OP_1 + 2, OP_1 + 4
+OP_CAT = 0x7E
+OP_ADD = 0x93
+OP_SUB = 0x94
+
+# Sample mempool transactions whose P2SH and P2WSH inputs all carry valid signatures
+SCRIPT_TXS = [
+    "064823c581289453aefdc0c2db50a3a1f9e9f26e36390bb560c1347cf052c9c7",
+    "024a0301e7e8ef9c311a9c1761cad1418446bec51ce2832c91b08326fe4e999b",
+    "1d792af99801cce57eba95f12d4cff0cc6dcafbb85974931677bbfffa871468f",
+]
+
+
+class FakeChecker:
+    """Accepts the (signature, public key) pairs it was given and timelocks up to a limit."""
+
+    def __init__(self, valid_pairs=(), max_locktime=0, max_sequence=0):
+        self.valid_pairs = set(valid_pairs)
+        self.max_locktime = max_locktime
+        self.max_sequence = max_sequence
+        self.script_codes = []
+
+    def check_signature(self, signature, public_key, script_code):
+        self.script_codes.append(script_code)
+        return (signature, public_key) in self.valid_pairs
+
+    def check_locktime(self, locktime):
+        return locktime <= self.max_locktime
+
+    def check_sequence(self, sequence):
+        return sequence <= self.max_sequence
+
+
+def push(data):
+    if len(data) < OP_PUSHDATA1:
+        return bytes((len(data),)) + data
+    if len(data) <= 0xFF:
+        return bytes((OP_PUSHDATA1, len(data))) + data
+    return bytes((OP_PUSHDATA2,)) + len(data).to_bytes(2, "little") + data
+
+
+def run(script, stack=None, checker=None, **kwargs):
+    return verify_script(bytes(script), list(stack or []), checker or FakeChecker(), **kwargs)
+
+
+def p2sh_spend(scriptsig, redeem_script):
+    # A transaction whose only input spends the P2SH output of the redeem script
+    scriptpubkey = b"\xa9\x14" + hash160(redeem_script) + b"\x87"
+    inp = TxIn(bytes(32), 0, scriptsig, 0xFFFFFFFF, prevout=TxOut(1000, scriptpubkey, "p2sh"))
+    return Transaction(2, 0, (inp,), (TxOut(900, b"\x6a"),))
+
+
+@pytest.mark.parametrize(
+    "value",
+    [0, 1, -1, 16, 127, -127, 128, -128, 255, 256, -256, 0x7FFF, 0x8000, 2**31 - 1, -(2**31 - 1)],
+)
+def test_script_numbers_round_trip(value):
+    encoded = encode_num(value)
+    assert decode_num(encoded) == value
+    # Minimal encoding: no trailing zero byte unless it carries the sign
+    assert not encoded or encoded[-1] & 0x7F or len(encoded) > 1 and encoded[-2] & 0x80
+
+
+def test_script_number_encodings():
+    assert encode_num(-1) == b"\x81"
+    assert encode_num(128) == b"\x80\x00"
+    assert encode_num(-128) == b"\x80\x80"
+    assert decode_num(b"\x00\x80") == 0
+    with pytest.raises(ScriptError):
+        decode_num(b"\x01\x00\x00\x00\x00")
+    assert decode_num(b"\x01\x00\x00\x00\x00", 5) == 1
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [(b"", False), (b"\x00", False), (b"\x80", False), (b"\x00\x00\x80", False),
+     (b"\x01", True), (b"\x80\x00", True), (b"\x00\x81", True)],
+)
+def test_cast_to_bool(data, expected):
+    assert cast_to_bool(data) is expected
+
+
+def test_arithmetic():
+    assert run([OP_2, OP_3, OP_ADD, OP_5, OP_EQUAL])
+    assert run([OP_2, OP_3, OP_SUB, OP_1NEGATE, OP_EQUAL])
+    # Arithmetic inputs are limited to 4 bytes
+    assert not run(push(b"\x01" * 5) + bytes((OP_1, OP_ADD)))
+
+
+def test_stack_operations():
+    def final_stack(script, stack):
+        return execute(script, compile_script(script), stack, FakeChecker())
+
+    assert final_stack(bytes((OP_2, OP_PICK)), [b"a", b"b", b"c"]) == [b"a", b"b", b"c", b"a"]
+    assert final_stack(bytes((OP_2, OP_ROLL)), [b"a", b"b", b"c"]) == [b"b", b"c", b"a"]
+    assert final_stack(bytes((OP_DUP, OP_SWAP)), [b"a", b"b"]) == [b"a", b"b", b"b"]
+    assert not run([OP_DROP])
+    assert not run([OP_1, OP_5, OP_PICK])
+
+
+@pytest.mark.parametrize("condition, expected", [(b"\x01", OP_2), (b"", OP_3), (b"\x80", OP_3)])
+def test_if_else(condition, expected):
+    script = bytes((OP_IF, OP_2, OP_ELSE, OP_3, OP_ENDIF, expected, OP_EQUAL))
+    assert run(script, [condition])
+
+
+def test_nested_conditionals():
+    # NOTIF of false runs its body; the inner IF is skipped along with its ELSE branch
+    script = bytes((OP_NOTIF, OP_0, OP_IF, OP_RETURN, OP_ELSE, OP_5, OP_ENDIF, OP_ENDIF))
+    assert run(script, [b""])
+    assert not run(script, [b"\x01"])
+    assert not run([OP_1, OP_IF, OP_1])
+    assert not run([OP_1, OP_ELSE, OP_ENDIF])
+
+
+def test_hash_operations():
+    data = b"hello"
+    digest = hashlib.sha256(data).digest()
+    assert run(push(data) + bytes((OP_SHA256,)) + push(digest) + bytes((OP_EQUAL,)))
+    hash160 = hashlib.new("ripemd160", digest).digest()
+    assert run(push(data) + bytes((OP_HASH160,)) + push(hash160) + bytes((OP_EQUAL,)))
+
+
+def test_dead_branches():
+    # Unexecuted branches skip ordinary opcodes, including OP_RETURN
+    assert run([OP_0, OP_IF, OP_RETURN, OP_ENDIF, OP_1])
+    # Disabled opcodes and oversized pushes fail the script even there
+    assert not run([OP_0, OP_IF, OP_CAT, OP_ENDIF, OP_1])
+    dead_push = bytes((OP_0, OP_IF)) + push(b"\x00" * (MAX_ELEMENT_SIZE + 1))
+    assert not run(dead_push + bytes((OP_ENDIF, OP_1)))
+    assert run(bytes((OP_0, OP_IF)) + push(b"\x00" * MAX_ELEMENT_SIZE) + bytes((OP_ENDIF, OP_1)))
+
+
+def test_operation_limit():
+    assert run(bytes((OP_NOP,)) * MAX_OPS_PER_SCRIPT + bytes((OP_1,)))
+    assert not run(bytes((OP_NOP,)) * (MAX_OPS_PER_SCRIPT + 1) + bytes((OP_1,)))
+
+
+def test_truncated_push():
+    assert not run(bytes((OP_PUSHDATA1, 5, 1, 2)))
+
+
+def test_checksig_signs_from_the_last_code_separator():
+    checker = FakeChecker([(b"sig", b"key")])
+    script = bytes((OP_NOP, OP_CODESEPARATOR, OP_CHECKSIG))
+    assert run(script, [b"sig", b"key"], checker)
+    assert checker.script_codes == [bytes((OP_CHECKSIG,))]
+    assert not run(script, [b"bad", b"key"], checker)
+
+
+@pytest.mark.parametrize(
+    "signatures, dummy, expected",
+    [
+        ([b"sig1", b"sig3"], b"", True),
+        ([b"sig2", b"sig3"], b"", True),
+        # Signatures must come in the order of their keys
+        ([b"sig3", b"sig1"], b"", False),
+        ([b"sig1", b"bad"], b"", False),
+        # NULLDUMMY (BIP147)
+        ([b"sig1", b"sig3"], b"\x00", False),
+    ],
+)
+def test_checkmultisig(signatures, dummy, expected):
+    checker = FakeChecker([(b"sig1", b"key1"), (b"sig2", b"key2"), (b"sig3", b"key3")])
+    script = bytes((OP_2,)) + push(b"key1") + push(b"key2") + push(b"key3")
+    script += bytes((OP_3, OP_CHECKMULTISIG))
+    assert run(script, [dummy, *signatures], checker) is expected
+
+
+def test_clean_stack():
+    assert run([OP_1], [b"\x01"])
+    assert not run([OP_1], [b"\x01"], clean_stack=True)
+    assert run([OP_1], clean_stack=True)
+
+
+def test_checklocktimeverify():
+    checker = FakeChecker(max_locktime=100)
+    tail = bytes((OP_CHECKLOCKTIMEVERIFY, OP_DROP, OP_1))
+    assert run(push(encode_num(100)) + tail, checker=checker)
+    assert not run(push(encode_num(101)) + tail, checker=checker)
+    assert not run(bytes((OP_1NEGATE,)) + tail, checker=checker)
+
+
+def test_checksequenceverify():
+    checker = FakeChecker(max_sequence=10)
+    tail = bytes((OP_CHECKSEQUENCEVERIFY, OP_DROP, OP_1))
+    assert run(push(encode_num(10)) + tail, checker=checker)
+    assert not run(push(encode_num(11)) + tail, checker=checker)
+    # The disable flag turns the opcode into a NOP
+    assert run(push(encode_num((1 << 31) | 11)) + tail, checker=checker)
+
+
+def test_compiled_scripts_are_cached():
+    script = bytes((OP_2, OP_3, OP_ADD))
+    assert compile_script(script) is compile_script(bytes(script))
+    assert compile_script(script) == ((OP_2, b"\x02", 1), (OP_3, b"\x03", 2), (OP_ADD, None, 3))
+
+
+@pytest.mark.parametrize(
+    "sig, expected",
+    [
+        ("300602010102010101", True),
+        # A zero byte is needed before an r with its high bit set
+        ("30070202008102010101", True),
+        ("30070202000102010101", False),
+        ("300602018102010101", False),
+        ("300602010102018101", False),
+        ("30070201010202000101", False),
+        # Wrong total length, wrong markers
+        ("300702010102010101", False),
+        ("310602010102010101", False),
+        ("300603010102010101", False),
+        ("3005020002010101", False),
+    ],
+)
+def test_strict_der_encoding(sig, expected):
+    assert is_valid_signature_encoding(bytes.fromhex(sig)) is expected
+
+
+def test_parse_der_signature():
+    assert parse_der_signature(bytes.fromhex("30070202008102010301")) == (0x81, 3, 1)
+    with pytest.raises(ValueError):
+        parse_der_signature(bytes.fromhex("30070202000102010101"))
+
+
+@pytest.mark.parametrize("name", SCRIPT_TXS)
+def test_script_inputs_verify(mempool_transaction, name):
+    tx = mempool_transaction(name)
+    assert verify_transactions([tx]) == ([True], 1)
+    first, *others = tx.vout
+    tampered = Transaction(
+        tx.version, tx.locktime, tx.vin, (TxOut(first.value - 1, first.scriptpubkey), *others)
+    )
+    assert verify_transactions([tampered]) == ([False], 0)
+
+
+def test_push_only_scripts_include_small_numbers():
+    assert parse_pushes(bytes((OP_0, OP_1NEGATE, OP_1, OP_16)) + push(b"ab")) == [
+        b"",
+        b"\x81",
+        b"\x01",
+        b"\x10",
+        b"ab",
+    ]
+    assert parse_pushes(bytes((OP_1, OP_DUP))) is None
+
+
+@pytest.mark.parametrize("branch, expected", [(OP_1, True), (OP_0, None)])
+def test_p2sh_scriptsig_picks_a_branch_with_a_small_number(branch, expected):
+    redeem_script = bytes((OP_IF, OP_1, OP_ELSE, OP_RETURN, OP_ENDIF))
+    tx = p2sh_spend(bytes((branch,)) + push(redeem_script), redeem_script)
+    assert p2sh_check(tx, 0, {}) is expected
+
+
+@pytest.mark.parametrize("size, expected", [(MAX_ELEMENT_SIZE, True), (MAX_ELEMENT_SIZE + 1, None)])
+def test_p2sh_push_size_limit(size, expected):
+    redeem_script = bytes((OP_DROP, OP_1))
+    tx = p2sh_spend(push(b"\x00" * size) + push(redeem_script), redeem_script)
+    assert p2sh_check(tx, 0, {}) is expected
+
+
+@pytest.mark.parametrize("size, expected", [(MAX_ELEMENT_SIZE, True), (MAX_ELEMENT_SIZE + 1, None)])
+def test_p2sh_redeem_script_size_limit(size, expected):
+    # A push dropped again, padded so the whole redeem script has the given size
+    redeem_script = push(b"\x00" * (size - 5)) + bytes((OP_DROP, OP_1))
+    assert len(redeem_script) == size
+    tx = p2sh_spend(push(redeem_script), redeem_script)
+    assert p2sh_check(tx, 0, {}) is expected
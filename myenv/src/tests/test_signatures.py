@@ -0,0 +1,120 @@
+import pytest
+
+from utils.schnorr import GENERATOR, ORDER, lift_x, tagged_hash, verify_schnorr
+from utils.signatureBackend import (
+    BACKENDS,
+    ECDSA,
+    SCHNORR,
+    available_backends,
+    verify_batch,
+)
+from utils.signatureCache import SignatureCache, configure_signature_cache
+
+# BIP340 test vectors: (public key, message, signature, valid)
+BIP340_VECTORS = [
+    (
+        "F9308A019258C31049344F85F89D5229B531C845836F99B08601F113BCE036F9",
+        "0000000000000000000000000000000000000000000000000000000000000000",
+        "E907831F80848D1069A5371B402410364BDF1C5F8307B0084C55F1CE2DCA8215"
+        "25F66A4A85EA8B71E482A74F382D2CE5EBEEE8FDB2172F477DF4900D310536C0",
+        True,
+    ),
+    (
+        "DFF1D77F2A671C5F36183726DB2341BE58FEAE1DA2DECED843240F7B502BA659",
+        "243F6A8885A308D313198A2E03707344A4093822299F31D0082EFA98EC4E6C89",
+        "6896BD60EEAE296DB48A229FF71DFE071BDE413E6D43F917DC8DCF8C78DE3341"
+        "8906D11AC976ABCCB20B091292BFF4EA897EFCB639EA871CFA95F6DE339E4B0A",
+        True,
+    ),
+    # Public key not on the curve
+    (
+        "EEFDEA4CDB677750A420FEE807EACF21EB9898AE79B9768766E4FAA04A2D4A34",
+        "243F6A8885A308D313198A2E03707344A4093822299F31D0082EFA98EC4E6C89",
+        "6CFF5C3BA86C69EA4B7376F31A9BCB4F74C1976089B2D9963DA2E5543E177769"
+        "69E89B4C5564D00349106B8497785DD7D1D713A8AE82B32FA79D5F7FC407D39B",
+        False,
+    ),
+    # Negated message
+    (
+        "DFF1D77F2A671C5F36183726DB2341BE58FEAE1DA2DECED843240F7B502BA659",
+        "243F6A8885A308D313198A2E03707344A4093822299F31D0082EFA98EC4E6C89",
+        "1FA62E331EDBC21C394792D2AB1100A7B432B013DF3F6FF4F99FCB33E0E1515F"
+        "28890B3EDB6E7189B630448B515CE4F8622A954CFE545735AAEA5134FCCDB2BD",
+        False,
+    ),
+    # s equal to the curve order
+    (
+        "DFF1D77F2A671C5F36183726DB2341BE58FEAE1DA2DECED843240F7B502BA659",
+        "243F6A8885A308D313198A2E03707344A4093822299F31D0082EFA98EC4E6C89",
+        "6CFF5C3BA86C69EA4B7376F31A9BCB4F74C1976089B2D9963DA2E5543E177769"
+        "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141",
+        False,
+    ),
+]
+
+
+@pytest.fixture(params=available_backends())
+def backend(request):
+    return BACKENDS[request.param]()
+
+
+@pytest.fixture
+def fresh_cache():
+    return configure_signature_cache()
+
+
+def _infinity_signature():
+    # A signature with s*G == e*P, so R = s*G - e*P is the point at infinity
+    secret = 0xC0FFEE
+    point = (GENERATOR * secret).to_affine()
+    if point.y() % 2:
+        secret = ORDER - secret
+        point = (GENERATOR * secret).to_affine()
+    xonly = point.x().to_bytes(32, "big")
+    message = bytes(32)
+    r = (1).to_bytes(32, "big")
+    e = int.from_bytes(tagged_hash("BIP0340/challenge", r + xonly + message), "big") % ORDER
+    return xonly, message, r + (e * secret % ORDER).to_bytes(32, "big")
+
+
+@pytest.mark.parametrize("public_key, message, signature, valid", BIP340_VECTORS)
+def test_bip340_vectors(backend, public_key, message, signature, valid):
+    args = (bytes.fromhex(public_key), bytes.fromhex(message), bytes.fromhex(signature))
+    assert backend.verify(SCHNORR, *args) is valid
+    assert verify_schnorr(lift_x(args[0]), *args) is valid
+
+
+def test_lift_x_rejects_x_off_the_curve():
+    assert lift_x(bytes.fromhex(BIP340_VECTORS[2][0])) is None
+    assert lift_x(bytes(31)) is None
+
+
+def test_schnorr_nonce_at_infinity_is_invalid(backend):
+    xonly, message, signature = _infinity_signature()
+    assert verify_schnorr(lift_x(xonly), xonly, message, signature) is False
+    assert backend.verify(SCHNORR, xonly, message, signature) is False
+
+
+def test_xonly_key_is_not_an_ecdsa_key(backend):
+    public_key, message, signature, _ = BIP340_VECTORS[0]
+    args = (bytes.fromhex(public_key), bytes.fromhex(message), bytes.fromhex(signature))
+    assert backend.verify(SCHNORR, *args)
+    assert not backend.verify(ECDSA, *args)
+
+
+def test_cache_key_depends_on_the_scheme():
+    args = (bytes(32), bytes(32), bytes(64))
+    assert SignatureCache.key(ECDSA, *args) != SignatureCache.key(SCHNORR, *args)
+
+
+def test_verify_batch_keeps_the_scheme(fresh_cache):
+    public_key, message, signature, _ = BIP340_VECTORS[0]
+    args = (bytes.fromhex(public_key), bytes.fromhex(message), bytes.fromhex(signature))
+    # The valid Schnorr check is cached; the ECDSA check of the same bytes must not hit it
+    assert verify_batch([(SCHNORR, *args)]) == [True]
+    assert verify_batch([(ECDSA, *args), (SCHNORR, *args), None, True]) == [
+        False,
+        True,
+        False,
+        True,
+    ]
@@ -0,0 +1,49 @@
+import pytest
+
+from utils.p2phk import p2tr_check
+from utils.sighash import SIGHASH_NONE, TaprootSighash
+from utils.signatureBackend import get_backend
+from utils.transactionModel import Transaction, TxOut
+
+# Sample mempool transactions whose key path inputs all carry valid signatures
+TAPROOT_TXS = [
+    # SIGHASH_DEFAULT (64 byte signatures)
+    "0022a52ad27796a1a2d9eddd6f4b055c097b51ad7cb8f000fe0d78b26cb71639",
+    "001035505afbf143e51bd667099190943a38eee20092bb691e72eaa44992b2f7",
+    # Explicit hash types (65 byte signatures)
+    "032fa957d9a82d22f5f6df6644672809faad41bf02c3f08e797600b3d824fa8e",
+    "095b6ee0aa08af6fe2f04b6ed04844a55a9034a5742f82c5d983b1a2b18e9fcb",
+]
+
+
+@pytest.mark.parametrize("name", TAPROOT_TXS)
+def test_taproot_key_path_inputs_verify(mempool_transaction, name):
+    tx = mempool_transaction(name)
+    backend = get_backend()
+    engines = {}
+    for idx in range(len(tx.vin)):
+        assert backend.verify(*p2tr_check(tx, idx, engines))
+
+
+@pytest.mark.parametrize("name", TAPROOT_TXS)
+def test_taproot_sighash_commits_to_outputs(mempool_transaction, name):
+    tx = mempool_transaction(name)
+    first, *others = tx.vout
+    tampered = Transaction(
+        tx.version,
+        tx.locktime,
+        tx.vin,
+        (TxOut(first.value - 1, first.scriptpubkey), *others),
+    )
+    check = p2tr_check(tampered, 0, {})
+    # SIGHASH_NONE signatures do not commit to the outputs
+    if len(tx.vin[0].witness[0]) == 65 and tx.vin[0].witness[0][64] & 0x03 == SIGHASH_NONE:
+        pytest.skip("input signed with SIGHASH_NONE")
+    assert not get_backend().verify(*check)
+
+
+@pytest.mark.parametrize("hash_type", [0x04, 0x80, 0x84, 0xFF])
+def test_taproot_sighash_rejects_unknown_hash_types(mempool_transaction, hash_type):
+    tx = mempool_transaction(TAPROOT_TXS[0])
+    with pytest.raises(ValueError):
+        TaprootSighash(tx).sighash(0, hash_type)
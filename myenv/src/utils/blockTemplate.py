@@ -0,0 +1,195 @@
+import heapq
+
+# Consensus limit on the weight of a block (BIP141)
+MAX_BLOCK_WEIGHT = 4000000
+
+# Weight kept free for the block header, the transaction count and the coinbase transaction
+COINBASE_RESERVED_WEIGHT = 4000
+
+
+class MempoolGraph:
+    """
+    Spending relations between mempool transactions, indexed by txid.
+
+    A parent missing from the candidates is taken as confirmed, unless its txid is excluded: a
+    mempool transaction that was not accepted. The outputs of an excluded transaction do not
+    exist, so the candidates spending them are dropped from the graph, with their descendants.
+    The remaining transactions are referred to by their position in the transactions list.
+
+    :ivar transactions: The transactions kept, in the order they were given.
+    :ivar dropped: The candidates dropped for depending on an excluded transaction.
+    :ivar index: Position of each transaction, by txid (internal byte order).
+    :ivar parents: In-mempool transactions whose outputs each transaction spends.
+    :ivar children: In-mempool transactions spending the outputs of each transaction.
+    :ivar order: The positions in a topological order (parents before children).
+    """
+
+    def __init__(self, transactions, excluded_txids=()):
+        dropped_txids = self._depending_on(transactions, excluded_txids)
+        self.dropped = [tx for tx in transactions if tx.txid in dropped_txids]
+        if dropped_txids:
+            transactions = [tx for tx in transactions if tx.txid not in dropped_txids]
+        self.transactions = transactions
+        self.index = {tx.txid: idx for idx, tx in enumerate(transactions)}
+        self.parents = []
+        self.children = [[] for _ in transactions]
+        for idx, tx in enumerate(transactions):
+            parents = frozenset(
+                self.index[inp.txid] for inp in tx.vin if inp.txid in self.index
+            )
+            self.parents.append(parents)
+            for parent in parents:
+                self.children[parent].append(idx)
+        self.order = self._topological_order()
+        self._ancestors = None
+
+    @staticmethod
+    def _depending_on(transactions, excluded_txids):
+        # Walk down from the excluded transactions through the candidates spending them
+        children = {}
+        for tx in transactions:
+            for inp in tx.vin:
+                children.setdefault(inp.txid, set()).add(tx.txid)
+        dropped = set()
+        pending = list(excluded_txids)
+        while pending:
+            for child in children.pop(pending.pop(), ()):
+                if child not in dropped:
+                    dropped.add(child)
+                    pending.append(child)
+        return dropped
+
+    def _topological_order(self):
+        # Kahn's algorithm, seeded in list order so the result is deterministic
+        pending = [len(parents) for parents in self.parents]
+        order = [idx for idx, count in enumerate(pending) if not count]
+        for idx in order:
+            for child in self.children[idx]:
+                pending[child] -= 1
+                if not pending[child]:
+                    order.append(child)
+        if len(order) != len(self.transactions):
+            raise ValueError("Mempool transactions spend each other in a cycle")
+        return order
+
+    def ancestors(self, idx):
+        """
+        Returns a transaction together with every in-mempool transaction it depends on.
+
+        :param idx: Position of the transaction.
+        :type idx: int
+        :return: The positions of the transaction and of its ancestors.
+        :rtype: frozenset[int]
+        """
+        if self._ancestors is None:
+            # Built in topological order, so the sets of the parents are always ready
+            self._ancestors = [None] * len(self.transactions)
+            for position in self.order:
+                ancestors = {position}
+                for parent in self.parents[position]:
+                    ancestors |= self._ancestors[parent]
+                self._ancestors[position] = frozenset(ancestors)
+        return self._ancestors[idx]
+
+    def descendants(self, idx):
+        """
+        Returns every in-mempool transaction depending on a transaction, excluding itself.
+
+        :param idx: Position of the transaction.
+        :type idx: int
+        :return: The positions of the descendants.
+        :rtype: set[int]
+        """
+        found = set()
+        stack = list(self.children[idx])
+        while stack:
+            child = stack.pop()
+            if child not in found:
+                found.add(child)
+                stack.extend(self.children[child])
+        return found
+
+
+def build_block_template(
+    transactions, max_weight=MAX_BLOCK_WEIGHT - COINBASE_RESERVED_WEIGHT, excluded_txids=()
+):
+    """
+    Selects the transactions of a block by ancestor fee rate, under a weight limit.
+
+    Each transaction is scored with the fee rate of its package: itself plus its ancestors
+    not in the block yet, so a high fee child pays for its low fee parents (CPFP). The best
+    package is added whole, parents first. The packages of its descendants then lose the
+    included members, and are pushed again with their new score; outdated heap entries are
+    recognized by a per transaction version and skipped when popped. Packages too heavy for the
+    remaining space are skipped, letting lighter ones fill it.
+
+    :param transactions: The candidate transactions, all valid.
+    :type transactions: list[Transaction]
+    :param max_weight: Weight available to the selected transactions.
+    :type max_weight: int
+    :param excluded_txids: Txids of mempool transactions that are not candidates (e.g. rejected
+                           by validation). Candidates spending their outputs, directly or
+                           through other candidates, are never selected.
+    :type excluded_txids: Iterable[bytes]
+    :return: A dictionary with the selected "transactions" in a valid block order (parents
+             before children), their total "fees" and their total "weight".
+    :rtype: dict
+    """
+    graph = MempoolGraph(transactions, excluded_txids)
+    transactions = graph.transactions
+    fees = [tx.fee for tx in transactions]
+    weights = [tx.weight for tx in transactions]
+    position = {idx: rank for rank, idx in enumerate(graph.order)}
+
+    # Fee and weight of each package, kept up to date as ancestors get included
+    package_fees = []
+    package_weights = []
+    for idx in range(len(transactions)):
+        ancestors = graph.ancestors(idx)
+        package_fees.append(sum(fees[ancestor] for ancestor in ancestors))
+        package_weights.append(sum(weights[ancestor] for ancestor in ancestors))
+
+    versions = [0] * len(transactions)
+    # Ties are broken by position, so the template is deterministic
+    heap = [
+        (-package_fees[idx] / package_weights[idx], idx, 0) for idx in range(len(transactions))
+    ]
+    heapq.heapify(heap)
+
+    included = set()
+    selected = []
+    total_fees = 0
+    total_weight = 0
+    while heap:
+        _, idx, version = heapq.heappop(heap)
+        if idx in included or version != versions[idx]:
+            continue
+        if total_weight + package_weights[idx] > max_weight:
+            # Dropped for now; including some of its ancestors later pushes it again
+            continue
+
+        package = sorted(graph.ancestors(idx) - included, key=position.__getitem__)
+        updated = set()
+        for member in package:
+            included.add(member)
+            selected.append(transactions[member])
+            total_fees += fees[member]
+            total_weight += weights[member]
+            for descendant in graph.descendants(member):
+                if descendant not in included:
+                    package_fees[descendant] -= fees[member]
+                    package_weights[descendant] -= weights[member]
+                    updated.add(descendant)
+
+        for descendant in updated - included:
+            versions[descendant] += 1
+            heapq.heappush(
+                heap,
+                (
+                    -package_fees[descendant] / package_weights[descendant],
+                    descendant,
+                    versions[descendant],
+                ),
+            )
+
+    return {"transactions": selected, "fees": total_fees, "weight": total_weight}
@@ -1,5 +1,6 @@
 import json
 import os
+import sys
 
 
 def read_file(file_path):
@@ -14,3 +15,26 @@ def write_file(file_path, content):
 
 def file_exists(file_path):
     return os.path.exists(file_path)
+
+
+def read_lines(source):
+    """
+    Yields the non-empty lines of a JSON-lines source, one at a time, without reading the whole
+    source in memory.
+
+    :param source: Path of the file, or "-" for the standard input.
+    :type source: str
+    :return: The lines, without their line terminator.
+    :rtype: Iterator[str]
+    """
+    if source == "-":
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                yield line
+        return
+    with open(source, "r") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield line
@@ -0,0 +1,312 @@
+import mmap
+import os
+import struct
+from utils.fileUtils import read_file
+from utils.transactionModel import Transaction, TxIn, TxOut
+
+# The cache is a pair of files: "<path>.bin" holds the packed transaction records back to back,
+# "<path>.idx" maps every mempool file name to its record, together with the mtime/size the
+# record was built from. Both start with the same random token, so a data file and an index
+# written by different runs are never mixed up.
+DATA_MAGIC = b"MPCD"
+INDEX_MAGIC = b"MPCI"
+FORMAT_VERSION = 2
+TOKEN_SIZE = 16
+HEADER = struct.Struct("<4sH16s")
+INDEX_COUNT = struct.Struct("<I")
+INDEX_ENTRY = struct.Struct("<HqQQI")
+
+ABSENT = 0xFFFFFFFF
+LENGTH = struct.Struct("<I")
+TX_HEADER = struct.Struct("<iIII")
+TXIN_HEADER = struct.Struct("<32sIIBB")
+VALUE = struct.Struct("<Q")
+
+HAS_PREVOUT = 0x01
+
+
+def _pack_bytes(out, data):
+    if data is None:
+        out += LENGTH.pack(ABSENT)
+    else:
+        out += LENGTH.pack(len(data))
+        out += data
+
+
+def _pack_str(out, text):
+    _pack_bytes(out, None if text is None else text.encode())
+
+
+def _unpack_bytes(buf, offset):
+    (length,) = LENGTH.unpack_from(buf, offset)
+    offset += 4
+    if length == ABSENT:
+        return None, offset
+    return bytes(buf[offset : offset + length]), offset + length
+
+
+def _unpack_str(buf, offset):
+    data, offset = _unpack_bytes(buf, offset)
+    return (None if data is None else data.decode()), offset
+
+
+def _pack_output(out, output):
+    out += VALUE.pack(output.value)
+    _pack_bytes(out, output.scriptpubkey)
+    _pack_str(out, output.script_type)
+    _pack_str(out, output.address)
+
+
+def _unpack_output(buf, offset):
+    (value,) = VALUE.unpack_from(buf, offset)
+    offset += 8
+    scriptpubkey, offset = _unpack_bytes(buf, offset)
+    script_type, offset = _unpack_str(buf, offset)
+    address, offset = _unpack_str(buf, offset)
+    return TxOut(value, scriptpubkey, script_type, address), offset
+
+
+def encode_transaction(transaction):
+    """
+    Packs a transaction into a binary record.
+
+    :param transaction: The transaction to pack.
+    :type transaction: Transaction
+    :return: The packed record.
+    :rtype: bytes
+    """
+    out = bytearray()
+    out += TX_HEADER.pack(
+        transaction.version,
+        transaction.locktime,
+        len(transaction.vin),
+        len(transaction.vout),
+    )
+    for inp in transaction.vin:
+        out += TXIN_HEADER.pack(
+            inp.txid,
+            inp.vout,
+            inp.sequence,
+            1 if inp.is_coinbase else 0,
+            HAS_PREVOUT if inp.prevout is not None else 0,
+        )
+        _pack_bytes(out, inp.scriptsig)
+        out += LENGTH.pack(len(inp.witness))
+        for item in inp.witness:
+            _pack_bytes(out, item)
+        if inp.prevout is not None:
+            _pack_output(out, inp.prevout)
+    for output in transaction.vout:
+        _pack_output(out, output)
+    return bytes(out)
+
+
+def decode_transaction(buf, offset=0):
+    """
+    Rebuilds a transaction from a record packed by encode_transaction.
+
+    :param buf: Buffer holding the record, e.g. a memory-mapped cache file.
+    :type buf: bytes or mmap.mmap
+    :param offset: Position of the record inside the buffer.
+    :type offset: int
+    :return: The decoded transaction.
+    :rtype: Transaction
+    """
+    version, locktime, num_inputs, num_outputs = TX_HEADER.unpack_from(buf, offset)
+    offset += TX_HEADER.size
+    vin = []
+    for _ in range(num_inputs):
+        txid, vout, sequence, is_coinbase, flags = TXIN_HEADER.unpack_from(buf, offset)
+        offset += TXIN_HEADER.size
+        scriptsig, offset = _unpack_bytes(buf, offset)
+        (num_items,) = LENGTH.unpack_from(buf, offset)
+        offset += 4
+        witness = []
+        for _ in range(num_items):
+            item, offset = _unpack_bytes(buf, offset)
+            witness.append(item)
+        prevout = None
+        if flags & HAS_PREVOUT:
+            prevout, offset = _unpack_output(buf, offset)
+        vin.append(
+            TxIn(txid, vout, scriptsig, sequence, tuple(witness), prevout, bool(is_coinbase))
+        )
+    vout = []
+    for _ in range(num_outputs):
+        output, offset = _unpack_output(buf, offset)
+        vout.append(output)
+    return Transaction(version, locktime, tuple(vin), tuple(vout))
+
+
+def encode_file(file_path):
+    """
+    Reads a mempool JSON file and packs it with encode_transaction.
+
+    :param file_path: Path to the transaction file.
+    :type file_path: str
+    :return: The packed record.
+    :rtype: bytes
+    """
+    return encode_transaction(Transaction.from_dict(read_file(file_path)))
+
+
+def read_index(cache_path):
+    """
+    Loads the cache index.
+
+    :param cache_path: Cache path, without the .bin/.idx suffix.
+    :type cache_path: str
+    :return: The token shared with the data file, and a mapping from file name to
+             (mtime_ns, size, offset, length). None if there is no usable index.
+    :rtype: tuple[bytes, dict] or None
+    """
+    try:
+        with open(cache_path + ".idx", "rb") as file:
+            buf = file.read()
+    except OSError:
+        return None
+    if len(buf) < HEADER.size + INDEX_COUNT.size:
+        return None
+    magic, version, token = HEADER.unpack_from(buf, 0)
+    if magic != INDEX_MAGIC or version != FORMAT_VERSION:
+        return None
+    offset = HEADER.size
+    (count,) = INDEX_COUNT.unpack_from(buf, offset)
+    offset += INDEX_COUNT.size
+    entries = {}
+    for _ in range(count):
+        name_len, mtime_ns, size, record_offset, length = INDEX_ENTRY.unpack_from(buf, offset)
+        offset += INDEX_ENTRY.size
+        name = buf[offset : offset + name_len].decode()
+        offset += name_len
+        entries[name] = (mtime_ns, size, record_offset, length)
+    return token, entries
+
+
+def open_data(cache_path, token=None):
+    """
+    Memory-maps the cache data file.
+
+    :param cache_path: Cache path, without the .bin/.idx suffix.
+    :type cache_path: str
+    :param token: Token read from the index; the mapping is refused if the data file does not match it.
+                  None skips the check, for readers that were handed offsets by refresh_cache.
+    :type token: bytes or None
+    :return: A read-only mapping of the data file, or None if it is missing or belongs to another index.
+    :rtype: mmap.mmap or None
+    """
+    try:
+        with open(cache_path + ".bin", "rb") as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                return None
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+    magic, version, data_token = HEADER.unpack_from(data, 0)
+    if magic != DATA_MAGIC or version != FORMAT_VERSION or token not in (None, data_token):
+        data.close()
+        return None
+    return data
+
+
+def _write_cache(cache_path, names, stats, records):
+    token = os.urandom(TOKEN_SIZE)
+    index = bytearray(HEADER.pack(INDEX_MAGIC, FORMAT_VERSION, token))
+    index += INDEX_COUNT.pack(len(names))
+    entries = {}
+    tmp_data = cache_path + ".bin.tmp"
+    with open(tmp_data, "wb") as file:
+        file.write(HEADER.pack(DATA_MAGIC, FORMAT_VERSION, token))
+        offset = HEADER.size
+        for name, record in zip(names, records):
+            mtime_ns, size = stats[name]
+            file.write(record)
+            entries[name] = (mtime_ns, size, offset, len(record))
+            encoded_name = name.encode()
+            index += INDEX_ENTRY.pack(len(encoded_name), mtime_ns, size, offset, len(record))
+            index += encoded_name
+            offset += len(record)
+    tmp_index = cache_path + ".idx.tmp"
+    with open(tmp_index, "wb") as file:
+        file.write(index)
+    # The data file goes first: until the new index lands, the old one fails the token check
+    os.replace(tmp_data, cache_path + ".bin")
+    os.replace(tmp_index, cache_path + ".idx")
+    return token, entries
+
+
+def refresh_cache(mempool_path, cache_path, executor=None):
+    """
+    Brings the cache in line with the mempool directory and returns where each transaction lives.
+
+    Files whose mtime or size differ from the index, and files the index does not know, are
+    parsed again; the cache is only rewritten when something changed.
+
+    :param mempool_path: Path to the mempool directory.
+    :type mempool_path: str
+    :param cache_path: Cache path, without the .bin/.idx suffix.
+    :type cache_path: str
+    :param executor: Optional executor used to parse the stale files in parallel.
+    :type executor: concurrent.futures.Executor or None
+    :return: (name, offset, length) for every transaction file, sorted by name.
+    :rtype: list[tuple[str, int, int]]
+    """
+    stats = {}
+    with os.scandir(mempool_path) as it:
+        for entry in it:
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    names = sorted(stats)
+
+    index = read_index(cache_path)
+    data = open_data(cache_path, index[0]) if index else None
+    entries = index[1] if data is not None else {}
+
+    stale = [
+        name
+        for name in names
+        if name not in entries or entries[name][:2] != stats[name]
+    ]
+    if data is not None and not stale and len(entries) == len(names):
+        data.close()
+        return [(name, entries[name][2], entries[name][3]) for name in names]
+
+    stale_paths = [os.path.join(mempool_path, name) for name in stale]
+    if executor is None:
+        fresh = dict(zip(stale, map(encode_file, stale_paths)))
+    else:
+        fresh = dict(zip(stale, executor.map(encode_file, stale_paths, chunksize=64)))
+
+    records = []
+    for name in names:
+        if name in fresh:
+            records.append(fresh[name])
+        else:
+            _, _, offset, length = entries[name]
+            records.append(data[offset : offset + length])
+    if data is not None:
+        data.close()
+
+    _, entries = _write_cache(cache_path, names, stats, records)
+    return [(name, entries[name][2], entries[name][3]) for name in names]
+
+
+def load_records(cache_path, records):
+    """
+    Decodes a set of records from the memory-mapped cache.
+
+    :param cache_path: Cache path, without the .bin/.idx suffix.
+    :type cache_path: str
+    :param records: (name, offset, length) entries as returned by refresh_cache.
+    :type records: list[tuple[str, int, int]]
+    :return: The decoded transactions, in the order of the records.
+    :rtype: list[Transaction]
+    """
+    data = open_data(cache_path)
+    if data is None:
+        raise FileNotFoundError(f"No valid mempool cache at {cache_path}")
+    try:
+        return [decode_transaction(data, offset) for _, offset, _ in records]
+    finally:
+        data.close()
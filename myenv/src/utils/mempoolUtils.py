@@ -0,0 +1,340 @@
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from utils.fileUtils import read_file, read_lines
+from utils.p2phk import verify_transactions
+from utils.transactionUtils import validate_transaction
+from utils.mempoolCache import refresh_cache, load_records
+from utils.transactionModel import Transaction
+from utils.signatureCache import get_signature_cache
+
+# Number of transactions parsed and verified at once by stream_mempool
+DEFAULT_BATCH_SIZE = 1000
+
+
+class OutpointIndex:
+    """
+    Index of the outputs spent by the mempool, mapping each outpoint to the one transaction
+    allowed to spend it.
+
+    Transactions are added in ingestion order. A transaction spending an outpoint already
+    claimed conflicts with the claimant; the higher fee rate (fee per weight unit) wins, ties
+    keeping the transaction added first. A newcomer only replaces its conflicts when it beats
+    all of them. Each input is one hash map lookup, whatever the size of the mempool.
+
+    Mempool transactions rejected by validation are recorded too, so that, like the conflict
+    losers, their descendants are left out.
+
+    :ivar spenders: Txid of the spender of each outpoint, keyed by (txid, vout) of the outpoint.
+    :ivar evicted: The transactions that lost a conflict, in the order they were dropped.
+    """
+
+    def __init__(self):
+        self.spenders = {}
+        self.evicted = []
+        self._rejected = []
+        self._transactions = {}
+
+    def add(self, transaction):
+        """
+        Adds a transaction, resolving its conflicts with the transactions already indexed.
+
+        :param transaction: The transaction, already verified.
+        :type transaction: Transaction
+        :return: Whether the transaction was kept.
+        :rtype: bool
+        """
+        if transaction.txid in self._transactions:
+            # The same transaction twice, e.g. listed in two snapshot lines
+            return False
+        outpoints = [(inp.txid, inp.vout) for inp in transaction.vin]
+        conflicts = {
+            self.spenders[outpoint] for outpoint in outpoints if outpoint in self.spenders
+        }
+        fee, weight = transaction.fee, transaction.weight
+        for txid in conflicts:
+            other = self._transactions[txid]
+            # fee / weight <= other.fee / other.weight, without rounding
+            if fee * other.weight <= other.fee * weight:
+                self.evicted.append(transaction)
+                return False
+        for txid in conflicts:
+            self._remove(txid)
+        self._transactions[transaction.txid] = transaction
+        for outpoint in outpoints:
+            self.spenders[outpoint] = transaction.txid
+        return True
+
+    def reject(self, txid):
+        """
+        Records a mempool transaction that failed validation: its outputs do not exist.
+
+        :param txid: The txid of the rejected transaction, in internal byte order.
+        :type txid: bytes
+        """
+        self._rejected.append(txid)
+
+    def excluded_txids(self):
+        """
+        Returns the txids of the transactions left out so far: rejected, or evicted.
+
+        :return: The txids, in internal byte order.
+        :rtype: set[bytes]
+        """
+        excluded = set(self._rejected)
+        excluded.update(tx.txid for tx in self.evicted)
+        # A txid kept through another copy of the transaction is not excluded
+        return excluded - self._transactions.keys()
+
+    def _remove(self, txid):
+        transaction = self._transactions.pop(txid)
+        for inp in transaction.vin:
+            del self.spenders[(inp.txid, inp.vout)]
+        self.evicted.append(transaction)
+
+    def transactions(self):
+        """
+        Returns the transactions kept, in the order they were added.
+
+        Transactions spending an output of an evicted or rejected transaction are dropped as
+        well, with their own descendants, since the outputs they spend do not exist.
+
+        :return: The transactions without conflicts.
+        :rtype: list[Transaction]
+        """
+        # Walk down from the evicted and rejected transactions to the kept transactions spending
+        # them. A rejected txid may still be kept, when another copy of it passed validation
+        pending = [tx.txid for tx in self.evicted]
+        pending += [txid for txid in self._rejected if txid not in self._transactions]
+        spent_by = {}
+        for (txid, _), spender in self.spenders.items():
+            spent_by.setdefault(txid, []).append(spender)
+        while pending:
+            for spender in spent_by.pop(pending.pop(), ()):
+                if spender in self._transactions:
+                    self._remove(spender)
+                    pending.append(spender)
+        return list(self._transactions.values())
+
+
+def list_mempool(mempool_path):
+    """
+    Lists the transaction files of a mempool directory in a deterministic order.
+
+    :param mempool_path: Path to the mempool directory.
+    :type mempool_path: str
+    :return: Sorted list of the JSON file names in the directory.
+    :rtype: list[str]
+    """
+    return sorted(name for name in os.listdir(mempool_path) if name.endswith(".json"))
+
+
+def shard(items, num_shards):
+    """
+    Splits a list into contiguous, roughly equally sized shards.
+
+    :param items: The list to split.
+    :type items: list
+    :param num_shards: The number of shards to produce.
+    :type num_shards: int
+    :return: The non-empty shards, in the original order of the items.
+    :rtype: list[list]
+    """
+    num_shards = max(1, min(num_shards, len(items)))
+    size, extra = divmod(len(items), num_shards)
+    shards = []
+    start = 0
+    for idx in range(num_shards):
+        end = start + size + (1 if idx < extra else 0)
+        shards.append(items[start:end])
+        start = end
+    return [s for s in shards if s]
+
+
+def ingest_shard(file_paths):
+    """
+    Reads and verifies one shard of mempool files.
+
+    :param file_paths: Paths of the transaction files of the shard.
+    :type file_paths: list[str]
+    :return: The transactions that passed verification, the signature cache keys added while
+             verifying them, and the txids of the rejected transactions.
+    :rtype: tuple[list[Transaction], list[bytes], list[bytes]]
+    """
+    return verify_shard(
+        Transaction.from_dict(read_file(file_path)) for file_path in file_paths
+    )
+
+
+def ingest_lines(lines):
+    """
+    Parses and verifies one batch of JSON-lines transactions.
+
+    :param lines: The JSON encoded transactions, one per line.
+    :type lines: list[str]
+    :return: The transactions that passed verification, the signature cache keys added while
+             verifying them, and the txids of the rejected transactions.
+    :rtype: tuple[list[Transaction], list[bytes], list[bytes]]
+    """
+    # Each dict is dropped as soon as its transaction is built
+    return verify_shard(Transaction.from_dict(json.loads(line)) for line in lines)
+
+
+def ingest_cached_shard(cache_path, records):
+    """
+    Decodes one shard of transactions from the memory-mapped mempool cache and verifies them.
+
+    :param cache_path: Cache path, without the .bin/.idx suffix.
+    :type cache_path: str
+    :param records: (name, offset, length) entries of the shard, as returned by refresh_cache.
+    :type records: list[tuple[str, int, int]]
+    :return: The transactions that passed verification, the signature cache keys added while
+             verifying them, and the txids of the rejected transactions.
+    :rtype: tuple[list[Transaction], list[bytes], list[bytes]]
+    """
+    return verify_shard(load_records(cache_path, records))
+
+
+def verify_shard(transactions):
+    """
+    Verifies a shard of transactions and keeps the valid ones.
+
+    :param transactions: The transactions of the shard.
+    :type transactions: Iterable[Transaction]
+    :return: The transactions that passed verification, the signature cache keys added while
+             verifying them, and the txids of the rejected transactions.
+    :rtype: tuple[list[Transaction], list[bytes], list[bytes]]
+    """
+    # The structural checks are cheap, so they run first and spare the signature checks of the
+    # transactions they reject
+    candidates = []
+    rejected_txids = []
+    for tx in transactions:
+        if validate_transaction(tx):
+            candidates.append(tx)
+        else:
+            rejected_txids.append(tx.txid)
+    # One batch per shard, so repeated public keys within the shard are parsed once
+    results, _ = verify_transactions(candidates)
+    valid_transactions = []
+    for tx, valid in zip(candidates, results):
+        if valid:
+            valid_transactions.append(tx)
+        else:
+            rejected_txids.append(tx.txid)
+    # Signatures this shard added to its process' cache, for the parent to merge
+    cache_keys = get_signature_cache().drain_added()
+    return valid_transactions, cache_keys, rejected_txids
+
+
+def load_mempool(mempool_path, workers=None, shards_per_worker=4, cache_path=None):
+    """
+    Reads and verifies every transaction of the mempool, spreading the files over a process pool.
+
+    The directory listing is sorted and cut into contiguous shards, and the shard results are
+    merged back in listing order, so the output does not depend on the number of workers.
+
+    :param mempool_path: Path to the mempool directory.
+    :type mempool_path: str
+    :param workers: Number of worker processes, defaults to the number of CPUs. 1 disables the pool.
+    :type workers: int or None
+    :param shards_per_worker: Number of shards handed to each worker, to balance uneven files.
+    :type shards_per_worker: int
+    :param cache_path: Optional path of a binary mempool cache (see utils.mempoolCache). Files
+                       unchanged since the last run are then decoded from the cache instead of
+                       being parsed from JSON.
+    :type cache_path: str or None
+    :return: The valid transactions, the number of valid transactions, and the txids of the
+             mempool transactions left out (rejected, or depending on a rejected transaction).
+    :rtype: tuple[list[Transaction], int, set[bytes]]
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if cache_path is not None:
+        return _load_cached_mempool(mempool_path, workers, shards_per_worker, cache_path)
+
+    file_paths = [os.path.join(mempool_path, name) for name in list_mempool(mempool_path)]
+    if workers <= 1:
+        return _merge([ingest_shard(file_paths)])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() yields in submission order, which keeps the merge deterministic
+        return _merge(
+            executor.map(ingest_shard, shard(file_paths, workers * shards_per_worker))
+        )
+
+
+def stream_mempool(source, workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reads and verifies a JSON-lines mempool snapshot (one transaction per line) as a stream.
+
+    Lines are read lazily and cut into batches; a batch is parsed, verified and dropped before
+    the next ones are read, with at most two batches per worker in flight. Only the valid
+    transactions are kept, so memory stays bounded by the batch size and the result rather than
+    by the size of the snapshot.
+
+    :param source: Path of the JSON-lines file, or "-" for the standard input.
+    :type source: str
+    :param workers: Number of worker processes, defaults to the number of CPUs. 1 disables the pool.
+    :type workers: int or None
+    :param batch_size: Number of transactions per batch.
+    :type batch_size: int
+    :return: The valid transactions, in input order, the number of valid transactions, and the
+             txids of the transactions left out (rejected, or depending on a rejected transaction).
+    :rtype: tuple[list[Transaction], int, set[bytes]]
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    lines = read_lines(source)
+    batches = iter(lambda: list(itertools.islice(lines, batch_size)), [])
+    if workers <= 1:
+        return _merge(map(ingest_lines, batches))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _merge(_bounded_map(executor, ingest_lines, batches, 2 * workers))
+
+
+def _bounded_map(executor, fn, items, max_pending):
+    # Like executor.map, but only pulls the next item once a slot frees up, so a lazy input
+    # is never read ahead by more than max_pending items
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _load_cached_mempool(mempool_path, workers, shards_per_worker, cache_path):
+    if workers <= 1:
+        records = refresh_cache(mempool_path, cache_path)
+        return _merge([ingest_cached_shard(cache_path, records)])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        records = refresh_cache(mempool_path, cache_path, executor=executor)
+        shards = shard(records, workers * shards_per_worker)
+        return _merge(
+            executor.map(ingest_cached_shard, [cache_path] * len(shards), shards)
+        )
+
+
+def _merge(shard_results):
+    # Shards are verified independently, so conflicts between transactions of different shards
+    # are only visible here: every valid transaction goes through one mempool-wide index
+    outpoint_index = OutpointIndex()
+    signature_cache = get_signature_cache()
+    for shard_valid, shard_cache_keys, shard_rejected in shard_results:
+        for transaction in shard_valid:
+            outpoint_index.add(transaction)
+        # Children of rejected transactions spend outputs that do not exist
+        for txid in shard_rejected:
+            outpoint_index.reject(txid)
+        # Signatures verified in worker processes land in this process' cache too
+        for key in shard_cache_keys:
+            signature_cache.add(key)
+    signature_cache.drain_added()
+    valid_transactions = outpoint_index.transactions()
+    return valid_transactions, len(valid_transactions), outpoint_index.excluded_txids()
@@ -0,0 +1,285 @@
+import hashlib
+
+
+def hash_pair(left, right):
+    return hashlib.sha256(hashlib.sha256(left + right).digest()).digest()
+
+
+class MultiProof:
+    """
+    Inclusion proof of several leaves of one tree, sharing the nodes their paths have in common.
+
+    :ivar leaf_count: Number of leaves of the tree.
+    :ivar indexes: Positions of the proven leaves, in increasing order.
+    :ivar hashes: The nodes the proven leaves cannot rebuild themselves, level by level from
+                  the leaves up and from left to right within a level. Each appears once.
+    """
+
+    __slots__ = ("leaf_count", "indexes", "hashes")
+
+    def __init__(self, leaf_count, indexes, hashes):
+        self.leaf_count = leaf_count
+        self.indexes = indexes
+        self.hashes = hashes
+
+
+class MerkleTree:
+    """
+    Bitcoin merkle tree keeping every level, so a leaf change only rehashes its path.
+
+    Levels with an odd number of nodes pair their last node with itself, as in the block
+    merkle root. All hashes are raw bytes in internal byte order.
+
+    :ivar levels: The levels of the tree, leaves first and the root level last.
+    """
+
+    def __init__(self, leaves=()):
+        self.levels = [list(leaves)]
+        self._positions = None
+        level = self.levels[0]
+        while len(level) > 1:
+            level = [
+                hash_pair(level[i], level[i + 1] if i + 1 < len(level) else level[i])
+                for i in range(0, len(level), 2)
+            ]
+            self.levels.append(level)
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    @property
+    def leaves(self):
+        """The leaves, in order."""
+        return self.levels[0]
+
+    @property
+    def root(self):
+        """The merkle root, or None for an empty tree."""
+        return self.levels[-1][0] if self.levels[0] else None
+
+    def _rehash(self, index):
+        # Recompute the parents of the node at index, level by level up to the root
+        depth = 0
+        while len(self.levels[depth]) > 1:
+            level = self.levels[depth]
+            start = index - index % 2
+            parent = hash_pair(
+                level[start], level[start + 1] if start + 1 < len(level) else level[start]
+            )
+            index //= 2
+            if depth + 1 == len(self.levels):
+                self.levels.append([])
+            upper = self.levels[depth + 1]
+            if index < len(upper):
+                upper[index] = parent
+            else:
+                upper.append(parent)
+            # A level never has more than half (rounded up) of the nodes below it
+            del upper[(len(level) + 1) // 2 :]
+            depth += 1
+        del self.levels[depth + 1 :]
+
+    def update(self, index, leaf):
+        """
+        Replaces a leaf, rehashing only the nodes on its path to the root.
+
+        :param index: Position of the leaf.
+        :type index: int
+        :param leaf: The new leaf.
+        :type leaf: bytes
+        """
+        self.levels[0][index] = leaf
+        self._positions = None
+        self._rehash(index)
+
+    def append(self, leaf):
+        """
+        Adds a leaf at the end, rehashing only the nodes on its path to the root.
+
+        :param leaf: The new leaf.
+        :type leaf: bytes
+        """
+        self.levels[0].append(leaf)
+        self._positions = None
+        self._rehash(len(self.levels[0]) - 1)
+
+    def remove(self, index):
+        """
+        Removes a leaf. The leaves after it shift left, so every node covering them is rehashed;
+        removing the last leaf only rehashes one path.
+
+        :param index: Position of the leaf.
+        :type index: int
+        """
+        del self.levels[0][index]
+        self._positions = None
+        if not self.levels[0]:
+            del self.levels[1:]
+            return
+        depth = 0
+        while len(self.levels[depth]) > 1:
+            level = self.levels[depth]
+            start = index - index % 2
+            parents = [
+                hash_pair(level[i], level[i + 1] if i + 1 < len(level) else level[i])
+                for i in range(start, len(level), 2)
+            ]
+            index //= 2
+            self.levels[depth + 1][index:] = parents
+            depth += 1
+        del self.levels[depth + 1 :]
+
+    def branch(self, index):
+        """
+        Returns the merkle branch of a leaf: the sibling of each node on its path to the root.
+
+        :param index: Position of the leaf.
+        :type index: int
+        :return: The sibling hashes, from the leaves up.
+        :rtype: list[bytes]
+        """
+        branch = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            branch.append(level[sibling] if sibling < len(level) else level[index])
+            index //= 2
+        return branch
+
+    def index(self, leaf):
+        """
+        Finds the position of a leaf, e.g. of a txid in the block.
+
+        :param leaf: The leaf, in internal byte order.
+        :type leaf: bytes
+        :return: The position of the leaf.
+        :rtype: int
+        :raises ValueError: If the leaf is not in the tree.
+        """
+        if self._positions is None:
+            self._positions = {node: position for position, node in enumerate(self.levels[0])}
+        try:
+            return self._positions[leaf]
+        except KeyError:
+            raise ValueError(f"{leaf[::-1].hex()} is not a leaf of the tree") from None
+
+    def multi_proof(self, leaves):
+        """
+        Builds one inclusion proof for several leaves, each shared sibling node included once.
+
+        :param leaves: The leaves to prove, e.g. txids in internal byte order.
+        :type leaves: Iterable[bytes]
+        :return: The proof.
+        :rtype: MultiProof
+        :raises ValueError: If a leaf is not in the tree.
+        """
+        indexes = sorted({self.index(leaf) for leaf in leaves})
+        hashes = []
+        known = indexes
+        for level in self.levels[:-1]:
+            known_set = set(known)
+            for position in known:
+                sibling = position ^ 1
+                # Siblings the proof rebuilds itself, or past the end (the node is paired with
+                # itself), are left out
+                if sibling < len(level) and sibling not in known_set:
+                    hashes.append(level[sibling])
+            known = sorted({position // 2 for position in known})
+        return MultiProof(len(self), indexes, hashes)
+
+
+def root_from_branch(leaf, index, branch):
+    """
+    Folds a merkle branch back into the root it commits to.
+
+    :param leaf: The leaf, in internal byte order.
+    :type leaf: bytes
+    :param index: Position of the leaf in the tree.
+    :type index: int
+    :param branch: The branch returned by MerkleTree.branch.
+    :type branch: list[bytes]
+    :return: The merkle root, in internal byte order.
+    :rtype: bytes
+    """
+    node = leaf
+    for sibling in branch:
+        node = hash_pair(sibling, node) if index % 2 else hash_pair(node, sibling)
+        index //= 2
+    return node
+
+
+def verify_multi_proof(root, proof, leaves):
+    """
+    Checks a multi-leaf inclusion proof, hashing each shared node once.
+
+    :param root: The merkle root, e.g. from the block header, in internal byte order.
+    :type root: bytes
+    :param proof: The proof, as returned by MerkleTree.multi_proof.
+    :type proof: MultiProof
+    :param leaves: The proven leaves, in the order of proof.indexes.
+    :type leaves: list[bytes]
+    :return: Whether the leaves are in the tree at the claimed positions.
+    :rtype: bool
+    """
+    if not proof.indexes or len(leaves) != len(proof.indexes):
+        return False
+    # Strictly increasing positions inside the tree: a duplicate or out of range position would
+    # let a leaf be dropped from the nodes without ever contributing to the root
+    if proof.indexes[0] < 0 or proof.indexes[-1] >= proof.leaf_count:
+        return False
+    if any(left >= right for left, right in zip(proof.indexes, proof.indexes[1:])):
+        return False
+    nodes = dict(zip(proof.indexes, leaves))
+    hashes = iter(proof.hashes)
+    width = proof.leaf_count
+    while width > 1:
+        parents = {}
+        for position in sorted(nodes):
+            if position // 2 in parents:
+                continue
+            sibling = position ^ 1
+            if sibling >= width:
+                sibling_node = nodes[position]
+            elif sibling in nodes:
+                sibling_node = nodes[sibling]
+            else:
+                sibling_node = next(hashes, None)
+                if sibling_node is None:
+                    return False
+            node = nodes[position]
+            parents[position // 2] = (
+                hash_pair(sibling_node, node) if position % 2 else hash_pair(node, sibling_node)
+            )
+        nodes = parents
+        width = (width + 1) // 2
+    # Every supplied hash must have been used
+    return next(hashes, None) is None and nodes[0] == root
+
+
+def verify_proofs(root, proofs):
+    """
+    Checks a batch of single-leaf proofs against one root.
+
+    Proofs of leaves close to each other climb through the same nodes; each (left, right) pair
+    is hashed once for the whole batch.
+
+    :param root: The merkle root, in internal byte order.
+    :type root: bytes
+    :param proofs: (leaf, index, branch) triples, branches as returned by MerkleTree.branch.
+    :type proofs: Iterable[tuple[bytes, int, list[bytes]]]
+    :return: Whether each proof is valid.
+    :rtype: list[bool]
+    """
+    parents = {}
+    results = []
+    for leaf, index, branch in proofs:
+        node = leaf
+        for sibling in branch:
+            pair = (sibling, node) if index % 2 else (node, sibling)
+            parent = parents.get(pair)
+            if parent is None:
+                parent = parents[pair] = hash_pair(*pair)
+            node = parent
+            index //= 2
+        # Leftover index bits mean the claimed position does not fit the branch length
+        results.append(index == 0 and node == root)
+    return results
@@ -1,7 +1,40 @@
 import hashlib
 import struct
-import ecdsa
-from ecdsa.util import sigdecode_string
+from utils.transactionModel import Transaction
+from utils.signatureBackend import ECDSA, SCHNORR, verify_batch, verify_cached
+from utils.scriptInterpreter import (
+    MAX_ELEMENT_SIZE,
+    OP_1,
+    OP_16,
+    OP_1NEGATE,
+    ScriptError,
+    encode_num,
+    verify_script,
+)
+from utils.sighash import (
+    SIGHASH_ALL,
+    SIGHASH_DEFAULT,
+    LegacySighash,
+    Bip143Sighash,
+    TaprootSighash,
+    p2wpkh_script_code,
+)
+
+# Sighash engines, created at most once per transaction and shared by its inputs
+SIGHASH_ENGINES = {
+    "legacy": LegacySighash,
+    "bip143": Bip143Sighash,
+    "taproot": TaprootSighash,
+}
+
+# First byte of a taproot annex, the optional last witness item
+ANNEX_TAG = b"\x50"
+
+# Relative locktime fields of the input sequence number (BIP68)
+SEQUENCE_DISABLE_FLAG = 1 << 31
+SEQUENCE_TYPE_FLAG = 1 << 22
+SEQUENCE_MASK = 0x0000FFFF
+LOCKTIME_THRESHOLD = 500000000
 
 
 def parse_element(hex_str, offset, element_size):
@@ -57,54 +90,164 @@ def dissect_signature(hex_sig):
     return r, s, ht
 
 
+def is_valid_signature_encoding(sig):
+    """
+    Checks that a signature is strictly DER encoded, as enforced by consensus since BIP66.
+
+    :param sig: The signature, followed by its hash type byte.
+    :type sig: bytes
+    :return: Whether the encoding is strict DER.
+    :rtype: bool
+    """
+    # 0x30 <len> 0x02 <len r> <r> 0x02 <len s> <s> <hash type>
+    if len(sig) < 9 or len(sig) > 73:
+        return False
+    if sig[0] != 0x30 or sig[1] != len(sig) - 3:
+        return False
+    len_r = sig[3]
+    if 5 + len_r >= len(sig):
+        return False
+    len_s = sig[5 + len_r]
+    if len_r + len_s + 7 != len(sig):
+        return False
+    # r and s are non-empty, non-negative integers without unnecessary leading zero bytes
+    if sig[2] != 0x02 or len_r == 0 or sig[4] & 0x80:
+        return False
+    if len_r > 1 and sig[4] == 0x00 and not sig[5] & 0x80:
+        return False
+    if sig[len_r + 4] != 0x02 or len_s == 0 or sig[len_r + 6] & 0x80:
+        return False
+    if len_s > 1 and sig[len_r + 6] == 0x00 and not sig[len_r + 7] & 0x80:
+        return False
+    return True
+
+
+def parse_der_signature(sig):
+    """
+    Extracts the r, s and hash type from a DER encoded Bitcoin ECDSA signature.
+
+    :param sig: The signature, as pushed in the scriptsig (DER signature followed by the hash type byte).
+    :type sig: bytes
+    :return: r, s and hash type as integers.
+    :rtype: tuple[int, int, int]
+    :raises ValueError: If the signature is not strictly DER encoded (BIP66).
+    """
+    if not is_valid_signature_encoding(sig):
+        raise ValueError("Wrong signature format.")
+    len_r = sig[3]
+    r = int.from_bytes(sig[4 : 4 + len_r], "big")
+    s = int.from_bytes(sig[6 + len_r : -1], "big")
+    return r, s, sig[-1]
+
+
+def parse_pushes(script):
+    """
+    Splits a push-only script (such as a P2PKH scriptsig) into the data it pushes.
+
+    :param script: The script to parse.
+    :type script: bytes
+    :return: The pushed data items, or None if the script contains a non-push opcode or is truncated.
+    :rtype: list[bytes] or None
+    """
+    pushes = []
+    offset = 0
+    while offset < len(script):
+        opcode = script[offset]
+        offset += 1
+        if opcode == 0x00:
+            pushes.append(b"")
+            continue
+        # OP_1NEGATE and OP_1 to OP_16 push a small number, e.g. to pick an OP_IF branch.
+        # OP_RESERVED (0x50) counts as a push but fails the script once executed
+        if opcode == OP_1NEGATE or OP_1 <= opcode <= OP_16:
+            pushes.append(encode_num(-1 if opcode == OP_1NEGATE else opcode - OP_1 + 1))
+            continue
+        if opcode < 0x4C:
+            size = opcode
+        elif opcode == 0x4C:
+            size = script[offset] if offset < len(script) else None
+            offset += 1
+        elif opcode == 0x4D:
+            size = struct.unpack_from("<H", script, offset)[0] if offset + 2 <= len(script) else None
+            offset += 2
+        elif opcode == 0x4E:
+            size = struct.unpack_from("<I", script, offset)[0] if offset + 4 <= len(script) else None
+            offset += 4
+        else:
+            return None
+        if size is None or offset + size > len(script):
+            return None
+        pushes.append(script[offset : offset + size])
+        offset += size
+    return pushes
+
+
+def hash160(data):
+    """
+    Computes RIPEMD160(SHA256(data)), the hash committed to by P2PKH and P2WPKH scripts.
+
+    :param data: The data to hash.
+    :type data: bytes
+    :return: The 20 byte hash.
+    :rtype: bytes
+    """
+    return hashlib.new("ripemd160", hashlib.sha256(data).digest()).digest()
+
+
 def extract_public_key(transaction, input_idx):
     """
     Extracts the public key from the transaction's scriptsig if the scriptpubkey type is 'p2pkh'.
 
-    :param transaction: The transaction dictionary.
-    :type transaction: dict
+    :param transaction: The transaction.
+    :type transaction: Transaction
     :param input_idx: Index of the input to extract the public key from.
     :type input_idx: int
     :return: The public key if found, otherwise None.
     :rtype: bytes or None
     """
-    scriptsig = transaction["vin"][input_idx]["scriptsig_asm"]
-    public_key = None
-    if scriptsig:
-        public_key_parts = scriptsig.split(" ")
-        if len(public_key_parts) > 3:
-            public_key = public_key_parts[3]
-            if (
-                public_key
-                and transaction["vin"][input_idx]["prevout"]["scriptpubkey_type"]
-                == "p2pkh"
-            ):
-                return bytes.fromhex(public_key)
-    return None
+    inp = transaction.vin[input_idx]
+    if inp.prevout is None or inp.prevout.script_type != "p2pkh":
+        return None
+    pushes = parse_pushes(inp.scriptsig)
+    if not pushes or len(pushes) != 2 or not pushes[1]:
+        return None
+    return pushes[1]
+
+
+def compact_signature(der_sig):
+    """
+    Converts a DER signature with its trailing hash type into the 64 byte r || s form.
+
+    :param der_sig: The signature, as pushed in the scriptsig or witness.
+    :type der_sig: bytes
+    :return: The 64 byte r || s signature, and the hash type it commits to.
+    :rtype: tuple[bytes, int]
+    :raises ValueError: If the signature is not correctly encoded.
+    """
+    r, s, hash_type = parse_der_signature(der_sig)
+    if r.bit_length() > 256 or s.bit_length() > 256:
+        raise ValueError("Wrong r or s size.")
+    # Create new signature by concatenating r and s
+    new_sig = r.to_bytes(32, byteorder="big") + s.to_bytes(32, byteorder="big")
+    return new_sig, hash_type
 
 
 def create_new_signature(transaction, input_idx):
     """
     Extracts the r, s values from the transaction's scriptSig and creates a new signature.
 
-    :param transaction: The transaction dictionary.
-    :type transaction: dict
+    :param transaction: The transaction.
+    :type transaction: Transaction
     :param input_idx: Index of the input to create the new signature for.
     :type input_idx: int
-    :return: The new signature.
-    :rtype: bytes
+    :return: The new 64 byte r || s signature, and the hash type it commits to.
+    :rtype: tuple[bytes, int]
+    :raises ValueError: If the scriptsig does not hold a correctly encoded signature.
     """
-    # Extract scriptsig from transaction
-    scriptsig = transaction["vin"][input_idx]["scriptsig_asm"]
-    signature = scriptsig.split(" ")[1]
-
-    # Dissect the signature
-    r, s, _ = dissect_signature(signature)
-    r = r[2:] if r.startswith("00") else r
-    # Create new signature by concatenating r and s
-    new_sig = bytes.fromhex(r) + bytes.fromhex(s)
-
-    return new_sig
+    pushes = parse_pushes(transaction.vin[input_idx].scriptsig)
+    if not pushes:
+        raise ValueError("Missing signature.")
+    return compact_signature(pushes[0])
 
 
 def encode_varint(n):
@@ -118,99 +261,395 @@ def encode_varint(n):
         return b"\xff" + struct.pack("<Q", n)
 
 
-def serialize_tx(transaction, input_idx=None):
-    serialized = b""
-    serialized += struct.pack("<L", transaction["version"])  # Version
-
-    serialized += encode_varint(len(transaction["vin"]))  # Input count
-    for idx, inp in enumerate(transaction["vin"]):
-        input_serialized = b""
-        txid_bytes = bytes.fromhex(inp["txid"])[::-1]  # TXID in little-endian format
-        input_serialized += txid_bytes
-        input_serialized += struct.pack("<L", inp["vout"])  # Output index
-        prevout_scriptpubkey_bytes = bytes.fromhex(
-            inp["prevout"]["scriptpubkey"]
-        )  # ScriptPubKey of previous transaction
-        if input_idx is not None and idx == input_idx:
-            scriptsig_bytes = bytes.fromhex(inp["scriptsig"])
+def serialize_tx(transaction, input_idx, hash_type=SIGHASH_ALL):
+    """
+    Builds the legacy signature preimage of a P2PKH input.
+
+    The input being signed carries the scriptpubkey of the output it spends, every other input
+    an empty script, and the hash type is appended at the end.
+
+    :param transaction: The transaction.
+    :type transaction: Transaction
+    :param input_idx: Index of the input being signed.
+    :type input_idx: int
+    :param hash_type: The sighash type committed to by the signature.
+    :type hash_type: int
+    :return: The serialized preimage.
+    :rtype: bytes
+    """
+    script_code = transaction.vin[input_idx].prevout.scriptpubkey
+    return LegacySighash(transaction).preimage(input_idx, script_code, hash_type)
+
+
+def _engine(engines, name, transaction):
+    engine = engines.get(name)
+    if engine is None:
+        engine = engines[name] = SIGHASH_ENGINES[name](transaction)
+    return engine
+
+
+def p2pkh_check(transaction, input_idx, engines):
+    """
+    Builds the signature check of a P2PKH input.
+
+    :param transaction: The transaction.
+    :type transaction: Transaction
+    :param input_idx: Index of the input.
+    :type input_idx: int
+    :param engines: Per-transaction sighash engines shared by the inputs.
+    :type engines: dict
+    :return: An (ECDSA, public_key, message_hash, signature) check, or None if the input is
+             malformed.
+    :rtype: tuple[int, bytes, bytes, bytes] or None
+    """
+    inp = transaction.vin[input_idx]
+    public_key = extract_public_key(transaction, input_idx)
+    if public_key is None or hash160(public_key) != inp.prevout.scriptpubkey[3:23]:
+        return None
+    try:
+        new_signature, hash_type = create_new_signature(transaction, input_idx)
+    except ValueError:
+        return None
+    message_hash = _engine(engines, "legacy", transaction).sighash(
+        input_idx, inp.prevout.scriptpubkey, hash_type
+    )
+    return ECDSA, public_key, message_hash, new_signature
+
+
+def _witness_pubkey_check(transaction, input_idx, engines, program):
+    inp = transaction.vin[input_idx]
+    if len(inp.witness) != 2 or hash160(inp.witness[1]) != program:
+        return None
+    try:
+        new_signature, hash_type = compact_signature(inp.witness[0])
+    except ValueError:
+        return None
+    message_hash = _engine(engines, "bip143", transaction).sighash(
+        input_idx, p2wpkh_script_code(program), inp.prevout.value, hash_type
+    )
+    return ECDSA, inp.witness[1], message_hash, new_signature
+
+
+def p2wpkh_check(transaction, input_idx, engines):
+    """
+    Builds the signature check of a native P2WPKH input, hashed as per BIP143.
+
+    :param transaction: The transaction.
+    :type transaction: Transaction
+    :param input_idx: Index of the input.
+    :type input_idx: int
+    :param engines: Per-transaction sighash engines shared by the inputs.
+    :type engines: dict
+    :return: An (ECDSA, public_key, message_hash, signature) check, or None if the input is
+             malformed.
+    :rtype: tuple[int, bytes, bytes, bytes] or None
+    """
+    inp = transaction.vin[input_idx]
+    scriptpubkey = inp.prevout.scriptpubkey
+    if inp.scriptsig or len(scriptpubkey) != 22 or scriptpubkey[:2] != b"\x00\x14":
+        return None
+    return _witness_pubkey_check(transaction, input_idx, engines, scriptpubkey[2:])
+
+
+class ScriptChecker:
+    """
+    Signature and timelock checks of one input, called back by the script interpreter.
+
+    Legacy P2SH signatures are hashed as per the original sighash algorithm (without removing
+    the signature from the scriptCode, which standard redeem scripts never contain), and
+    P2WSH ones as per BIP143.
+    """
+
+    __slots__ = ("transaction", "input_idx", "engines", "witness_v0")
+
+    def __init__(self, transaction, input_idx, engines, witness_v0):
+        self.transaction = transaction
+        self.input_idx = input_idx
+        self.engines = engines
+        self.witness_v0 = witness_v0
+
+    def check_signature(self, signature, public_key, script_code):
+        """
+        Checks a DER signature (with its hash type byte) against a public key.
+
+        :param signature: The signature, as pushed on the stack.
+        :type signature: bytes
+        :param public_key: The SEC encoded public key.
+        :type public_key: bytes
+        :param script_code: The scriptCode the signature commits to.
+        :type script_code: bytes
+        :return: Whether the signature is valid. An empty signature is simply invalid.
+        :rtype: bool
+        :raises ScriptError: If a non-empty signature is not strictly DER encoded (BIP66).
+        """
+        if not signature:
+            return False
+        try:
+            new_signature, hash_type = compact_signature(signature)
+        except ValueError as error:
+            raise ScriptError(str(error)) from None
+        if self.witness_v0:
+            value = self.transaction.vin[self.input_idx].prevout.value
+            message_hash = _engine(self.engines, "bip143", self.transaction).sighash(
+                self.input_idx, script_code, value, hash_type
+            )
         else:
-            scriptsig_bytes = b"\x00" * len(inp["scriptsig"])
-        input_serialized += encode_varint(len(scriptsig_bytes))  # ScriptSig size
-        input_serialized += scriptsig_bytes
-        input_serialized += struct.pack("<L", inp["sequence"])  # Sequence
-        serialized += input_serialized
+            message_hash = _engine(self.engines, "legacy", self.transaction).sighash(
+                self.input_idx, script_code, hash_type
+            )
+        return verify_cached(ECDSA, public_key, message_hash, new_signature)
 
-    serialized += encode_varint(len(transaction["vout"]))  # Output count
-    for out in transaction["vout"]:
-        serialized += struct.pack("<Q", out["value"])  # Output value
-        scriptpubkey_bytes = bytes.fromhex(out["scriptpubkey"])  # ScriptPubKey
-        serialized += encode_varint(len(scriptpubkey_bytes))  # ScriptPubKey size
-        serialized += scriptpubkey_bytes
+    def check_locktime(self, locktime):
+        """
+        Checks OP_CHECKLOCKTIMEVERIFY against the transaction locktime (BIP65).
 
-    serialized += struct.pack("<L", transaction["locktime"])  # Locktime
-    serialized += b"\x01\x00\x00\x00"  # SIGHASH_ALL
-    txid = hashlib.sha256(hashlib.sha256(serialized).digest()).hexdigest()
-    return serialized
+        :param locktime: The locktime required by the script.
+        :type locktime: int
+        :return: Whether the transaction satisfies it.
+        :rtype: bool
+        """
+        tx_locktime = self.transaction.locktime
+        # Heights and timestamps cannot be compared
+        if (locktime < LOCKTIME_THRESHOLD) != (tx_locktime < LOCKTIME_THRESHOLD):
+            return False
+        if locktime > tx_locktime:
+            return False
+        # A final input would disable the transaction locktime altogether
+        return self.transaction.vin[self.input_idx].sequence != 0xFFFFFFFF
+
+    def check_sequence(self, sequence):
+        """
+        Checks OP_CHECKSEQUENCEVERIFY against the input sequence number (BIP112).
+
+        :param sequence: The relative locktime required by the script.
+        :type sequence: int
+        :return: Whether the input satisfies it.
+        :rtype: bool
+        """
+        tx_sequence = self.transaction.vin[self.input_idx].sequence
+        if self.transaction.version < 2 or tx_sequence & SEQUENCE_DISABLE_FLAG:
+            return False
+        mask = SEQUENCE_TYPE_FLAG | SEQUENCE_MASK
+        tx_sequence &= mask
+        sequence &= mask
+        # Block counts and time intervals cannot be compared
+        if (sequence < SEQUENCE_TYPE_FLAG) != (tx_sequence < SEQUENCE_TYPE_FLAG):
+            return False
+        return sequence <= tx_sequence
+
+
+def _run_script(transaction, input_idx, engines, script, stack, script_hash, witness_v0):
+    checker = ScriptChecker(transaction, input_idx, engines, witness_v0)
+    # Segwit scripts must leave exactly one element on the stack
+    if verify_script(script, stack, checker, script_hash, clean_stack=witness_v0):
+        return True
+    return None
+
+
+def _witness_script_check(transaction, input_idx, engines, program):
+    witness = transaction.vin[input_idx].witness
+    if not witness:
+        return None
+    witness_script = witness[-1]
+    script_hash = hashlib.sha256(witness_script).digest()
+    if script_hash != program:
+        return None
+    stack = list(witness[:-1])
+    if any(len(item) > MAX_ELEMENT_SIZE for item in stack):
+        return None
+    return _run_script(transaction, input_idx, engines, witness_script, stack, script_hash, True)
+
+
+def p2wsh_check(transaction, input_idx, engines):
+    """
+    Runs the witness script of a native P2WSH input, hashing its signatures as per BIP143.
+
+    :param transaction: The transaction.
+    :type transaction: Transaction
+    :param input_idx: Index of the input.
+    :type input_idx: int
+    :param engines: Per-transaction sighash engines shared by the inputs.
+    :type engines: dict
+    :return: True if the witness script succeeds (its signatures are verified on the spot),
+             None if it fails or the input is malformed.
+    :rtype: bool or None
+    """
+    inp = transaction.vin[input_idx]
+    scriptpubkey = inp.prevout.scriptpubkey
+    if inp.scriptsig or len(scriptpubkey) != 34 or scriptpubkey[:2] != b"\x00\x20":
+        return None
+    return _witness_script_check(transaction, input_idx, engines, scriptpubkey[2:])
+
+
+def p2sh_check(transaction, input_idx, engines):
+    """
+    Builds the signature check of a P2SH input.
+
+    P2SH-wrapped P2WPKH yields a signature check for the batch. Wrapped P2WSH and legacy redeem
+    scripts are run by the script interpreter, which verifies their signatures on the spot.
+
+    :param transaction: The transaction.
+    :type transaction: Transaction
+    :param input_idx: Index of the input.
+    :type input_idx: int
+    :param engines: Per-transaction sighash engines shared by the inputs.
+    :type engines: dict
+    :return: An (ECDSA, public_key, message_hash, signature) check, True if a redeem or witness
+             script succeeds, or None if the input is malformed or its script fails.
+    :rtype: tuple[int, bytes, bytes, bytes] or bool or None
+    """
+    inp = transaction.vin[input_idx]
+    # The scriptsig must be push only, the redeem script being the last push
+    pushes = parse_pushes(inp.scriptsig)
+    if not pushes:
+        return None
+    # Pushes over 520 bytes fail the scriptsig, the redeem script being one of them
+    if any(len(item) > MAX_ELEMENT_SIZE for item in pushes):
+        return None
+    redeem_script = pushes[-1]
+    # Keep the SHA256 half of HASH160, it also keys the compiled script cache
+    script_hash = hashlib.sha256(redeem_script).digest()
+    if hashlib.new("ripemd160", script_hash).digest() != inp.prevout.scriptpubkey[2:22]:
+        return None
+
+    if len(redeem_script) == 22 and redeem_script[:2] == b"\x00\x14":
+        if len(pushes) != 1:
+            return None
+        return _witness_pubkey_check(transaction, input_idx, engines, redeem_script[2:])
+    if len(redeem_script) == 34 and redeem_script[:2] == b"\x00\x20":
+        if len(pushes) != 1:
+            return None
+        return _witness_script_check(transaction, input_idx, engines, redeem_script[2:])
+    if inp.witness:
+        return None
+    return _run_script(
+        transaction, input_idx, engines, redeem_script, list(pushes[:-1]), script_hash, False
+    )
+
+
+def p2tr_check(transaction, input_idx, engines):
+    """
+    Builds the signature check of a taproot key path spend, hashed as per BIP341.
+
+    Script path spends (more than one witness item besides the annex) are not handled.
+
+    :param transaction: The transaction.
+    :type transaction: Transaction
+    :param input_idx: Index of the input.
+    :type input_idx: int
+    :param engines: Per-transaction sighash engines shared by the inputs.
+    :type engines: dict
+    :return: A (SCHNORR, x-only public_key, message_hash, signature) check, or None if the
+             input is malformed or spends through the script path.
+    :rtype: tuple[int, bytes, bytes, bytes] or None
+    """
+    inp = transaction.vin[input_idx]
+    scriptpubkey = inp.prevout.scriptpubkey
+    if inp.scriptsig or len(scriptpubkey) != 34 or scriptpubkey[:2] != b"\x51\x20":
+        return None
+    witness = inp.witness
+    annex = None
+    if len(witness) >= 2 and witness[-1][:1] == ANNEX_TAG:
+        annex = witness[-1]
+        witness = witness[:-1]
+    if len(witness) != 1:
+        return None
+
+    signature = witness[0]
+    if len(signature) == 64:
+        hash_type = SIGHASH_DEFAULT
+    elif len(signature) == 65 and signature[64] != SIGHASH_DEFAULT:
+        # An explicit SIGHASH_DEFAULT byte is invalid, 64 byte signatures imply it
+        hash_type = signature[64]
+        signature = signature[:64]
+    else:
+        return None
+    try:
+        message_hash = _engine(engines, "taproot", transaction).sighash(
+            input_idx, hash_type, annex
+        )
+    except ValueError:
+        return None
+    return SCHNORR, scriptpubkey[2:], message_hash, signature
+
+
+# Signature check builders, by prevout scriptpubkey type
+INPUT_CHECKS = {
+    "p2pkh": p2pkh_check,
+    "v0_p2wpkh": p2wpkh_check,
+    "p2sh": p2sh_check,
+    "v0_p2wsh": p2wsh_check,
+    "v1_p2tr": p2tr_check,
+}
+
+
+def signature_checks(transaction):
+    """
+    Collects the signature check of every input of a transaction.
+
+    :param transaction: The transaction.
+    :type transaction: Transaction
+    :return: A (scheme, public_key, message_hash, signature) check per input, True for inputs whose
+             script already ran successfully, or None for inputs that fail before any batched
+             signature work (unsupported script type, missing or mismatching public key, bad
+             encoding, failing script).
+    :rtype: list[tuple[int, bytes, bytes, bytes] or bool or None]
+    """
+    checks = []
+    # Sighash engines precomputing per-transaction data, shared by all the inputs
+    engines = {}
+    for input_idx, inp in enumerate(transaction.vin):
+        input_check = INPUT_CHECKS.get(inp.prevout.script_type) if inp.prevout else None
+        checks.append(input_check(transaction, input_idx, engines) if input_check else None)
+    return checks
 
 
 def verify_transaction(transaction):
     """
     Verify if the transaction's signature is valid.
 
-    :param transaction: The transaction dictionary.
-    :type transaction: dict
+    :param transaction: The transaction.
+    :type transaction: Transaction
     :return: Tuple containing list of boolean values indicating if the signatures are valid or not,
              and the number of valid signatures.
     :rtype: tuple[list[bool], int]
     """
-    results = []
-    num_valid = 0
-    for input_idx, _ in enumerate(transaction["vin"]):
-        transaction_serialized = serialize_tx(transaction, input_idx)
-        message_hash = hashlib.sha256(
-            hashlib.sha256(transaction_serialized).digest()
-        ).hexdigest()
-        public_key = extract_public_key(transaction, input_idx)
-        if public_key is None:
-            return False, 0
-        new_signature = create_new_signature(transaction, input_idx)
-        try:
-            vk = ecdsa.VerifyingKey.from_string(public_key, curve=ecdsa.SECP256k1)
-            if vk.verify_digest(
-                new_signature, bytes.fromhex(message_hash), sigdecode=sigdecode_string
-            ):
-                results.append(True)
-                num_valid += 1
-            else:
-                results.append(False)
-        except:
-            results.append(False)
-    return results, num_valid
+    results = verify_batch(signature_checks(transaction))
+    return results, sum(results)
 
 
-def verify_transactions(transactions):
+def verify_transactions(transactions, workers=1):
     """
     Verify multiple transactions.
 
-    :param transactions: List of transaction dictionaries.
-    :type transactions: list[dict] or dict
-    :return: List of boolean values indicating if the signatures are valid or not.
-    :rtype: list[bool]
+    The signature checks of every transaction are collected first and verified as one batch,
+    so repeated public keys are parsed once and the work can be spread over a process pool.
+
+    :param transactions: List of transactions.
+    :type transactions: list[Transaction] or Transaction
+    :param workers: Number of processes verifying the batch.
+    :type workers: int
+    :return: List of boolean values indicating if every signature of each transaction is valid,
+             and the number of valid transactions.
+    :rtype: tuple[list[bool], int]
     """
-    if isinstance(transactions, dict):
+    if isinstance(transactions, Transaction):
         transactions = [transactions]
 
-    results = []
-    num_valid = 0
+    checks = []
+    spans = []
     for transaction in transactions:
-        # Check if the scriptsig is not empty and the scriptpubkey type is p2pkh
-        scriptsig = transaction["vin"][0]["scriptsig_asm"]
-        scriptpubkey_type = transaction["vin"][0]["prevout"]["scriptpubkey_type"]
-        if scriptsig and scriptpubkey_type == "p2pkh":
-            result = verify_transaction(transaction)
-            if result:
-                num_valid += 1
-            results.append(result)
+        # Skip transactions spending a script type no check builder handles
+        if transaction.vin and all(
+            inp.prevout is not None and inp.prevout.script_type in INPUT_CHECKS
+            for inp in transaction.vin
+        ):
+            start = len(checks)
+            checks.extend(signature_checks(transaction))
+            spans.append((start, len(checks)))
         else:
-            results.append(False)
-    return results, num_valid
+            spans.append(None)
+
+    input_results = verify_batch(checks, workers)
+    results = [span is not None and all(input_results[span[0] : span[1]]) for span in spans]
+    return results, sum(results)
@@ -0,0 +1,83 @@
+import hashlib
+import ecdsa
+from ecdsa.ellipticcurve import INFINITY, PointJacobi
+
+CURVE = ecdsa.SECP256k1.curve
+GENERATOR = ecdsa.SECP256k1.generator
+FIELD_SIZE = CURVE.p()
+ORDER = ecdsa.SECP256k1.order
+
+# Size of a BIP340 x-only public key, which tells it apart from 33/65 byte SEC keys
+XONLY_SIZE = 32
+
+_tag_prefixes = {}
+
+
+def tagged_hash(tag, data):
+    """
+    Computes the BIP340 tagged hash SHA256(SHA256(tag) || SHA256(tag) || data).
+
+    :param tag: The tag, e.g. "TapSighash".
+    :type tag: str
+    :param data: The data to hash.
+    :type data: bytes
+    :return: The 32 byte hash.
+    :rtype: bytes
+    """
+    prefix = _tag_prefixes.get(tag)
+    if prefix is None:
+        tag_hash = hashlib.sha256(tag.encode()).digest()
+        prefix = _tag_prefixes[tag] = tag_hash + tag_hash
+    return hashlib.sha256(prefix + data).digest()
+
+
+def lift_x(xonly):
+    """
+    Finds the curve point with the given x coordinate and an even y coordinate.
+
+    :param xonly: The 32 byte x-only public key.
+    :type xonly: bytes
+    :return: The point, or None if the x coordinate is not on the curve.
+    :rtype: PointJacobi or None
+    """
+    x = int.from_bytes(xonly, "big")
+    if len(xonly) != XONLY_SIZE or x >= FIELD_SIZE:
+        return None
+    y_squared = (pow(x, 3, FIELD_SIZE) + 7) % FIELD_SIZE
+    y = pow(y_squared, (FIELD_SIZE + 1) // 4, FIELD_SIZE)
+    if pow(y, 2, FIELD_SIZE) != y_squared:
+        return None
+    return PointJacobi(CURVE, x, y if y % 2 == 0 else FIELD_SIZE - y, 1, ORDER)
+
+
+def verify_schnorr(point, xonly, message_hash, signature):
+    """
+    Verifies a BIP340 Schnorr signature in pure Python.
+
+    :param point: The public key, as returned by lift_x.
+    :type point: PointJacobi
+    :param xonly: The 32 byte x-only public key the point was lifted from.
+    :type xonly: bytes
+    :param message_hash: The 32 byte message (for taproot, the signature hash).
+    :type message_hash: bytes
+    :param signature: The 64 byte r || s signature.
+    :type signature: bytes
+    :return: Whether the signature is valid.
+    :rtype: bool
+    """
+    if point is None or len(signature) != 64:
+        return False
+    r = int.from_bytes(signature[:32], "big")
+    s = int.from_bytes(signature[32:], "big")
+    if r >= FIELD_SIZE or s >= ORDER:
+        return False
+    e = int.from_bytes(
+        tagged_hash("BIP0340/challenge", signature[:32] + xonly + message_hash), "big"
+    )
+    # R = s*G - e*P must be a finite point with an even y coordinate and x == r. When
+    # s*G == e*P the sum comes out as the affine INFINITY, which has no to_affine()
+    nonce_point = GENERATOR.mul_add(s, point, -e % ORDER)
+    if nonce_point == INFINITY:
+        return False
+    nonce_point = nonce_point.to_affine()
+    return nonce_point.y() % 2 == 0 and nonce_point.x() == r
@@ -0,0 +1,497 @@
+import hashlib
+import struct
+from collections import OrderedDict
+
+# Opcodes
+OP_0 = 0x00
+OP_PUSHDATA1 = 0x4C
+OP_PUSHDATA2 = 0x4D
+OP_PUSHDATA4 = 0x4E
+OP_1NEGATE = 0x4F
+OP_1 = 0x51
+OP_16 = 0x60
+OP_NOP = 0x61
+OP_IF = 0x63
+OP_NOTIF = 0x64
+OP_VERIF = 0x65
+OP_VERNOTIF = 0x66
+OP_ELSE = 0x67
+OP_ENDIF = 0x68
+OP_VERIFY = 0x69
+OP_RETURN = 0x6A
+OP_TOALTSTACK = 0x6B
+OP_FROMALTSTACK = 0x6C
+OP_2DROP = 0x6D
+OP_2DUP = 0x6E
+OP_3DUP = 0x6F
+OP_2OVER = 0x70
+OP_2ROT = 0x71
+OP_2SWAP = 0x72
+OP_IFDUP = 0x73
+OP_DEPTH = 0x74
+OP_DROP = 0x75
+OP_DUP = 0x76
+OP_NIP = 0x77
+OP_OVER = 0x78
+OP_PICK = 0x79
+OP_ROLL = 0x7A
+OP_ROT = 0x7B
+OP_SWAP = 0x7C
+OP_TUCK = 0x7D
+OP_SIZE = 0x82
+OP_EQUAL = 0x87
+OP_EQUALVERIFY = 0x88
+OP_NUMEQUALVERIFY = 0x9D
+OP_WITHIN = 0xA5
+OP_RIPEMD160 = 0xA6
+OP_SHA1 = 0xA7
+OP_SHA256 = 0xA8
+OP_HASH160 = 0xA9
+OP_HASH256 = 0xAA
+OP_CODESEPARATOR = 0xAB
+OP_CHECKSIG = 0xAC
+OP_CHECKSIGVERIFY = 0xAD
+OP_CHECKMULTISIG = 0xAE
+OP_CHECKMULTISIGVERIFY = 0xAF
+OP_NOP1 = 0xB0
+OP_CHECKLOCKTIMEVERIFY = 0xB1
+OP_CHECKSEQUENCEVERIFY = 0xB2
+OP_NOP10 = 0xB9
+
+# OP_CAT, OP_SUBSTR, OP_LEFT, OP_RIGHT, OP_INVERT, OP_AND, OP_OR, OP_XOR, OP_2MUL, OP_2DIV,
+# OP_MUL, OP_DIV, OP_MOD, OP_LSHIFT and OP_RSHIFT fail the script even in an unexecuted branch
+DISABLED_OPCODES = frozenset((0x7E, 0x7F, 0x80, 0x81, 0x83, 0x84, 0x85, 0x86, 0x8D, 0x8E,
+                              0x95, 0x96, 0x97, 0x98, 0x99))
+
+UNARY_NUM_OPS = {
+    0x8B: lambda a: a + 1,  # OP_1ADD
+    0x8C: lambda a: a - 1,  # OP_1SUB
+    0x8F: lambda a: -a,  # OP_NEGATE
+    0x90: abs,  # OP_ABS
+    0x91: lambda a: int(a == 0),  # OP_NOT
+    0x92: lambda a: int(a != 0),  # OP_0NOTEQUAL
+}
+
+BINARY_NUM_OPS = {
+    0x93: lambda a, b: a + b,  # OP_ADD
+    0x94: lambda a, b: a - b,  # OP_SUB
+    0x9A: lambda a, b: int(a != 0 and b != 0),  # OP_BOOLAND
+    0x9B: lambda a, b: int(a != 0 or b != 0),  # OP_BOOLOR
+    0x9C: lambda a, b: int(a == b),  # OP_NUMEQUAL
+    0x9D: lambda a, b: int(a == b),  # OP_NUMEQUALVERIFY
+    0x9E: lambda a, b: int(a != b),  # OP_NUMNOTEQUAL
+    0x9F: lambda a, b: int(a < b),  # OP_LESSTHAN
+    0xA0: lambda a, b: int(a > b),  # OP_GREATERTHAN
+    0xA1: lambda a, b: int(a <= b),  # OP_LESSTHANOREQUAL
+    0xA2: lambda a, b: int(a >= b),  # OP_GREATERTHANOREQUAL
+    0xA3: min,  # OP_MIN
+    0xA4: max,  # OP_MAX
+}
+
+HASH_OPS = {
+    OP_RIPEMD160: lambda data: hashlib.new("ripemd160", data).digest(),
+    OP_SHA1: lambda data: hashlib.sha1(data).digest(),
+    OP_SHA256: lambda data: hashlib.sha256(data).digest(),
+    OP_HASH160: lambda data: hashlib.new("ripemd160", hashlib.sha256(data).digest()).digest(),
+    OP_HASH256: lambda data: hashlib.sha256(hashlib.sha256(data).digest()).digest(),
+}
+
+# Consensus limits
+MAX_SCRIPT_SIZE = 10000
+MAX_ELEMENT_SIZE = 520
+MAX_OPS_PER_SCRIPT = 201
+MAX_STACK_SIZE = 1000
+MAX_PUBKEYS_PER_MULTISIG = 20
+
+# Number of compiled scripts kept by compile_script
+MAX_COMPILED_SCRIPTS = 1 << 12
+
+_compiled = OrderedDict()
+
+
+class ScriptError(Exception):
+    """
+    Raised when a script cannot be parsed or fails during execution.
+    """
+
+
+def decode_num(data, max_size=4):
+    """
+    Decodes a script number (little-endian, sign and magnitude).
+
+    :param data: The stack element.
+    :type data: bytes
+    :param max_size: Maximum size of the element, 4 bytes for arithmetic and 5 for timelocks.
+    :type max_size: int
+    :return: The number.
+    :rtype: int
+    :raises ScriptError: If the element is too long to be a number.
+    """
+    if len(data) > max_size:
+        raise ScriptError("Script number overflow")
+    if not data:
+        return 0
+    value = int.from_bytes(data, "little")
+    if data[-1] & 0x80:
+        return -(value & ~(0x80 << (8 * (len(data) - 1))))
+    return value
+
+
+def encode_num(value):
+    """
+    Encodes a number as a minimal script number.
+
+    :param value: The number.
+    :type value: int
+    :return: The stack element.
+    :rtype: bytes
+    """
+    if value == 0:
+        return b""
+    magnitude = abs(value)
+    encoded = bytearray(magnitude.to_bytes((magnitude.bit_length() + 7) // 8, "little"))
+    if encoded[-1] & 0x80:
+        encoded.append(0x80 if value < 0 else 0x00)
+    elif value < 0:
+        encoded[-1] |= 0x80
+    return bytes(encoded)
+
+
+def cast_to_bool(data):
+    """
+    Interprets a stack element as a boolean: false for any encoding of zero, including -0.
+
+    :param data: The stack element.
+    :type data: bytes
+    :return: The boolean value.
+    :rtype: bool
+    """
+    for idx, byte in enumerate(data):
+        if byte:
+            return not (idx == len(data) - 1 and byte == 0x80)
+    return False
+
+
+def _require(stack, count):
+    if len(stack) < count:
+        raise IndexError
+
+
+def _parse_script(script):
+    if len(script) > MAX_SCRIPT_SIZE:
+        raise ScriptError("Script too large")
+    ops = []
+    offset = 0
+    while offset < len(script):
+        opcode = script[offset]
+        offset += 1
+        data = None
+        if opcode < OP_PUSHDATA1:
+            size = opcode
+        elif opcode == OP_PUSHDATA1:
+            size = script[offset] if offset < len(script) else None
+            offset += 1
+        elif opcode == OP_PUSHDATA2:
+            size = struct.unpack_from("<H", script, offset)[0] if offset + 2 <= len(script) else None
+            offset += 2
+        elif opcode == OP_PUSHDATA4:
+            size = struct.unpack_from("<I", script, offset)[0] if offset + 4 <= len(script) else None
+            offset += 4
+        else:
+            size = None
+            # Small integers are compiled into the element they push
+            if opcode == OP_1NEGATE or OP_1 <= opcode <= OP_16:
+                data = encode_num(-1 if opcode == OP_1NEGATE else opcode - OP_1 + 1)
+        if opcode <= OP_PUSHDATA4:
+            if size is None or offset + size > len(script):
+                raise ScriptError("Truncated push")
+            data = script[offset : offset + size]
+            offset += size
+        ops.append((opcode, data, offset))
+    return tuple(ops)
+
+
+def compile_script(script, script_hash=None):
+    """
+    Parses a script into a tuple of (opcode, pushed data or None, end offset) operations.
+
+    Compiled scripts are kept in an LRU cache keyed by the SHA256 of the script, so recurring
+    redeem and witness scripts (e.g. multisig templates) are parsed once. P2SH and P2WSH
+    commitments already hash the script with SHA256, which callers can pass in to skip hashing
+    it again.
+
+    :param script: The script.
+    :type script: bytes
+    :param script_hash: The SHA256 of the script, if already known.
+    :type script_hash: bytes or None
+    :return: The compiled operations.
+    :rtype: tuple[tuple[int, bytes or None, int]]
+    :raises ScriptError: If the script is too large or ends in the middle of a push.
+    """
+    if script_hash is None:
+        script_hash = hashlib.sha256(script).digest()
+    ops = _compiled.get(script_hash)
+    if ops is not None:
+        _compiled.move_to_end(script_hash)
+        return ops
+    ops = _compiled[script_hash] = _parse_script(script)
+    if len(_compiled) > MAX_COMPILED_SCRIPTS:
+        _compiled.popitem(last=False)
+    return ops
+
+
+def execute(script, ops, stack, checker):
+    """
+    Runs compiled operations against a stack.
+
+    :param script: The script the operations were compiled from, for the scriptCode signed by
+                   OP_CHECKSIG (everything after the last executed OP_CODESEPARATOR).
+    :type script: bytes
+    :param ops: The compiled operations, as returned by compile_script.
+    :type ops: tuple
+    :param stack: The initial stack, bottom first. Modified in place.
+    :type stack: list[bytes]
+    :param checker: Provides check_signature(signature, public_key, script_code),
+                    check_locktime(locktime) and check_sequence(sequence).
+    :return: The final stack.
+    :rtype: list[bytes]
+    :raises ScriptError: If the script fails.
+    """
+    alt_stack = []
+    conditions = []
+    executing = True
+    op_count = 0
+    code_start = 0
+
+    try:
+        for opcode, data, end in ops:
+            if opcode > OP_16:
+                op_count += 1
+                if op_count > MAX_OPS_PER_SCRIPT:
+                    raise ScriptError("Too many operations")
+            if opcode in DISABLED_OPCODES or opcode in (OP_VERIF, OP_VERNOTIF):
+                raise ScriptError(f"Disabled opcode {opcode:#x}")
+
+            # Oversized pushes fail the script even in a branch that is not executed
+            if data is not None and len(data) > MAX_ELEMENT_SIZE:
+                raise ScriptError("Push larger than 520 bytes")
+
+            if not executing and not OP_IF <= opcode <= OP_ENDIF:
+                continue
+
+            if data is not None:
+                stack.append(data)
+
+            elif opcode in (OP_IF, OP_NOTIF):
+                value = False
+                if executing:
+                    value = cast_to_bool(stack.pop())
+                    if opcode == OP_NOTIF:
+                        value = not value
+                conditions.append(value)
+                executing = executing and value
+            elif opcode == OP_ELSE:
+                if not conditions:
+                    raise ScriptError("OP_ELSE without OP_IF")
+                conditions[-1] = not conditions[-1]
+                executing = all(conditions)
+            elif opcode == OP_ENDIF:
+                if not conditions:
+                    raise ScriptError("OP_ENDIF without OP_IF")
+                conditions.pop()
+                executing = all(conditions)
+
+            elif opcode == OP_CHECKLOCKTIMEVERIFY:
+                locktime = decode_num(stack[-1], 5)
+                if locktime < 0 or not checker.check_locktime(locktime):
+                    raise ScriptError("OP_CHECKLOCKTIMEVERIFY failed")
+            elif opcode == OP_CHECKSEQUENCEVERIFY:
+                sequence = decode_num(stack[-1], 5)
+                if sequence < 0:
+                    raise ScriptError("OP_CHECKSEQUENCEVERIFY failed")
+                # With the disable flag set the opcode behaves as a NOP
+                if not sequence & (1 << 31) and not checker.check_sequence(sequence):
+                    raise ScriptError("OP_CHECKSEQUENCEVERIFY failed")
+            elif opcode == OP_NOP or OP_NOP1 <= opcode <= OP_NOP10:
+                pass
+            elif opcode == OP_VERIFY:
+                if not cast_to_bool(stack.pop()):
+                    raise ScriptError("OP_VERIFY failed")
+            elif opcode == OP_RETURN:
+                raise ScriptError("OP_RETURN")
+
+            elif opcode == OP_TOALTSTACK:
+                alt_stack.append(stack.pop())
+            elif opcode == OP_FROMALTSTACK:
+                stack.append(alt_stack.pop())
+            elif opcode == OP_2DROP:
+                _require(stack, 2)
+                del stack[-2:]
+            elif opcode == OP_2DUP:
+                _require(stack, 2)
+                stack.extend(stack[-2:])
+            elif opcode == OP_3DUP:
+                _require(stack, 3)
+                stack.extend(stack[-3:])
+            elif opcode == OP_2OVER:
+                _require(stack, 4)
+                stack.extend(stack[-4:-2])
+            elif opcode == OP_2ROT:
+                _require(stack, 6)
+                moved = stack[-6:-4]
+                del stack[-6:-4]
+                stack.extend(moved)
+            elif opcode == OP_2SWAP:
+                _require(stack, 4)
+                stack[-4:] = stack[-2:] + stack[-4:-2]
+            elif opcode == OP_IFDUP:
+                if cast_to_bool(stack[-1]):
+                    stack.append(stack[-1])
+            elif opcode == OP_DEPTH:
+                stack.append(encode_num(len(stack)))
+            elif opcode == OP_DROP:
+                stack.pop()
+            elif opcode == OP_DUP:
+                stack.append(stack[-1])
+            elif opcode == OP_NIP:
+                del stack[-2]
+            elif opcode == OP_OVER:
+                stack.append(stack[-2])
+            elif opcode in (OP_PICK, OP_ROLL):
+                depth = decode_num(stack.pop())
+                if depth < 0 or depth >= len(stack):
+                    raise ScriptError("OP_PICK/OP_ROLL out of range")
+                item = stack[-depth - 1]
+                if opcode == OP_ROLL:
+                    del stack[-depth - 1]
+                stack.append(item)
+            elif opcode == OP_ROT:
+                stack.append(stack.pop(-3))
+            elif opcode == OP_SWAP:
+                stack[-2], stack[-1] = stack[-1], stack[-2]
+            elif opcode == OP_TUCK:
+                stack.insert(-2, stack[-1])
+            elif opcode == OP_SIZE:
+                stack.append(encode_num(len(stack[-1])))
+
+            elif opcode in (OP_EQUAL, OP_EQUALVERIFY):
+                equal = stack.pop() == stack.pop()
+                if opcode == OP_EQUALVERIFY:
+                    if not equal:
+                        raise ScriptError("OP_EQUALVERIFY failed")
+                else:
+                    stack.append(b"\x01" if equal else b"")
+
+            elif opcode in UNARY_NUM_OPS:
+                stack.append(encode_num(UNARY_NUM_OPS[opcode](decode_num(stack.pop()))))
+            elif opcode in BINARY_NUM_OPS:
+                b = decode_num(stack.pop())
+                a = decode_num(stack.pop())
+                result = BINARY_NUM_OPS[opcode](a, b)
+                if opcode == OP_NUMEQUALVERIFY:
+                    if not result:
+                        raise ScriptError("OP_NUMEQUALVERIFY failed")
+                else:
+                    stack.append(encode_num(result))
+            elif opcode == OP_WITHIN:
+                upper = decode_num(stack.pop())
+                lower = decode_num(stack.pop())
+                value = decode_num(stack.pop())
+                stack.append(b"\x01" if lower <= value < upper else b"")
+
+            elif opcode in HASH_OPS:
+                stack.append(HASH_OPS[opcode](stack.pop()))
+            elif opcode == OP_CODESEPARATOR:
+                code_start = end
+
+            elif opcode in (OP_CHECKSIG, OP_CHECKSIGVERIFY):
+                public_key = stack.pop()
+                signature = stack.pop()
+                valid = checker.check_signature(signature, public_key, script[code_start:])
+                if opcode == OP_CHECKSIGVERIFY:
+                    if not valid:
+                        raise ScriptError("OP_CHECKSIGVERIFY failed")
+                else:
+                    stack.append(b"\x01" if valid else b"")
+
+            elif opcode in (OP_CHECKMULTISIG, OP_CHECKMULTISIGVERIFY):
+                valid, op_count = _check_multisig(
+                    stack, checker, script[code_start:], op_count
+                )
+                if opcode == OP_CHECKMULTISIGVERIFY:
+                    if not valid:
+                        raise ScriptError("OP_CHECKMULTISIGVERIFY failed")
+                else:
+                    stack.append(b"\x01" if valid else b"")
+
+            else:
+                raise ScriptError(f"Bad opcode {opcode:#x}")
+
+            if len(stack) + len(alt_stack) > MAX_STACK_SIZE:
+                raise ScriptError("Stack size limit exceeded")
+    except IndexError:
+        raise ScriptError("Stack underflow") from None
+
+    if conditions:
+        raise ScriptError("Unbalanced conditional")
+    return stack
+
+
+def _check_multisig(stack, checker, script_code, op_count):
+    num_keys = decode_num(stack.pop())
+    if not 0 <= num_keys <= MAX_PUBKEYS_PER_MULTISIG:
+        raise ScriptError("Bad public key count")
+    op_count += num_keys
+    if op_count > MAX_OPS_PER_SCRIPT:
+        raise ScriptError("Too many operations")
+    _require(stack, num_keys)
+    # Keys and signatures are matched in the order they were pushed
+    public_keys = stack[len(stack) - num_keys :]
+    del stack[len(stack) - num_keys :]
+
+    num_signatures = decode_num(stack.pop())
+    if not 0 <= num_signatures <= num_keys:
+        raise ScriptError("Bad signature count")
+    _require(stack, num_signatures + 1)
+    signatures = stack[len(stack) - num_signatures :]
+    del stack[len(stack) - num_signatures :]
+    # The extra element consumed by an off-by-one in the original implementation (BIP147)
+    if stack.pop():
+        raise ScriptError("OP_CHECKMULTISIG dummy element must be empty")
+
+    key_idx = 0
+    sig_idx = 0
+    while sig_idx < num_signatures:
+        # Fail early once the remaining keys cannot cover the remaining signatures
+        if num_signatures - sig_idx > num_keys - key_idx:
+            return False, op_count
+        if checker.check_signature(signatures[sig_idx], public_keys[key_idx], script_code):
+            sig_idx += 1
+        key_idx += 1
+    return True, op_count
+
+
+def verify_script(script, stack, checker, script_hash=None, clean_stack=False):
+    """
+    Runs a redeem or witness script and tells whether it succeeds.
+
+    :param script: The script.
+    :type script: bytes
+    :param stack: The initial stack, bottom first (the scriptsig pushes or witness items
+                  preceding the script).
+    :type stack: list[bytes]
+    :param checker: Signature and timelock checker, see execute.
+    :param script_hash: The SHA256 of the script, if already known.
+    :type script_hash: bytes or None
+    :param clean_stack: Require exactly one element to be left, as for segwit scripts.
+    :type clean_stack: bool
+    :return: Whether the script succeeds.
+    :rtype: bool
+    """
+    try:
+        stack = execute(script, compile_script(script, script_hash), stack, checker)
+    except ScriptError:
+        return False
+    if clean_stack and len(stack) != 1:
+        return False
+    return bool(stack) and cast_to_bool(stack[-1])
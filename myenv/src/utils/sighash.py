@@ -0,0 +1,388 @@
+import hashlib
+import struct
+from utils.transactionModel import encode_varint
+from utils.schnorr import tagged_hash
+
+SIGHASH_ALL = 0x01
+SIGHASH_NONE = 0x02
+SIGHASH_SINGLE = 0x03
+SIGHASH_ANYONECANPAY = 0x80
+# Taproot only: commits to everything, like SIGHASH_ALL, and is implied by a 64 byte signature
+SIGHASH_DEFAULT = 0x00
+TAPROOT_HASH_TYPES = frozenset((0x00, 0x01, 0x02, 0x03, 0x81, 0x82, 0x83))
+
+ZERO_HASH = b"\x00" * 32
+# Hash signed by a legacy SIGHASH_SINGLE input without a matching output (consensus quirk)
+SIGHASH_SINGLE_BUG = b"\x01" + b"\x00" * 31
+
+
+def double_sha256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def serialize_output(output):
+    """
+    Serializes a single output (value, script length and scriptpubkey).
+
+    :param output: The output.
+    :type output: TxOut
+    :return: The serialized output.
+    :rtype: bytes
+    """
+    return (
+        struct.pack("<Q", output.value)
+        + encode_varint(len(output.scriptpubkey))
+        + output.scriptpubkey
+    )
+
+
+class LegacySighash:
+    """
+    Legacy (pre-segwit) signature hashes for the inputs of one transaction.
+
+    The legacy preimage of input i is the transaction with every scriptsig emptied except the
+    signed one, which carries the scriptCode. The blanked input segments, the outputs and the
+    locktime are serialized once per transaction, and the SHA256 state over the header and the
+    blanked inputs preceding each input is kept, so each input only splices its own script in
+    and hashes what follows it. Nothing is re-serialized per input; the hashing itself stays
+    proportional to the size of the transaction per input, which is inherent to the legacy
+    scheme (and what BIP143 fixed).
+    """
+
+    __slots__ = ("transaction", "_blank", "_offsets", "_states")
+
+    def __init__(self, transaction):
+        self.transaction = transaction
+        segments = [
+            inp.txid + struct.pack("<L", inp.vout) + b"\x00" + struct.pack("<L", inp.sequence)
+            for inp in transaction.vin
+        ]
+        self._blank = b"".join(segments)
+        self._offsets = [0]
+        running = hashlib.sha256(
+            struct.pack("<L", transaction.version) + encode_varint(len(transaction.vin))
+        )
+        self._states = []
+        for segment in segments:
+            self._states.append(running.copy())
+            running.update(segment)
+            self._offsets.append(self._offsets[-1] + len(segment))
+
+    def _signed_segment(self, input_idx, script_code, sequence=None):
+        inp = self.transaction.vin[input_idx]
+        return (
+            inp.txid
+            + struct.pack("<L", inp.vout)
+            + encode_varint(len(script_code))
+            + script_code
+            + struct.pack("<L", inp.sequence if sequence is None else sequence)
+        )
+
+    def preimage(self, input_idx, script_code, hash_type):
+        """
+        Serializes the legacy signature preimage of an input, for any sighash type.
+
+        :param input_idx: Index of the input being signed.
+        :type input_idx: int
+        :param script_code: The scriptCode of the input (the prevout scriptpubkey, or the redeem
+                            script for P2SH), without its length prefix.
+        :type script_code: bytes
+        :param hash_type: The sighash type committed to by the signature.
+        :type hash_type: int
+        :return: The serialized preimage.
+        :rtype: bytes
+        """
+        transaction = self.transaction
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        base_type = hash_type & 0x1F
+
+        if anyone_can_pay:
+            inputs = encode_varint(1) + self._signed_segment(input_idx, script_code)
+        else:
+            segments = []
+            for idx, inp in enumerate(transaction.vin):
+                if idx == input_idx:
+                    segments.append(self._signed_segment(input_idx, script_code))
+                    continue
+                # NONE and SINGLE let the other inputs update their sequence freely
+                sequence = 0 if base_type in (SIGHASH_NONE, SIGHASH_SINGLE) else inp.sequence
+                segments.append(
+                    inp.txid + struct.pack("<L", inp.vout) + b"\x00" + struct.pack("<L", sequence)
+                )
+            inputs = encode_varint(len(transaction.vin)) + b"".join(segments)
+
+        if base_type == SIGHASH_NONE:
+            outputs = encode_varint(0)
+        elif base_type == SIGHASH_SINGLE:
+            # Outputs before the signed one are blanked to an empty script and a value of -1
+            outputs = encode_varint(input_idx + 1)
+            outputs += (struct.pack("<q", -1) + b"\x00") * input_idx
+            outputs += serialize_output(transaction.vout[input_idx])
+        else:
+            outputs = transaction.legacy_suffix()[:-4]
+
+        return (
+            struct.pack("<L", transaction.version)
+            + inputs
+            + outputs
+            + struct.pack("<L", transaction.locktime)
+            + struct.pack("<L", hash_type)
+        )
+
+    def sighash(self, input_idx, script_code, hash_type):
+        """
+        Computes the message hash signed by a legacy input.
+
+        :param input_idx: Index of the input being signed.
+        :type input_idx: int
+        :param script_code: The scriptCode of the input (the prevout scriptpubkey, or the redeem
+                            script for P2SH), without its length prefix.
+        :type script_code: bytes
+        :param hash_type: The sighash type committed to by the signature.
+        :type hash_type: int
+        :return: The 32 byte message hash.
+        :rtype: bytes
+        """
+        base_type = hash_type & 0x1F
+        if base_type == SIGHASH_SINGLE and input_idx >= len(self.transaction.vout):
+            return SIGHASH_SINGLE_BUG
+        if hash_type & SIGHASH_ANYONECANPAY or base_type in (SIGHASH_NONE, SIGHASH_SINGLE):
+            return double_sha256(self.preimage(input_idx, script_code, hash_type))
+
+        # SIGHASH_ALL: resume from the state after the preceding blanked inputs
+        inner = self._states[input_idx].copy()
+        inner.update(self._signed_segment(input_idx, script_code))
+        inner.update(memoryview(self._blank)[self._offsets[input_idx + 1] :])
+        inner.update(self.transaction.legacy_suffix())
+        inner.update(struct.pack("<L", hash_type))
+        return hashlib.sha256(inner.digest()).digest()
+
+
+class Bip143Sighash:
+    """
+    BIP143 signature hashes for the segwit v0 inputs of one transaction.
+
+    hashPrevouts, hashSequence and hashOutputs only depend on the transaction, so they are
+    computed on first use and shared by every input, which keeps the hashing linear in the
+    size of the transaction instead of quadratic.
+    """
+
+    __slots__ = ("transaction", "_hash_prevouts", "_hash_sequence", "_hash_outputs")
+
+    def __init__(self, transaction):
+        self.transaction = transaction
+        self._hash_prevouts = None
+        self._hash_sequence = None
+        self._hash_outputs = None
+
+    def hash_prevouts(self):
+        """The double SHA256 of every outpoint spent by the transaction."""
+        if self._hash_prevouts is None:
+            self._hash_prevouts = double_sha256(
+                b"".join(inp.txid + struct.pack("<L", inp.vout) for inp in self.transaction.vin)
+            )
+        return self._hash_prevouts
+
+    def hash_sequence(self):
+        """The double SHA256 of every input sequence number."""
+        if self._hash_sequence is None:
+            self._hash_sequence = double_sha256(
+                b"".join(struct.pack("<L", inp.sequence) for inp in self.transaction.vin)
+            )
+        return self._hash_sequence
+
+    def hash_outputs(self):
+        """The double SHA256 of every serialized output."""
+        if self._hash_outputs is None:
+            # The memoized legacy serialization ends with the output count, outputs and locktime
+            suffix = self.transaction.legacy_suffix()
+            count_size = len(encode_varint(len(self.transaction.vout)))
+            self._hash_outputs = double_sha256(suffix[count_size:-4])
+        return self._hash_outputs
+
+    def sighash(self, input_idx, script_code, value, hash_type):
+        """
+        Computes the message hash signed by a segwit v0 input.
+
+        :param input_idx: Index of the input being signed.
+        :type input_idx: int
+        :param script_code: The scriptCode of the input (e.g. the P2PKH script for P2WPKH, the
+                            witness script for P2WSH), without its length prefix.
+        :type script_code: bytes
+        :param value: Amount of the output spent by the input.
+        :type value: int
+        :param hash_type: The sighash type committed to by the signature.
+        :type hash_type: int
+        :return: The 32 byte message hash.
+        :rtype: bytes
+        """
+        transaction = self.transaction
+        inp = transaction.vin[input_idx]
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        base_type = hash_type & 0x1F
+
+        hash_prevouts = ZERO_HASH if anyone_can_pay else self.hash_prevouts()
+        if anyone_can_pay or base_type in (SIGHASH_NONE, SIGHASH_SINGLE):
+            hash_sequence = ZERO_HASH
+        else:
+            hash_sequence = self.hash_sequence()
+        if base_type not in (SIGHASH_NONE, SIGHASH_SINGLE):
+            hash_outputs = self.hash_outputs()
+        elif base_type == SIGHASH_SINGLE and input_idx < len(transaction.vout):
+            hash_outputs = double_sha256(serialize_output(transaction.vout[input_idx]))
+        else:
+            hash_outputs = ZERO_HASH
+
+        preimage = (
+            struct.pack("<L", transaction.version)
+            + hash_prevouts
+            + hash_sequence
+            + inp.txid
+            + struct.pack("<L", inp.vout)
+            + encode_varint(len(script_code))
+            + script_code
+            + struct.pack("<Q", value)
+            + struct.pack("<L", inp.sequence)
+            + hash_outputs
+            + struct.pack("<L", transaction.locktime)
+            + struct.pack("<L", hash_type)
+        )
+        return double_sha256(preimage)
+
+
+class TaprootSighash:
+    """
+    BIP341 signature hashes for the taproot inputs of one transaction.
+
+    The SHA256 of the prevouts, amounts, scriptpubkeys, sequences and outputs only depend on
+    the transaction, so they are computed on first use and shared by every input. Unlike
+    BIP143 they are single SHA256, and the amounts and scriptpubkeys of every spent output are
+    committed to.
+    """
+
+    __slots__ = (
+        "transaction",
+        "_sha_prevouts",
+        "_sha_amounts",
+        "_sha_scriptpubkeys",
+        "_sha_sequences",
+        "_sha_outputs",
+    )
+
+    def __init__(self, transaction):
+        self.transaction = transaction
+        self._sha_prevouts = None
+        self._sha_amounts = None
+        self._sha_scriptpubkeys = None
+        self._sha_sequences = None
+        self._sha_outputs = None
+
+    def sha_prevouts(self):
+        """The SHA256 of every outpoint spent by the transaction."""
+        if self._sha_prevouts is None:
+            self._sha_prevouts = hashlib.sha256(
+                b"".join(inp.txid + struct.pack("<L", inp.vout) for inp in self.transaction.vin)
+            ).digest()
+        return self._sha_prevouts
+
+    def sha_amounts(self):
+        """The SHA256 of the amounts of every output spent by the transaction."""
+        if self._sha_amounts is None:
+            self._sha_amounts = hashlib.sha256(
+                b"".join(struct.pack("<Q", inp.prevout.value) for inp in self.transaction.vin)
+            ).digest()
+        return self._sha_amounts
+
+    def sha_scriptpubkeys(self):
+        """The SHA256 of the scriptpubkeys of every output spent by the transaction."""
+        if self._sha_scriptpubkeys is None:
+            self._sha_scriptpubkeys = hashlib.sha256(
+                b"".join(
+                    encode_varint(len(inp.prevout.scriptpubkey)) + inp.prevout.scriptpubkey
+                    for inp in self.transaction.vin
+                )
+            ).digest()
+        return self._sha_scriptpubkeys
+
+    def sha_sequences(self):
+        """The SHA256 of every input sequence number."""
+        if self._sha_sequences is None:
+            self._sha_sequences = hashlib.sha256(
+                b"".join(struct.pack("<L", inp.sequence) for inp in self.transaction.vin)
+            ).digest()
+        return self._sha_sequences
+
+    def sha_outputs(self):
+        """The SHA256 of every serialized output."""
+        if self._sha_outputs is None:
+            suffix = self.transaction.legacy_suffix()
+            count_size = len(encode_varint(len(self.transaction.vout)))
+            self._sha_outputs = hashlib.sha256(suffix[count_size:-4]).digest()
+        return self._sha_outputs
+
+    def sighash(self, input_idx, hash_type, annex=None):
+        """
+        Computes the message hash signed by a taproot key path spend.
+
+        :param input_idx: Index of the input being signed.
+        :type input_idx: int
+        :param hash_type: The sighash type, SIGHASH_DEFAULT for 64 byte signatures.
+        :type hash_type: int
+        :param annex: The annex of the input (last witness item starting with 0x50), if any.
+        :type annex: bytes or None
+        :return: The 32 byte message hash.
+        :rtype: bytes
+        :raises ValueError: If the hash type is not defined, or is SIGHASH_SINGLE without a
+                            matching output.
+        """
+        if hash_type not in TAPROOT_HASH_TYPES:
+            raise ValueError(f"Invalid taproot sighash type: {hash_type:#x}")
+        transaction = self.transaction
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        base_type = hash_type & 0x03
+        if base_type == SIGHASH_SINGLE and input_idx >= len(transaction.vout):
+            raise ValueError("SIGHASH_SINGLE input without a matching output")
+
+        # Epoch, hash type, version and locktime
+        message = struct.pack("<BBLL", 0, hash_type, transaction.version, transaction.locktime)
+        if not anyone_can_pay:
+            message += (
+                self.sha_prevouts()
+                + self.sha_amounts()
+                + self.sha_scriptpubkeys()
+                + self.sha_sequences()
+            )
+        if base_type not in (SIGHASH_NONE, SIGHASH_SINGLE):
+            message += self.sha_outputs()
+
+        # Spend type: no extension (key path), bit 0 set when an annex is present
+        message += struct.pack("<B", 0 if annex is None else 1)
+        if anyone_can_pay:
+            inp = transaction.vin[input_idx]
+            message += (
+                inp.txid
+                + struct.pack("<L", inp.vout)
+                + struct.pack("<Q", inp.prevout.value)
+                + encode_varint(len(inp.prevout.scriptpubkey))
+                + inp.prevout.scriptpubkey
+                + struct.pack("<L", inp.sequence)
+            )
+        else:
+            message += struct.pack("<L", input_idx)
+        if annex is not None:
+            message += hashlib.sha256(encode_varint(len(annex)) + annex).digest()
+        if base_type == SIGHASH_SINGLE:
+            message += hashlib.sha256(serialize_output(transaction.vout[input_idx])).digest()
+        return tagged_hash("TapSighash", message)
+
+
+def p2wpkh_script_code(pubkey_hash):
+    """
+    Builds the scriptCode BIP143 signs for a P2WPKH program: the equivalent P2PKH script.
+
+    :param pubkey_hash: The 20 byte witness program.
+    :type pubkey_hash: bytes
+    :return: OP_DUP OP_HASH160 <pubkey_hash> OP_EQUALVERIFY OP_CHECKSIG.
+    :rtype: bytes
+    """
+    return b"\x76\xa9\x14" + pubkey_hash + b"\x88\xac"
@@ -0,0 +1,375 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import ecdsa
+from ecdsa.util import sigdecode_string
+from utils.signatureCache import SignatureCache, get_signature_cache
+from utils.schnorr import XONLY_SIZE, lift_x, verify_schnorr
+
+try:
+    import secp256k1
+except (ImportError, OSError):
+    # The binding needs its compiled libsecp256k1 extension, which is platform specific
+    secp256k1 = None
+
+# Environment variable holding the backend name, so that worker processes started with the
+# "spawn" method pick the same backend as their parent
+BACKEND_ENV = "SIG_BACKEND"
+
+# Signature schemes, the first element of every check. The scheme comes from the script
+# context (taproot or not), never from the key: a 32 byte key in an ECDSA check is invalid
+ECDSA = 0
+SCHNORR = 1
+
+# Sizes of the compressed and uncompressed SEC encodings, the only keys ECDSA checks accept
+ECDSA_KEY_SIZES = (33, 65)
+
+# Number of signatures handed to a worker at once by verify_batch
+DEFAULT_CHUNK_SIZE = 512
+
+# Number of parsed public keys kept per process, so addresses spending many outputs have their
+# point decompressed and validated once
+PUBLIC_KEY_CACHE_SIZE = 1 << 14
+
+
+@lru_cache(maxsize=PUBLIC_KEY_CACHE_SIZE)
+def parse_ecdsa_key(scheme, public_key):
+    """
+    Parses a public key for the ecdsa backend. Memoized by the scheme and raw key bytes.
+
+    :param scheme: ECDSA or SCHNORR.
+    :type scheme: int
+    :param public_key: The SEC encoded public key for ECDSA, the 32 byte x-only key for Schnorr.
+    :type public_key: bytes
+    :return: The verifying key (the lifted curve point for an x-only key), or None if the key
+             is not a valid point or has the wrong size for the scheme.
+    :rtype: ecdsa.VerifyingKey or PointJacobi or None
+    """
+    if scheme == SCHNORR:
+        return lift_x(public_key)
+    if len(public_key) not in ECDSA_KEY_SIZES:
+        return None
+    try:
+        return ecdsa.VerifyingKey.from_string(public_key, curve=ecdsa.SECP256k1)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=PUBLIC_KEY_CACHE_SIZE)
+def parse_secp256k1_key(scheme, public_key):
+    """
+    Parses a public key for the secp256k1 backend. Memoized by the scheme and raw key bytes.
+
+    :param scheme: ECDSA or SCHNORR.
+    :type scheme: int
+    :param public_key: The SEC encoded public key for ECDSA, the 32 byte x-only key for Schnorr.
+    :type public_key: bytes
+    :return: The public key, or None if the key is not a valid point or has the wrong size for
+             the scheme.
+    :rtype: secp256k1.PublicKey or None
+    """
+    try:
+        # An x-only key is the point with that x coordinate and an even y coordinate
+        if scheme == SCHNORR:
+            if len(public_key) != XONLY_SIZE:
+                return None
+            return secp256k1.PublicKey(b"\x02" + public_key, raw=True)
+        if len(public_key) not in ECDSA_KEY_SIZES:
+            return None
+        return secp256k1.PublicKey(public_key, raw=True)
+    except Exception:
+        return None
+
+
+class EcdsaBackend:
+    """
+    Pure Python verification through the ecdsa package. Always available, but slow.
+    """
+
+    name = "ecdsa"
+
+    def verify(self, scheme, public_key, message_hash, signature):
+        """
+        Verifies an ECDSA or BIP340 Schnorr signature over secp256k1.
+
+        :param scheme: ECDSA or SCHNORR.
+        :type scheme: int
+        :param public_key: The SEC encoded public key (compressed or uncompressed) for ECDSA, the
+                           32 byte x-only public key for Schnorr.
+        :type public_key: bytes
+        :param message_hash: The 32 byte hash that was signed.
+        :type message_hash: bytes
+        :param signature: The 64 byte r || s signature.
+        :type signature: bytes
+        :return: Whether the signature is valid.
+        :rtype: bool
+        """
+        return self.verify_many(scheme, public_key, [(message_hash, signature)])[0]
+
+    def verify_many(self, scheme, public_key, items):
+        """
+        Verifies several signatures made with the same public key, parsing the key only once
+        (and reusing it from earlier calls when it is still in the public key cache).
+
+        :param scheme: ECDSA or SCHNORR.
+        :type scheme: int
+        :param public_key: The SEC encoded public key for ECDSA, the 32 byte x-only key for Schnorr.
+        :type public_key: bytes
+        :param items: (message_hash, signature) pairs.
+        :type items: list[tuple[bytes, bytes]]
+        :return: Whether each signature is valid.
+        :rtype: list[bool]
+        """
+        vk = parse_ecdsa_key(scheme, public_key)
+        if vk is None:
+            return [False] * len(items)
+        results = []
+        for message_hash, signature in items:
+            try:
+                if scheme == SCHNORR:
+                    valid = verify_schnorr(vk, public_key, message_hash, signature)
+                else:
+                    valid = vk.verify_digest(signature, message_hash, sigdecode=sigdecode_string)
+            except Exception:
+                valid = False
+            results.append(valid)
+        return results
+
+
+class Secp256k1Backend:
+    """
+    Verification through the libsecp256k1 binding, when its compiled extension is available.
+    Schnorr signatures fall back to pure Python if the library was built without the schnorrsig
+    module.
+    """
+
+    name = "secp256k1"
+
+    def verify(self, scheme, public_key, message_hash, signature):
+        """
+        Verifies an ECDSA or BIP340 Schnorr signature over secp256k1.
+
+        :param scheme: ECDSA or SCHNORR.
+        :type scheme: int
+        :param public_key: The SEC encoded public key (compressed or uncompressed) for ECDSA, the
+                           32 byte x-only public key for Schnorr.
+        :type public_key: bytes
+        :param message_hash: The 32 byte hash that was signed.
+        :type message_hash: bytes
+        :param signature: The 64 byte r || s signature.
+        :type signature: bytes
+        :return: Whether the signature is valid.
+        :rtype: bool
+        """
+        return self.verify_many(scheme, public_key, [(message_hash, signature)])[0]
+
+    def verify_many(self, scheme, public_key, items):
+        """
+        Verifies several signatures made with the same public key, parsing the key only once
+        (and reusing it from earlier calls when it is still in the public key cache).
+
+        :param scheme: ECDSA or SCHNORR.
+        :type scheme: int
+        :param public_key: The SEC encoded public key for ECDSA, the 32 byte x-only key for Schnorr.
+        :type public_key: bytes
+        :param items: (message_hash, signature) pairs.
+        :type items: list[tuple[bytes, bytes]]
+        :return: Whether each signature is valid.
+        :rtype: list[bool]
+        """
+        if scheme == SCHNORR and not secp256k1.HAS_SCHNORR:
+            return EcdsaBackend().verify_many(scheme, public_key, items)
+        pub = parse_secp256k1_key(scheme, public_key)
+        if pub is None:
+            return [False] * len(items)
+        verify = self._verify_schnorr if scheme == SCHNORR else self._verify
+        return [verify(pub, message_hash, signature) for message_hash, signature in items]
+
+    @staticmethod
+    def _verify(pub, message_hash, signature):
+        try:
+            raw_sig = pub.ecdsa_deserialize_compact(signature)
+            # libsecp256k1 only accepts low-S signatures, consensus accepts both
+            _, raw_sig = pub.ecdsa_signature_normalize(raw_sig)
+            return pub.ecdsa_verify(message_hash, raw_sig, raw=True)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _verify_schnorr(pub, message_hash, signature):
+        try:
+            return pub.schnorr_verify(message_hash, signature, None, raw=True)
+        except Exception:
+            return False
+
+
+BACKENDS = {
+    EcdsaBackend.name: EcdsaBackend,
+    Secp256k1Backend.name: Secp256k1Backend,
+}
+
+_backend = None
+
+
+def available_backends():
+    """
+    Lists the backends that can be used in this environment.
+
+    :return: The names of the usable backends.
+    :rtype: list[str]
+    """
+    names = [EcdsaBackend.name]
+    if secp256k1 is not None:
+        names.append(Secp256k1Backend.name)
+    return names
+
+
+def set_backend(name="auto"):
+    """
+    Selects the signature verification backend.
+
+    :param name: "secp256k1", "ecdsa", or "auto" for libsecp256k1 when available and ecdsa otherwise.
+    :type name: str
+    :return: The selected backend.
+    :rtype: EcdsaBackend or Secp256k1Backend
+    :raises ValueError: If the backend is unknown or not available here.
+    """
+    global _backend
+    if name == "auto":
+        name = Secp256k1Backend.name if secp256k1 is not None else EcdsaBackend.name
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown signature backend: {name}")
+    if name not in available_backends():
+        raise ValueError(f"Signature backend {name} is not available")
+    _backend = BACKENDS[name]()
+    os.environ[BACKEND_ENV] = name
+    return _backend
+
+
+def get_backend():
+    """
+    Returns the selected backend, picking one from the SIG_BACKEND environment variable
+    (default "auto") on first use.
+
+    :return: The selected backend.
+    :rtype: EcdsaBackend or Secp256k1Backend
+    """
+    if _backend is None:
+        return set_backend(os.environ.get(BACKEND_ENV, "auto"))
+    return _backend
+
+
+def _verify_chunk(chunk):
+    backend = get_backend()
+    results = []
+    for (scheme, public_key), items in chunk:
+        pairs = [(message_hash, signature) for _, message_hash, signature in items]
+        results.extend(backend.verify_many(scheme, public_key, pairs))
+    return results
+
+
+def _chunk_by_public_key(checks, chunk_size):
+    # Group the checks by scheme and public key, so each key is looked up once per chunk
+    groups = {}
+    for idx, check in enumerate(checks):
+        if check is not None:
+            scheme, public_key, message_hash, signature = check
+            groups.setdefault((scheme, public_key), []).append((idx, message_hash, signature))
+
+    chunks = []
+    chunk = []
+    chunk_len = 0
+    for group, items in groups.items():
+        for start in range(0, len(items), chunk_size):
+            part = items[start : start + chunk_size]
+            chunk.append((group, part))
+            chunk_len += len(part)
+            if chunk_len >= chunk_size:
+                chunks.append(chunk)
+                chunk = []
+                chunk_len = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def verify_batch(checks, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Verifies a batch of ECDSA and Schnorr signatures, e.g. every input of the mempool at once.
+
+    Checks found in the signature cache are answered from it. The others are grouped by public
+    key (each distinct key is parsed once per process), packed into chunks of about chunk_size
+    signatures and verified over a process pool; the valid ones are then added to the cache.
+
+    :param checks: (scheme, public_key, message_hash, signature) tuples, as taken by
+                   Backend.verify.
+                   None entries stand for inputs that could not be checked and come out False,
+                   True entries for inputs already verified (e.g. by the script interpreter).
+    :type checks: list[tuple[int, bytes, bytes, bytes] or bool or None]
+    :param workers: Number of worker processes. 1 verifies in the current process.
+    :type workers: int
+    :param chunk_size: Number of signatures per chunk.
+    :type chunk_size: int
+    :return: Whether each check is valid, in the order of the checks.
+    :rtype: list[bool]
+    """
+    results = [False] * len(checks)
+
+    # Signatures already known valid skip the ECDSA work entirely
+    cache = get_signature_cache()
+    keys = [None] * len(checks)
+    pending = [None] * len(checks)
+    for idx, check in enumerate(checks):
+        if check is True:
+            results[idx] = True
+        elif check is not None:
+            keys[idx] = SignatureCache.key(*check)
+            if keys[idx] in cache:
+                results[idx] = True
+            else:
+                pending[idx] = check
+
+    chunks = _chunk_by_public_key(pending, chunk_size)
+    if workers <= 1 or len(chunks) <= 1:
+        _scatter(results, chunks, map(_verify_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            _scatter(results, chunks, executor.map(_verify_chunk, chunks))
+
+    for idx, check in enumerate(pending):
+        if check is not None and results[idx]:
+            cache.add(keys[idx])
+    return results
+
+
+def verify_cached(scheme, public_key, message_hash, signature):
+    """
+    Verifies a single signature through the signature cache, for checks that cannot wait for a
+    batch because their outcome steers the rest of the verification (e.g. OP_CHECKMULTISIG).
+
+    :param scheme: ECDSA or SCHNORR.
+    :type scheme: int
+    :param public_key: The SEC encoded public key for ECDSA, the 32 byte x-only key for Schnorr.
+    :type public_key: bytes
+    :param message_hash: The 32 byte hash that was signed.
+    :type message_hash: bytes
+    :param signature: The 64 byte r || s signature.
+    :type signature: bytes
+    :return: Whether the signature is valid.
+    :rtype: bool
+    """
+    cache = get_signature_cache()
+    key = SignatureCache.key(scheme, public_key, message_hash, signature)
+    if key in cache:
+        return True
+    valid = get_backend().verify(scheme, public_key, message_hash, signature)
+    if valid:
+        cache.add(key)
+    return valid
+
+
+def _scatter(results, chunks, chunk_results):
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        indexes = (idx for _, items in chunk for idx, _, _ in items)
+        for idx, valid in zip(indexes, chunk_result):
+            results[idx] = valid
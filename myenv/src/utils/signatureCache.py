@@ -0,0 +1,149 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+# Environment variables carrying the cache settings, so that worker processes started with the
+# "spawn" method load the same persisted cache as their parent
+CACHE_PATH_ENV = "SIG_CACHE_PATH"
+CACHE_SIZE_ENV = "SIG_CACHE_SIZE"
+
+DEFAULT_MAX_SIZE = 1 << 18
+KEY_SIZE = 32
+
+
+class SignatureCache:
+    """
+    Bounded LRU set of signatures already found valid.
+
+    Entries are keyed by SHA256(scheme || message_hash || public_key || signature), so a hit
+    guarantees the exact same check, under the same scheme, succeeded before. Only valid signatures are cached: an invalid one
+    invalidates its transaction anyway, and is rare enough not to be worth remembering.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._added = []
+
+    @staticmethod
+    def key(scheme, public_key, message_hash, signature):
+        """
+        Computes the cache key of a signature check.
+
+        :param scheme: The signature scheme (ECDSA or SCHNORR of utils.signatureBackend).
+        :type scheme: int
+        :param public_key: The SEC encoded public key, or the x-only key of a Schnorr signature.
+        :type public_key: bytes
+        :param message_hash: The 32 byte hash that was signed.
+        :type message_hash: bytes
+        :param signature: The 64 byte r || s signature.
+        :type signature: bytes
+        :return: The 32 byte cache key.
+        :rtype: bytes
+        """
+        return hashlib.sha256(bytes((scheme,)) + message_hash + public_key + signature).digest()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key):
+        """
+        Records a valid signature, evicting the least recently used entries beyond max_size.
+
+        :param key: The cache key, as returned by SignatureCache.key.
+        :type key: bytes
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = None
+        self._added.append(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def drain_added(self):
+        """
+        Returns the keys added since the last call, e.g. to hand them from a worker process
+        back to the process that persists the cache.
+
+        :return: The newly added keys.
+        :rtype: list[bytes]
+        """
+        added, self._added = self._added, []
+        return added
+
+    def load(self, path):
+        """
+        Loads the entries persisted by save, if the file exists.
+
+        :param path: Path of the cache file.
+        :type path: str
+        """
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return
+        for offset in range(0, len(data) - KEY_SIZE + 1, KEY_SIZE):
+            self.add(data[offset : offset + KEY_SIZE])
+        # Loaded entries are not new to whoever persists the cache
+        self._added = []
+
+    def save(self, path):
+        """
+        Persists the entries, least recently used first, as a flat file of keys.
+
+        :param path: Path of the cache file.
+        :type path: str
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(b"".join(self._entries))
+        os.replace(tmp_path, path)
+
+
+_cache = None
+
+
+def configure_signature_cache(max_size=DEFAULT_MAX_SIZE, path=None):
+    """
+    Replaces the process-wide signature cache.
+
+    :param max_size: Maximum number of cached signatures.
+    :type max_size: int
+    :param path: Optional file the cache is loaded from (and can later be saved to).
+    :type path: str or None
+    :return: The new cache.
+    :rtype: SignatureCache
+    """
+    global _cache
+    _cache = SignatureCache(max_size)
+    os.environ[CACHE_SIZE_ENV] = str(max_size)
+    if path is not None:
+        _cache.load(path)
+        os.environ[CACHE_PATH_ENV] = path
+    else:
+        os.environ.pop(CACHE_PATH_ENV, None)
+    return _cache
+
+
+def get_signature_cache():
+    """
+    Returns the process-wide signature cache, creating it from the SIG_CACHE_SIZE and
+    SIG_CACHE_PATH environment variables on first use.
+
+    :return: The signature cache.
+    :rtype: SignatureCache
+    """
+    if _cache is None:
+        return configure_signature_cache(
+            int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAX_SIZE)),
+            os.environ.get(CACHE_PATH_ENV),
+        )
+    return _cache
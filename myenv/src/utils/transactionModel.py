@@ -0,0 +1,348 @@
+import hashlib
+import struct
+
+UINT32 = struct.Struct("<L")
+VALUE = struct.Struct("<Q")
+
+
+def encode_varint(n):
+    if n < 0xFD:
+        return struct.pack("<B", n)
+    elif n <= 0xFFFF:
+        return b"\xfd" + struct.pack("<H", n)
+    elif n <= 0xFFFFFFFF:
+        return b"\xfe" + struct.pack("<I", n)
+    else:
+        return b"\xff" + struct.pack("<Q", n)
+
+
+def double_sha256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _input_parts(parts, inp):
+    # Serialization parts of an input, without its witness
+    parts.append(inp.txid)  # TXID, already in little-endian order
+    parts.append(UINT32.pack(inp.vout))  # Output index
+    parts.append(encode_varint(len(inp.scriptsig)))  # Script length
+    parts.append(inp.scriptsig)  # ScriptSig
+    parts.append(UINT32.pack(inp.sequence))  # Sequence
+
+
+def _output_parts(parts, out):
+    parts.append(VALUE.pack(out.value))  # Output value
+    parts.append(encode_varint(len(out.scriptpubkey)))  # ScriptPubKey size
+    parts.append(out.scriptpubkey)  # ScriptPubKey
+
+
+def _witness_parts(parts, inp):
+    parts.append(encode_varint(len(inp.witness)))  # Witness item count
+    for item in inp.witness:
+        parts.append(encode_varint(len(item)))
+        parts.append(item)
+
+
+class TxOut:
+    """
+    A transaction output, also used for the prevout an input spends.
+
+    :ivar value: Amount in satoshis.
+    :ivar scriptpubkey: The locking script, as raw bytes.
+    :ivar script_type: The script type reported by the mempool ("p2pkh", "v0_p2wpkh", ...).
+    :ivar address: The address of the output, or None for scripts without one (e.g. OP_RETURN).
+    """
+
+    __slots__ = ("value", "scriptpubkey", "script_type", "address")
+
+    def __init__(self, value, scriptpubkey, script_type=None, address=None):
+        self.value = value
+        self.scriptpubkey = scriptpubkey
+        self.script_type = script_type
+        self.address = address
+
+    @classmethod
+    def from_dict(cls, output):
+        """
+        Builds an output from its mempool JSON representation.
+
+        :param output: The output (or prevout) dictionary.
+        :type output: dict
+        :return: The decoded output.
+        :rtype: TxOut
+        """
+        return cls(
+            output["value"],
+            bytes.fromhex(output["scriptpubkey"]),
+            output.get("scriptpubkey_type"),
+            output.get("scriptpubkey_address"),
+        )
+
+
+class TxIn:
+    """
+    A transaction input.
+
+    :ivar txid: Id of the transaction being spent, as raw bytes in serialization order
+                (i.e. reversed from the hex shown by block explorers and the mempool JSON).
+    :ivar vout: Index of the output being spent.
+    :ivar scriptsig: The unlocking script, as raw bytes.
+    :ivar sequence: The sequence number.
+    :ivar witness: The witness stack items, as raw bytes. Empty for legacy inputs.
+    :ivar prevout: The output being spent, or None if unknown.
+    :ivar is_coinbase: Whether the input is a coinbase input.
+    """
+
+    __slots__ = ("txid", "vout", "scriptsig", "sequence", "witness", "prevout", "is_coinbase")
+
+    def __init__(
+        self, txid, vout, scriptsig, sequence, witness=(), prevout=None, is_coinbase=False
+    ):
+        self.txid = txid
+        self.vout = vout
+        self.scriptsig = scriptsig
+        self.sequence = sequence
+        self.witness = witness
+        self.prevout = prevout
+        self.is_coinbase = is_coinbase
+
+
+class Transaction:
+    """
+    A transaction with every field decoded once, at ingestion time.
+
+    The legacy and witness serializations, txid, wtxid and value sums are kept on the object, so
+    the validator, the verifier, the block template builder, the merkle builder and the output
+    writer all share them. from_dict fills them in while decoding; transactions built otherwise
+    compute them lazily on first use.
+
+    :ivar version: The transaction version.
+    :ivar locktime: The transaction locktime.
+    :ivar vin: The inputs, as a tuple of TxIn.
+    :ivar vout: The outputs, as a tuple of TxOut.
+    """
+
+    __slots__ = (
+        "version",
+        "locktime",
+        "vin",
+        "vout",
+        "_legacy",
+        "_witness",
+        "_outputs_offset",
+        "_txid",
+        "_wtxid",
+        "_value_in",
+        "_value_out",
+        "_duplicate_inputs",
+    )
+
+    def __init__(self, version, locktime, vin, vout):
+        self.version = version
+        self.locktime = locktime
+        self.vin = vin
+        self.vout = vout
+        self._legacy = None
+        self._witness = None
+        self._outputs_offset = None
+        self._txid = None
+        self._wtxid = None
+        self._value_in = None
+        self._value_out = None
+        self._duplicate_inputs = None
+
+    @classmethod
+    def from_dict(cls, transaction):
+        """
+        Builds a transaction from its mempool JSON representation, in one pass over its fields.
+
+        Each field is hex decoded once. The loop decoding it also sums the prevout and output
+        values, collects the outpoints to spot inputs spending the same output, and appends the
+        field to the serialization parts, through the same part builders as the lazy path. The
+        serializations are then joined once and hashed, and stored with the value sums and the
+        duplicate input flag, so later stages never walk the transaction again.
+
+        :param transaction: The transaction dictionary, as loaded by read_file.
+        :type transaction: dict
+        :return: The decoded transaction.
+        :rtype: Transaction
+        """
+        fromhex = bytes.fromhex
+        vin = []
+        outpoints = set()
+        value_in = 0
+        input_parts = [encode_varint(len(transaction["vin"]))]
+        witness_parts = []
+        has_witness = False
+        for inp in transaction["vin"]:
+            prevout = inp.get("prevout")
+            prevout = TxOut.from_dict(prevout) if prevout else None
+            if prevout is not None:
+                value_in += prevout.value
+            txin = TxIn(
+                fromhex(inp["txid"])[::-1],
+                inp["vout"],
+                fromhex(inp.get("scriptsig", "")),
+                inp["sequence"],
+                tuple(fromhex(item) for item in inp.get("witness", ())),
+                prevout,
+                inp.get("is_coinbase", False),
+            )
+            outpoints.add((txin.txid, txin.vout))
+            _input_parts(input_parts, txin)
+            _witness_parts(witness_parts, txin)
+            has_witness = has_witness or bool(txin.witness)
+            vin.append(txin)
+        vout = []
+        value_out = 0
+        output_parts = [encode_varint(len(transaction["vout"]))]
+        for out in transaction["vout"]:
+            txout = TxOut.from_dict(out)
+            value_out += txout.value
+            _output_parts(output_parts, txout)
+            vout.append(txout)
+
+        tx = cls(transaction["version"], transaction["locktime"], tuple(vin), tuple(vout))
+        tx._value_in = value_in
+        tx._value_out = value_out
+        tx._duplicate_inputs = len(outpoints) != len(vin)
+        tx._assemble(input_parts, output_parts, witness_parts if has_witness else None)
+        tx._txid = double_sha256(tx._legacy)
+        tx._wtxid = double_sha256(tx._witness) if has_witness else tx._txid
+        return tx
+
+    @property
+    def has_witness(self):
+        """Whether any input carries witness data."""
+        return any(inp.witness for inp in self.vin)
+
+    def _serialize(self):
+        input_parts = [encode_varint(len(self.vin))]
+        witness_parts = []
+        for inp in self.vin:
+            _input_parts(input_parts, inp)
+            _witness_parts(witness_parts, inp)
+        output_parts = [encode_varint(len(self.vout))]
+        for out in self.vout:
+            _output_parts(output_parts, out)
+        self._assemble(input_parts, output_parts, witness_parts if self.has_witness else None)
+
+    def _assemble(self, input_parts, output_parts, witness_parts):
+        # The inputs and outputs are encoded once and shared by the legacy and the witness
+        # serializations, each assembled by a single join
+        version = UINT32.pack(self.version)  # Version
+        locktime = UINT32.pack(self.locktime)  # Locktime
+        inputs = b"".join(input_parts)
+        outputs = b"".join(output_parts)
+        self._outputs_offset = len(version) + len(inputs)
+        self._legacy = b"".join((version, inputs, outputs, locktime))
+        if witness_parts is not None:
+            # Marker and flag
+            self._witness = b"".join(
+                [version, b"\x00\x01", inputs, outputs, *witness_parts, locktime]
+            )
+        else:
+            self._witness = self._legacy
+
+    def serialize_legacy(self):
+        """
+        Serializes the transaction without witness data, as hashed for the txid. Memoized.
+
+        :return: The serialized transaction.
+        :rtype: bytes
+        """
+        if self._legacy is None:
+            self._serialize()
+        return self._legacy
+
+    def legacy_suffix(self):
+        """
+        Returns the serialized outputs and locktime, the tail shared by the legacy serialization
+        and every legacy signature preimage.
+
+        :return: The serialized outputs followed by the locktime.
+        :rtype: bytes
+        """
+        legacy = self.serialize_legacy()
+        return legacy[self._outputs_offset :]
+
+    def serialize_witness(self):
+        """
+        Serializes the transaction with the segwit marker, flag and witness data, as hashed for
+        the wtxid. Transactions without witness data serialize as in serialize_legacy. Memoized,
+        and produced in the same pass as the legacy serialization.
+
+        :return: The serialized transaction.
+        :rtype: bytes
+        """
+        if self._witness is None:
+            self._serialize()
+        return self._witness
+
+    @property
+    def base_size(self):
+        """The size in bytes of the serialization without witness data."""
+        return len(self.serialize_legacy())
+
+    @property
+    def total_size(self):
+        """The size in bytes of the serialization with witness data."""
+        return len(self.serialize_witness())
+
+    @property
+    def weight(self):
+        """The weight in weight units (BIP141): 3 times the base size plus the total size."""
+        return 3 * self.base_size + self.total_size
+
+    @property
+    def vsize(self):
+        """The virtual size in vbytes: the weight divided by 4, rounded up."""
+        return (self.weight + 3) // 4
+
+    @property
+    def value_in(self):
+        """The value spent by the inputs with a known prevout. Memoized."""
+        if self._value_in is None:
+            self._value_in = sum(inp.prevout.value for inp in self.vin if inp.prevout)
+        return self._value_in
+
+    @property
+    def value_out(self):
+        """The value of the outputs. Memoized."""
+        if self._value_out is None:
+            self._value_out = sum(out.value for out in self.vout)
+        return self._value_out
+
+    @property
+    def fee(self):
+        """The fee paid, i.e. the value spent by the inputs minus the value of the outputs."""
+        return self.value_in - self.value_out
+
+    @property
+    def has_duplicate_inputs(self):
+        """Whether two inputs spend the same output. Memoized."""
+        if self._duplicate_inputs is None:
+            self._duplicate_inputs = len({(inp.txid, inp.vout) for inp in self.vin}) != len(
+                self.vin
+            )
+        return self._duplicate_inputs
+
+    @property
+    def txid(self):
+        """The txid, as raw bytes in internal (little-endian) order. Memoized."""
+        if self._txid is None:
+            self._txid = double_sha256(self.serialize_legacy())
+        return self._txid
+
+    @property
+    def wtxid(self):
+        """The wtxid, as raw bytes in internal (little-endian) order. Memoized."""
+        if self._wtxid is None:
+            self._wtxid = (
+                double_sha256(self.serialize_witness()) if self.has_witness else self.txid
+            )
+        return self._wtxid
+
+    @property
+    def txid_hex(self):
+        """The txid in the byte order displayed by block explorers."""
+        return self.txid[::-1].hex()
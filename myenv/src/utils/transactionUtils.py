@@ -1,40 +1,35 @@
 #!./code-challenge-2024-A-viralS/myenv/bin/python
-import secp256k1
-import hashlib
-from typing import List, Dict
-import re
+from utils.transactionModel import Transaction
 
-def validate_transaction(transaction_data: Dict) -> bool:
+def validate_transaction(transaction_data: Transaction) -> bool:
+    # The value sums and the duplicate input flag are recorded while the transaction is decoded
+    # (see Transaction.from_dict), so these checks do not walk the inputs and outputs again
     # 1. Validate ScriptPubKey Address Formats
-    for output in transaction_data["vout"]:
-        if output["scriptpubkey_type"] == "v1_p2tr" and not is_valid_bech32_address(
-            output["scriptpubkey_address"], "bc"
+    for output in transaction_data.vout:
+        if output.script_type == "v1_p2tr" and not is_valid_bech32_address(
+            output.address, "bc"
         ):
             return False
-        elif output["scriptpubkey_type"] == "p2sh" and not is_valid_base58_address(
-            output["scriptpubkey_address"], "bc"
+        elif output.script_type == "p2sh" and not is_valid_base58_address(
+            output.address, "bc"
         ):
             return False
 
     # 2. Check Transaction Fee
-    total_output_value = sum(output["value"] for output in transaction_data["vout"])
-    total_input_value = sum(
-        input["prevout"]["value"]
-        for input in transaction_data["vin"]
-        if input["prevout"]
-    )
+    total_output_value = transaction_data.value_out
+    total_input_value = transaction_data.value_in
     transaction_fee = total_input_value - total_output_value
     if transaction_fee < 0:
         print("Transaction fee is negative")
         return False
 
     # 3. Confirm Coinbase Transaction Validation
-    for input in transaction_data["vin"]:
-        if input["is_coinbase"] and input["prevout"]["value"] != 0:
+    for input in transaction_data.vin:
+        if input.is_coinbase and input.prevout and input.prevout.value != 0:
             return False
 
     # # 4. Verify Locktime (if present)
-    if "locktime" in transaction_data and transaction_data["locktime"] < 0:
+    if transaction_data.locktime < 0:
         return False
 
     # # 5. Check for Negative Values
@@ -55,12 +50,8 @@ def validate_transaction(transaction_data: Dict) -> bool:
     #         return False
 
     # 8. Check for Double Spending
-    spent_outputs = set()
-    for input in transaction_data["vin"]:
-        output_hash = f"{input['txid']}:{input['vout']}"
-        if output_hash in spent_outputs:
-            return False
-        spent_outputs.add(output_hash)
+    if transaction_data.has_duplicate_inputs:
+        return False
 
     # 9. Validate Script Formats------->>>>>>3149
     # for output in transaction_data["vout"]:
@@ -91,30 +82,7 @@ def validate_transaction(transaction_data: Dict) -> bool:
     #         if address != output["scriptpubkey_address"]:
     #             return False
 
-    # 10. Extract Signatures and Perform ECDSA Verification
-    # for input in transaction_data["vin"]:
-    #     if not input["is_coinbase"]:
-    #         witness = input["witness"]
-    #         prevout = input["prevout"]
-    #         scriptpubkey = prevout["scriptpubkey"]
-    #         value = prevout["value"]
-
-    #         if scriptpubkey.startswith("OP_DUP OP_HASH160"):
-    #             # P2PKH transaction
-    #             signature = witness[0]
-    #             pubkey = witness[1]
-
-    #             # Perform ECDSA signature verification
-    #             if not verify_signature(signature, prevout, pubkey):
-    #                 return False
-
-    #         elif scriptpubkey.startswith("OP_PUSHNUM_1 OP_PUSHBYTES_32"):
-    #             # P2TR transaction
-    #             witness_script = witness[-1]
-
-    #             # Perform ECDSA signature verification for witness script
-    #             if not verify_witness_script(witness_script, prevout, witness):
-    #                 return False
+    # 10. Signatures are verified separately, in batches, by utils.p2phk.verify_transactions
 
     # 11. Maximize Transaction Fee------>>>>2336
     # sorted_outputs = sorted(
@@ -173,29 +141,6 @@ def is_valid_base58_address(address: str, prefix: str) -> bool:
     return True  # Placeholder
 
 
-def verify_signature(signature: str, prevout: Dict, pubkey: str) -> bool:
-    scriptpubkey = prevout["scriptpubkey"]
-    value = prevout["value"]
-    message = get_signature_message(scriptpubkey, value)
-    signature_buffer = bytes.fromhex(signature)
-    is_valid = secp256k1.ecdsa_verify(signature_buffer, message)
-    return is_valid
-
-
-def verify_witness_script(
-    witness_script: str, prevout: Dict, witness: List[str]
-) -> bool:
-    # Implement witness script validation logic here
-    # This will depend on the specific witness script format and signature schemes used
-    return True  # Placeholder for now
-
-
-def get_signature_message(scriptpubkey: str, value: int) -> str:
-    # Implement signature message generation logic here
-    # This will depend on the specific transaction and script format
-    return ""  # Placeholder for now
-
-
 def get_address_from_hash(hash: str, address_type: str) -> str:
     if address_type == "p2sh":
         # Placeholder implementation for P2SH address generation